@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from apps.blog.models import Article, Category
+from apps.user.models import ViewStatistics
+from .recount_article_views import _total_views_subquery
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the article list ordered by views: Sum('view_count__count') annotation "
+            "vs the materialized Article.total_views column. Data is generated inside a "
+            "transaction and rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    def _generate(self, n_articles, days):
+        category = Category.objects.create(name='bench')
+        Article.objects.bulk_create(
+            [Article(title=f'bench {i}', description='-', content='-', category=category) for i in range(n_articles)],
+            batch_size=2000,
+        )
+        ct = ContentType.objects.get_for_model(Article)
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(ViewStatistics._meta.db_table)} (content_type_id, object_id, count, date) '
+                f'SELECT %s, a.id, (random() * 50)::int, CURRENT_DATE - d '
+                f'FROM {qn(Article._meta.db_table)} a CROSS JOIN generate_series(0, %s) d '
+                f'WHERE a.category_id = %s '
+                f'ON CONFLICT DO NOTHING',
+                [ct.id, days - 1, category.id],
+            )
+            cursor.execute(f'ANALYZE {qn(ViewStatistics._meta.db_table)}')
+            cursor.execute(f'ANALYZE {qn(Article._meta.db_table)}')
+
+    def handle(self, *args, **options):
+        page = options['page_size']
+        repeat = options['repeat']
+
+        def annotated():
+            qs = Article.objects.annotate(count=Coalesce(Sum('view_count__count'), 0)).order_by('-count', '-add_date')
+            qs.count()
+            list(qs[:page])
+
+        def materialized():
+            qs = Article.objects.order_by('-total_views', '-add_date')
+            qs.count()
+            list(qs[:page])
+
+        try:
+            with transaction.atomic():
+                t0 = time.perf_counter()
+                self._generate(options['articles'], options['days'])
+                self.stdout.write(f"generated {options['articles']} articles x {options['days']} days "
+                                  f"in {time.perf_counter() - t0:.1f}s")
+
+                t0 = time.perf_counter()
+                Article.objects.update(total_views=_total_views_subquery())
+                self.stdout.write(f'backfill total_views: {(time.perf_counter() - t0) * 1000:.0f} ms')
+
+                self.stdout.write(f'Sum annotation   ordering=-count: {self._time(annotated, repeat):8.1f} ms (median)')
+                self.stdout.write(f'total_views col  ordering=-count: {self._time(materialized, repeat):8.1f} ms (median)')
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('generated rows rolled back')
@@ -0,0 +1,38 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from apps.blog.models import Article
+from apps.user.models import ViewStatistics
+
+
+def _total_views_subquery():
+    ct = ContentType.objects.get_for_model(Article)
+    return Coalesce(Subquery(
+        ViewStatistics.objects.filter(content_type=ct, object_id=OuterRef('pk')).order_by()
+        .values('object_id').annotate(s=Sum('count')).values('s')
+    ), 0)
+
+
+class Command(BaseCommand):
+    # 各 web 进程缓冲里还没落库的浏览量不在 ViewStatistics 里，也就不计入；
+    # 它们 flush 时会再给 total_views 加上，不会丢
+    help = "Rebuild Article.total_views from the daily ViewStatistics rows in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows, do not write changes')
+
+    def handle(self, *args, **options):
+        drifted = (
+            Article.objects
+            .annotate(real_total=_total_views_subquery())
+            .exclude(total_views=F('real_total'))
+        )
+        total = drifted.count()
+        if options['dry_run']:
+            self.stdout.write(self.style.NOTICE(f'[dry-run] {total} article row(s) have a drifted total_views'))
+            return
+
+        updated = Article.objects.filter(pk__in=drifted.values('pk')).update(total_views=_total_views_subquery())
+        self.stdout.write(self.style.SUCCESS(f'Done. Recounted {updated} article row(s).'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_views(apps, schema_editor):
+    Article = apps.get_model('blog', 'Article')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    ViewStatistics = apps.get_model('user', 'ViewStatistics')
+
+    ct = ContentType.objects.filter(app_label='blog', model='article').first()
+    if ct is None:
+        return
+    Article.objects.update(total_views=Coalesce(Subquery(
+        ViewStatistics.objects.filter(content_type=ct, object_id=OuterRef('pk')).order_by()
+        .values('object_id').annotate(s=Sum('count')).values('s')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('user', '0006_userprofile_is_holiday_family_certified'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='total_views',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='total views'),
+        ),
+        migrations.RunPython(backfill_total_views, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-total_views', '-add_date'], name='blog_article_total_views_idx'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.contrib.contenttypes.fields import GenericRelation
 from django.conf import settings
 from apps.user.models import ViewStatistics
 from apps.comment.models import Comment
+from common.models import CounterFieldsMixin
 
 
 # Create your models here.
@@ -37,7 +38,7 @@ class Category(BaseModel):
         return self.name
 
 
-class Article(BaseModel):
+class Article(CounterFieldsMixin, BaseModel):
     title = models.CharField("title", max_length=100)
     description = models.CharField('description', max_length=200, blank=True, default="")
     content = models.TextField('content')
@@ -61,11 +62,18 @@ class Article(BaseModel):
     )
     view_count = GenericRelation(ViewStatistics, verbose_name="View Statistics")
     comments = GenericRelation(Comment, verbose_name="comment")
+    # ViewStatistics 每日计数的汇总，由浏览计数 flush 时增量维护（见 apps/blog/signals.py）
+    total_views = models.PositiveIntegerField('total views', default=0, editable=False)
+
+    COUNTER_FIELDS = ("total_views",)
 
     class Meta:
         verbose_name = 'Article'
         verbose_name_plural = 'Articles'
         ordering = ["-add_date"]
+        indexes = [
+            models.Index(fields=['-total_views', '-add_date'], name='blog_article_total_views_idx'),
+        ]
 
     def __str__(self) -> CharField:
         return self.title
@@ -42,7 +42,7 @@ class ArticleSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     tags = serializers.StringRelatedField(many=True, read_only=True)
-    count = serializers.IntegerField(read_only=True, default=0)
+    count = serializers.IntegerField(source='total_views', read_only=True, default=0)
     # 直接返回HTML内容，不转换为Markdown
     author_username = serializers.CharField(source='author.username', read_only=True, default=None)
     is_favorited = serializers.SerializerMethodField()
@@ -0,0 +1,24 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.dispatch import receiver
+
+from apps.user.view_buffer import views_flushed
+from .models import Article
+
+
+@receiver(views_flushed)
+def roll_up_article_views(sender, rows, **kwargs):
+    """Add freshly flushed ViewStatistics increments to Article.total_views."""
+    ct_id = ContentType.objects.get_for_model(Article).id
+    per_article = defaultdict(int)
+    for content_type_id, object_id, _date, n in rows:
+        if content_type_id == ct_id:
+            per_article[object_id] += n
+    # 按增量分组，一般只有少数几个不同的增量值，每组一条 UPDATE
+    by_delta = defaultdict(list)
+    for article_id, n in per_article.items():
+        by_delta[n].append(article_id)
+    for n, ids in by_delta.items():
+        Article.objects.filter(pk__in=ids).update(total_views=F('total_views') + n)
@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.user.view_buffer import ViewCountBuffer
+from common.testing import LOCMEM_CACHES
+from .models import Article, Category
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArticleTotalViewsTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='news')
+        self.a = Article.objects.create(title='a', content='a', category=category)
+        self.b = Article.objects.create(title='b', content='b', category=category)
+        self.ct = ContentType.objects.get_for_model(Article)
+
+    def test_flush_rolls_up_total_views(self):
+        buffer = ViewCountBuffer(flush_interval=0, max_pending=1000)
+        today = timezone.now().date()
+        buffer.add(self.ct.id, self.a.id, today, n=2)
+        buffer.add(self.ct.id, self.b.id, today, n=5)
+        buffer.add(self.ct.id, self.b.id, today - timezone.timedelta(days=1), n=1)
+        buffer.flush()
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.total_views, self.b.total_views), (2, 6))
+
+        # 整行保存不能覆盖计数
+        self.a.total_views = 0
+        self.a.title = 'a2'
+        self.a.save()
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.total_views, 2)
+
+    def test_list_orders_by_count(self):
+        Article.objects.filter(pk=self.a.pk).update(total_views=10)
+        resp = APIClient().get(reverse('article-list'), {'ordering': '-count'})
+        self.assertEqual(resp.status_code, 200)
+        rows = resp.data['results']
+        self.assertEqual([r['id'] for r in rows], [self.a.id, self.b.id])
+        self.assertEqual(rows[0]['count'], 10)
@@ -23,8 +23,6 @@ from .serializers import (
     BlogCommentSerializer,
     BlogCommentListSerializer
 )
-from django.db.models import Sum, F
-from django.db.models.functions import Coalesce
 from apps.comment.serializers import CommentSerializer, CommentListSerializer
 
 
@@ -68,41 +66,23 @@ class ArticleViewSet(mixins.ListModelMixin,
             return ArticleCreateUpdateSerializer
         return super().get_serializer_class()
 
+    # ordering 参数里的 count 对应物化的 total_views 列
+    ORDERING_ALIASES = {'count': 'total_views', 'add_date': 'add_date', 'pub_date': 'pub_date'}
+
     def get_queryset(self):
         queryset = super().get_queryset()
-        # 注解 count 字段用于排序和序列化
-        queryset = queryset.annotate(
-            count=Coalesce(Sum('view_count__count'), 0)
-        )
+        # 浏览量直接取物化的 total_views（序列化为 count），不再对每日统计做 Sum
+        if self.action == 'list':
+            ordering = self.request.query_params.get('ordering', '-add_date')
+            desc = ordering.startswith('-')
+            field = self.ORDERING_ALIASES.get(ordering.lstrip('-'))
+            if field is None:
+                queryset = queryset.order_by(*self.ordering)
+            elif field == 'total_views':
+                queryset = queryset.order_by(f"{'-' if desc else ''}total_views", '-add_date')
+            else:
+                queryset = queryset.order_by(f"{'-' if desc else ''}{field}")
         return queryset
-    
-    def list(self, request, *args, **kwargs):
-        ordering = request.query_params.get('ordering', '-add_date')
-        self.queryset = self.get_queryset()
-        
-        # 调试：打印前5篇文章的count值
-        print(f"DEBUG: ordering={ordering}")
-        for article in self.queryset[:5]:
-            print(f"DEBUG: Article {article.id} - {article.title} - count={article.count}")
-        
-        # 应用排序
-        if ordering == '-count':
-            self.queryset = self.queryset.order_by('-count', '-add_date')
-            print("DEBUG: Applied -count ordering")
-        elif ordering == 'count':
-            self.queryset = self.queryset.order_by('count', '-add_date')
-            print("DEBUG: Applied count ordering")
-        else:
-            self.queryset = self.queryset.order_by(ordering)
-        
-        # 再次打印排序后的前5篇
-        print("DEBUG: After ordering:")
-        for article in self.queryset[:5]:
-            print(f"DEBUG: Article {article.id} - {article.title} - count={article.count}")
-        
-        return super().list(request, *args, **kwargs)
-        
-        return super().list(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
         obj = self.get_object()
@@ -0,0 +1,66 @@
+"""
+Canonical Address store.
+
+Submissions that describe the same place (see models.canonical_address_key)
+share one Address row, including its coordinates and geocoding state. A
+submission that carries its own coordinates reuses the canonical row only
+when they agree within PIN_TOLERANCE; otherwise it gets a private row
+(canonical_key NULL), so map pins of lost reports are never moved.
+``manage.py dedupe_addresses`` applies the same rules to existing rows.
+"""
+from typing import Tuple
+
+from django.db import IntegrityError, transaction
+
+from .models import Address
+
+# 约 50 m（纬度方向）
+PIN_TOLERANCE = 0.0005
+
+
+def has_coords(address) -> bool:
+    return address.latitude is not None and address.longitude is not None
+
+
+def coords_agree(a, b) -> bool:
+    """True when either side has no coordinates or they are within PIN_TOLERANCE."""
+    if not (has_coords(a) and has_coords(b)):
+        return True
+    return (abs(float(a.latitude) - float(b.latitude)) <= PIN_TOLERANCE
+            and abs(float(a.longitude) - float(b.longitude)) <= PIN_TOLERANCE)
+
+
+def _adopt_coords(existing: Address, candidate: Address):
+    if has_coords(existing) or not has_coords(candidate):
+        return
+    existing.latitude, existing.longitude = candidate.latitude, candidate.longitude
+    existing.geocode_status = Address.GeocodeStatus.OK
+    existing.save(update_fields=["latitude", "longitude", "geocode_status"])
+
+
+def get_or_create_address(**fields) -> Tuple[Address, bool]:
+    """Return (address, created), reusing the canonical row for the same place."""
+    candidate = Address(**fields)
+    key = candidate.compute_canonical_key()
+    if key is None:
+        candidate.save()
+        return candidate, True
+    for _ in range(2):
+        existing = Address.objects.filter(canonical_key=key).first()
+        if existing is not None:
+            if not coords_agree(existing, candidate):
+                candidate.save()
+                return candidate, True
+            _adopt_coords(existing, candidate)
+            return existing, False
+        candidate.canonical_key = key
+        try:
+            with transaction.atomic():
+                candidate.save()
+            return candidate, True
+        except IntegrityError:
+            # 并发请求刚插入了同一个键：回头复用那一行
+            candidate.pk = None
+            candidate.canonical_key = None
+    candidate.save()
+    return candidate, True
@@ -1,7 +1,10 @@
 # apps/pet/admin.py
 from django.contrib import admin, messages
+from django.utils import timezone
+from django.urls import reverse
 from django.utils.html import format_html
-from .models import Pet, Adoption, DonationPhoto, Donation, Country, Region, City, Address, Lost, PetPhoto, Shelter, Ticket, HolidayFamily
+from . import approvals
+from .models import ApprovalBatch, Pet, Adoption, DonationPhoto, Donation, Country, Region, City, Address, GeocodeJob, GeocodeResult, Lost, PetPhoto, Shelter, Ticket, HolidayFamily
 from django import forms
 
 class AddressAdminForm(forms.ModelForm):
@@ -144,29 +147,56 @@ class DonationAdmin(admin.ModelAdmin):
             return False  # 关闭后彻底不可编辑
         return super().has_change_permission(request, obj)
 
-
-@admin.action(description="Review pass and create pet")
-def approve_and_create_pet(modeladmin, request, queryset):
-    ok, fail = 0, 0
-    for d in queryset:
-        try:
-            d.approve(reviewer=request.user, note="Approved in admin")
-            ok += 1
-        except Exception as e:
-            fail += 1
-    messages.info(request, f"Finish: Pass {ok} time(s); Fail {fail} time(s)")
-
-
-@admin.action(description="Close donation (lock editing)")
-def close_donation(modeladmin, request, queryset):
-    updated = queryset.exclude(status="closed").update(status="closed")
-    messages.info(request, f"Closed {updated} item(s).")
+    # actions 里按名字引用的动作必须是 ModelAdmin 的方法，模块级函数不会被找到
+    @admin.action(description="Review pass and create pet")
+    def approve_and_create_pet(self, request, queryset):
+        # 只记下 id，交给 ApprovalBatch 分批处理（apps/pet/approvals.py），请求立即返回
+        batch = approvals.create_batch(queryset.values_list("pk", flat=True), request.user, "Approved in admin")
+        url = reverse("admin:pet_approvalbatch_change", args=[batch.pk])
+        if batch.status == ApprovalBatch.Status.PENDING:
+            self.message_user(request, format_html(
+                'Queued {} donation(s) as <a href="{}">approval batch #{}</a>.', batch.total, url, batch.pk))
+        else:
+            level = messages.SUCCESS if not batch.failed else messages.WARNING
+            self.message_user(request, format_html(
+                'Finish: Pass {} time(s); Fail {} time(s) (<a href="{}">batch #{}</a>)',
+                batch.approved, batch.failed, url, batch.pk), level)
+
+    @admin.action(description="Close donation (lock editing)")
+    def close_donation(self, request, queryset):
+        updated = queryset.exclude(status="closed").update(status="closed")
+        self.message_user(request, f"Closed {updated} item(s).")
+
+
+@admin.register(ApprovalBatch)
+class ApprovalBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "progress", "approved", "failed", "reviewer", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("status", "progress", "total", "processed", "approved", "failed", "error_list",
+                       "reviewer", "note", "locked_by", "locked_at", "created_at", "updated_at", "finished_at")
+    exclude = ("donation_ids", "errors")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Progress")
+    def progress(self, obj):
+        percent = 100 * obj.processed // obj.total if obj.total else 100
+        return f"{obj.processed}/{obj.total} ({percent}%)"
+
+    @admin.display(description="Errors")
+    def error_list(self, obj):
+        if not obj.errors:
+            return "-"
+        return format_html("<br>".join("{}: {}" for _ in obj.errors),
+                           *[v for pk, error in sorted(obj.errors.items()) for v in (pk, error)])
 
 
 @admin.register(Address)
 class AddressAdmin(admin.ModelAdmin):
     form = AddressAdminForm
-    list_display = ("__str__", "postal_code", "location")
+    list_display = ("__str__", "postal_code", "location", "geocode_status")
+    list_filter = ("geocode_status",)
     list_select_related = ("city", "region", "country")
     # ⭐ 必须有 search_fields，供其他 Admin 的 autocomplete 使用
     search_fields = (
@@ -175,6 +205,35 @@ class AddressAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(GeocodeResult)
+class GeocodeResultAdmin(admin.ModelAdmin):
+    list_display = ("query", "found", "latitude", "longitude", "provider", "confidence", "expires_at", "updated_at")
+    list_filter = ("found", "provider")
+    search_fields = ("query", "key")
+    readonly_fields = ("key", "created_at", "updated_at")
+
+
+@admin.register(GeocodeJob)
+class GeocodeJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "address", "query", "status", "attempts", "run_after", "locked_by", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("query", "last_error")
+    raw_id_fields = ("address",)
+    readonly_fields = ("created_at", "updated_at")
+    actions = ["retry_now"]
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        queryset = queryset.exclude(status=GeocodeJob.Status.DONE)
+        Address.objects.filter(pk__in=queryset.values("address_id")).update(
+            geocode_status=Address.GeocodeStatus.PENDING
+        )
+        updated = queryset.update(
+            status=GeocodeJob.Status.PENDING, run_after=timezone.now(), attempts=0, locked_at=None, locked_by=""
+        )
+        self.message_user(request, f"{updated} job(s) re-queued.")
+
+
 @admin.register(Lost)
 class LostAdmin(admin.ModelAdmin):
     list_display = (
@@ -3,33 +3,37 @@ import django_filters
 import django_filters as df
 from .models import Pet, Lost
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from common import traits
+from . import geo
+from .search import search_lost, search_pets
 
 
 class PetFilter(df.FilterSet):
+    # 全文检索按相关度排序；search 是移动端沿用的旧参数名
+    q       = df.CharFilter(method="filter_search", label="Search")
+    search  = df.CharFilter(method="filter_search", label="Search")
     name    = df.CharFilter(field_name="name", lookup_expr="icontains")
     species = df.CharFilter(field_name="species", lookup_expr="icontains")
     breed   = df.CharFilter(field_name="breed", lookup_expr="icontains")
-    status  = df.CharFilter(field_name="status", lookup_expr="iexact")
+    # 取值都是小写：用 exact 而不是 iexact（UPPER(status) 用不上索引）
+    status  = df.CharFilter(method="filter_status")
     sex     = df.CharFilter(field_name="sex",     lookup_expr="iexact")
     size    = df.CharFilter(field_name="size",    lookup_expr="iexact")
     city    = df.CharFilter(method="filter_city")
     # 年龄段：用总月数范围过滤（前端映射成 age_min/age_max）
     age_min = df.NumberFilter(method="filter_age_min")
     age_max = df.NumberFilter(method="filter_age_max")
-    
-    # 宠物特性过滤
-    vaccinated = df.BooleanFilter(field_name="vaccinated")
-    sterilized = df.BooleanFilter(field_name="sterilized")
-    dewormed = df.BooleanFilter(field_name="dewormed")
-    child_friendly = df.BooleanFilter(field_name="child_friendly")
-    trained = df.BooleanFilter(field_name="trained")
-    loves_play = df.BooleanFilter(field_name="loves_play")
-    loves_walks = df.BooleanFilter(field_name="loves_walks")
-    good_with_dogs = df.BooleanFilter(field_name="good_with_dogs")
-    good_with_cats = df.BooleanFilter(field_name="good_with_cats")
-    affectionate = df.BooleanFilter(field_name="affectionate")
-    needs_attention = df.BooleanFilter(field_name="needs_attention")
+    # 宠物特性（vaccinated=true 等）由 TraitMaskFilterBackend 合并成一个位掩码条件
+
+    def filter_search(self, qs, name, v):
+        return search_pets(qs, v)
+
+    def filter_status(self, qs, name, v):
+        return qs.filter(status=v.strip().lower())
 
     def filter_city(self, qs, name, v):
         """Filter by city - search in both address and shelter address"""
@@ -47,9 +51,7 @@ class PetFilter(df.FilterSet):
     
     class Meta:
         model = Pet
-        fields = ["name", "species", "breed", "status", "size", "sex", "city", "vaccinated", "sterilized", "dewormed", 
-                  "child_friendly", "trained", "loves_play", "loves_walks", "good_with_dogs", 
-                  "good_with_cats", "affectionate", "needs_attention"]
+        fields = ["name", "species", "breed", "status", "size", "sex", "city"]
 
 
 class LostFilter(df.FilterSet):
@@ -70,14 +72,91 @@ class LostFilter(df.FilterSet):
         fields = ['species', 'breed', 'color', 'sex', 'size', 'status', 'country', 'region', 'city', 'pet_name']
 
     def search(self, queryset, name, value):
-        if not value:
-            return queryset
-        return queryset.filter(
-            Q(pet_name__icontains=value) |
-            Q(address__city__name__icontains=value) |
-            Q(address__region__name__icontains=value) |
-            Q(address__country__name__icontains=value) |
-            Q(description__icontains=value) |
-            Q(color__icontains=value) |
-            Q(breed__icontains=value)
-        )
+        # 名字/品种/毛色/描述/地名都在 Lost.search_vector 里，按词前缀匹配，不再 join 地址表
+        return search_lost(queryset, value)
+
+
+class GeoFilterBackend(BaseFilterBackend):
+    """
+    ?bbox=min_lon,min_lat,max_lon,max_lat  和/或  ?near=lat,lon&radius=km
+    给了 near 且没有显式 ordering 时按距离由近到远排序（结果带 distance，单位米）。
+    放在 filter_backends 最后，避免被 OrderingFilter 的默认排序覆盖。
+    """
+    default_radius_km = 10
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        try:
+            if params.get('bbox'):
+                queryset = geo.in_bbox(queryset, geo.parse_bbox(params['bbox']))
+            if params.get('near'):
+                lat, lon = geo.parse_point(params['near'])
+                radius = float(params.get('radius') or self.default_radius_km)
+                if radius <= 0:
+                    raise ValueError('radius must be positive')
+                queryset = geo.within_radius(queryset, lat, lon, radius, order='ordering' not in params)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return queryset
+
+
+class TraitMaskFilterBackend(BaseFilterBackend):
+    """
+    ?vaccinated=true&trained=true&needs_attention=false —— 所有特性参数合并成一个条件：
+    traits & (要求|排除) = 要求。可枚举时写成 traits IN (...)，走 traits 上的 B-tree 索引。
+
+    ?match_traits=vaccinated,trained 或 ?match=profile（登录用户的 prefer_* 偏好）：
+    按共有特性个数 bit_count(traits & 偏好) 排序（结果带 trait_score），显式 ordering 时不改排序。
+    放在 OrderingFilter 之后。
+    """
+    TRUE_VALUES = {"true", "1", "yes", "on"}
+    FALSE_VALUES = {"false", "0", "no", "off"}
+
+    def _masks(self, params):
+        required = forbidden = 0
+        errors = {}
+        for name, bit in traits.BITS.items():
+            value = (params.get(name) or "").strip().lower()
+            if value in self.TRUE_VALUES:
+                required |= bit
+            elif value in self.FALSE_VALUES:
+                forbidden |= bit
+            elif value:
+                # 拼错的值不能悄悄忽略，否则结果反而变宽
+                errors[name] = "must be true or false"
+        if errors:
+            raise ValidationError(errors)
+        return required, forbidden
+
+    def _preferred(self, request):
+        params = request.query_params
+        if params.get("match_traits"):
+            names = [n.strip() for n in params["match_traits"].split(",") if n.strip()]
+            unknown = [n for n in names if n not in traits.BITS]
+            if unknown:
+                raise ValidationError({"match_traits": f"unknown traits: {', '.join(unknown)}"})
+            return traits.mask_of(names)
+        if params.get("match") == "profile" and request.user.is_authenticated:
+            profile = getattr(request.user, "profile", None)
+            return traits.mask_from(profile, prefix="prefer_") if profile else 0
+        return 0
+
+    def filter_queryset(self, request, queryset, view):
+        required, forbidden = self._masks(request.query_params)
+        if required or forbidden:
+            values = traits.supersets(required, forbidden)
+            if values is not None:
+                queryset = queryset.filter(traits__in=values)
+            else:
+                queryset = queryset.alias(
+                    trait_bits=F("traits").bitand(required | forbidden)
+                ).filter(trait_bits=required)
+
+        preferred = self._preferred(request)
+        if preferred:
+            queryset = queryset.annotate(trait_score=traits.TraitOverlap(F("traits"), models.Value(preferred)))
+            if "ordering" not in request.query_params:
+                queryset = queryset.order_by(
+                    "-trait_score", *(queryset.query.order_by or queryset.model._meta.ordering)
+                )
+        return queryset
@@ -0,0 +1,181 @@
+"""
+Process-local name -> row index for Country / Region / City.
+
+_create_or_resolve_address() used to run up to nine ``iexact`` queries per
+submission. The gazetteer answers the same lookups from dicts keyed by
+casefolded names, loaded lazily on first use. It is tagged with the
+Country/Region/City version counters from common.cache; those are bumped
+by the post_save/post_delete signals and at the end of seed_countries /
+seed_cities, and each process re-checks them at most every
+GAZETTEER_CHECK_INTERVAL seconds, reloading when they moved.
+
+A miss is not authoritative (the row may be newer than the snapshot):
+callers fall back to the database, where UPPER(name) indexes serve the
+``iexact`` lookups.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from common.cache import bump_version, get_versions
+from .models import City, Country, Region
+
+
+def _fold(s) -> str:
+    return " ".join(str(s).split()).casefold()
+
+
+class Gazetteer:
+    def __init__(self, version: tuple):
+        self.version = version
+        self.countries: Dict[int, Tuple[str, str]] = {}           # id -> (code, name)
+        self.country_by_code: Dict[str, int] = {}
+        self.country_by_name: Dict[str, int] = {}
+        self.regions: Dict[int, Tuple[int, str, str]] = {}        # id -> (country_id, code, name)
+        self.region_by_name: Dict[Tuple[int, str], int] = {}     # (country_id, name) -> id
+        self.regions_named: Dict[str, List[int]] = {}             # name -> ids (any country)
+        self.cities: Dict[int, Tuple[int, str]] = {}              # id -> (region_id, name)
+        self.city_by_name: Dict[Tuple[int, str], int] = {}
+        self.cities_named: Dict[str, List[int]] = {}
+
+    @classmethod
+    def load(cls, version: tuple) -> "Gazetteer":
+        g = cls(version)
+        for pk, code, name in Country.objects.order_by("id").values_list("id", "code", "name"):
+            g.countries[pk] = (code, name)
+            g.country_by_code.setdefault(code.upper(), pk)
+            g.country_by_name.setdefault(_fold(name), pk)
+        for pk, country_id, code, name in Region.objects.order_by("id").values_list("id", "country_id", "code", "name"):
+            g.regions[pk] = (country_id, code, name)
+            g.region_by_name.setdefault((country_id, _fold(name)), pk)
+            g.regions_named.setdefault(_fold(name), []).append(pk)
+        for pk, region_id, name in City.objects.order_by("id").values_list("id", "region_id", "name"):
+            g.cities[pk] = (region_id, name)
+            g.city_by_name.setdefault((region_id, _fold(name)), pk)
+            g.cities_named.setdefault(_fold(name), []).append(pk)
+        return g
+
+    # 每次返回新的实例，避免请求之间共享可变对象
+    def country(self, pk: Optional[int]) -> Optional[Country]:
+        row = self.countries.get(pk)
+        return Country(id=pk, code=row[0], name=row[1]) if row else None
+
+    def region(self, pk: Optional[int]) -> Optional[Region]:
+        row = self.regions.get(pk)
+        if not row:
+            return None
+        region = Region(id=pk, country_id=row[0], code=row[1], name=row[2])
+        region.country = self.country(row[0])
+        return region
+
+    def city(self, pk: Optional[int]) -> Optional[City]:
+        row = self.cities.get(pk)
+        if not row:
+            return None
+        city = City(id=pk, region_id=row[0], name=row[1])
+        city.region = self.region(row[0])
+        return city
+
+    def find_country(self, value: str) -> Optional[Country]:
+        value = str(value).strip()
+        pk = self.country_by_code.get(value.upper()) if len(value) == 2 else None
+        return self.country(pk or self.country_by_name.get(_fold(value)))
+
+    def find_region(self, name: str, country: Optional[Country] = None) -> Optional[Region]:
+        key = _fold(name)
+        if country is not None:
+            pk = self.region_by_name.get((country.pk, key))
+            if pk:
+                return self.region(pk)
+        ids = self.regions_named.get(key)
+        return self.region(ids[0]) if ids else None
+
+    def find_city(self, name: str, region: Optional[Region] = None) -> Optional[City]:
+        key = _fold(name)
+        if region is not None:
+            pk = self.city_by_name.get((region.pk, key))
+            if pk:
+                return self.city(pk)
+        ids = self.cities_named.get(key)
+        return self.city(ids[0]) if ids else None
+
+
+_current: Optional[Gazetteer] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get() -> Gazetteer:
+    """The current gazetteer, (re)loaded when the version stamp has moved."""
+    global _current, _checked_at
+    now = time.monotonic()
+    g = _current
+    if g is not None and now - _checked_at < settings.GAZETTEER_CHECK_INTERVAL:
+        return g
+    version = get_versions(Country, Region, City)
+    with _lock:
+        if _current is None or _current.version != version:
+            _current = Gazetteer.load(version)
+        _checked_at = now
+        return _current
+
+
+def bump():
+    """Invalidate every process's gazetteer (call after bulk writes that skip signals)."""
+    for model in (Country, Region, City):
+        bump_version(model)
+
+
+def reset():
+    global _current, _checked_at
+    with _lock:
+        _current, _checked_at = None, 0.0
+
+
+# ---------- lookups with database fallback ----------
+
+def country_by_id(pk: int) -> Optional[Country]:
+    return get().country(pk) or Country.objects.filter(pk=pk).first()
+
+
+def region_by_id(pk: int) -> Optional[Region]:
+    return get().region(pk) or Region.objects.filter(pk=pk).first()
+
+
+def city_by_id(pk: int) -> Optional[City]:
+    return get().city(pk) or City.objects.filter(pk=pk).first()
+
+
+def resolve_country(value: str) -> Optional[Country]:
+    """By ISO alpha-2 code (2-letter input) or by name, case-insensitively."""
+    found = get().find_country(value)
+    if found:
+        return found
+    value = str(value).strip()
+    if len(value) == 2:
+        found = Country.objects.filter(code__iexact=value).first()
+    return found or Country.objects.filter(name__iexact=value).first()
+
+
+def resolve_region(name: str, country: Optional[Country] = None) -> Optional[Region]:
+    """Within ``country`` first, then by name in any country."""
+    found = get().find_region(name, country)
+    if found:
+        return found
+    name = str(name).strip()
+    if country is not None:
+        found = Region.objects.filter(country=country, name__iexact=name).first()
+    return found or Region.objects.filter(name__iexact=name).first()
+
+
+def resolve_city(name: str, region: Optional[Region] = None) -> Optional[City]:
+    """Within ``region`` first, then by name in any region."""
+    found = get().find_city(name, region)
+    if found:
+        return found
+    name = str(name).strip()
+    if region is not None:
+        found = City.objects.filter(region=region, name__iexact=name).first()
+    return found or City.objects.filter(name__iexact=name).first()
@@ -0,0 +1,110 @@
+"""
+Spatial query helpers over Address.geom (PostGIS point, SRID 4326, GiST index).
+
+Pet, Lost, Shelter and Donation all reach their coordinates through an
+``address`` foreign key, so every helper takes a queryset of one of those
+models (or of Address itself) and filters on ``<path>__geom``.
+"""
+import math
+from typing import Optional, Tuple
+
+from django.contrib.gis.db.models.aggregates import Collect
+from django.contrib.gis.db.models.functions import Centroid, Distance, SnapToGrid
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from django.db.models import Count, Min
+
+from .models import Address
+
+EARTH_KM_PER_DEG_LAT = 111.32
+MAX_RADIUS_KM = 500
+# 聚合网格：每个 256px 瓦片横向切成几格（约 64px 一个聚合点）
+CLUSTER_CELLS_PER_TILE = 4
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def geom_path(model) -> str:
+    return "geom" if model is Address else "address__geom"
+
+
+def parse_bbox(value: str) -> BBox:
+    """'min_lon,min_lat,max_lon,max_lat' -> tuple; raises ValueError on bad input."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox out of range")
+    if min_lon > max_lon:
+        raise ValueError("bbox crossing the antimeridian is not supported")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """'lat,lon' -> (lat, lon); raises ValueError on bad input."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 2:
+        raise ValueError("near must be lat,lon")
+    lat, lon = parts
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("near out of range")
+    return lat, lon
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> BBox:
+    """Degree box enclosing a circle; used as the index-friendly prefilter for radius queries."""
+    dlat = radius_km / EARTH_KM_PER_DEG_LAT
+    dlon = radius_km / (EARTH_KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return (max(lon - dlon, -180.0), max(lat - dlat, -90.0),
+            min(lon + dlon, 180.0), min(lat + dlat, 90.0))
+
+
+def in_bbox(queryset, bbox: BBox):
+    path = geom_path(queryset.model)
+    return queryset.filter(**{f"{path}__bboverlaps": Polygon.from_bbox(bbox)})
+
+
+def within_radius(queryset, lat: float, lon: float, radius_km: float, order: bool = True):
+    """
+    Rows within ``radius_km`` of (lat, lon), annotated with ``distance`` (metres).
+
+    The bbox prefilter (``&&``) hits the GiST index; the exact spherical
+    distance is only computed for the rows inside the box.
+    """
+    radius_km = min(float(radius_km), MAX_RADIUS_KM)
+    path = geom_path(queryset.model)
+    center = Point(lon, lat, srid=4326)
+    qs = in_bbox(queryset, radius_bbox(lat, lon, radius_km)).filter(
+        **{f"{path}__distance_lte": (center, D(km=radius_km))}
+    ).annotate(distance=Distance(path, center))
+    return qs.order_by("distance") if order else qs
+
+
+def nearest(queryset, lat: float, lon: float, limit: int = 20, radius_km: Optional[float] = None):
+    """Closest rows to (lat, lon), optionally limited to a radius."""
+    if radius_km is not None:
+        return within_radius(queryset, lat, lon, radius_km)[:limit]
+    path = geom_path(queryset.model)
+    center = Point(lon, lat, srid=4326)
+    return (queryset.filter(**{f"{path}__isnull": False})
+            .annotate(distance=Distance(path, center)).order_by("distance")[:limit])
+
+
+def cluster_cell_size(zoom: int) -> float:
+    """Grid cell edge in degrees for a web-map zoom level."""
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+def clusters(queryset, zoom: int):
+    """
+    Aggregate rows into grid cells: one row per non-empty cell with ``count``,
+    ``center`` (centroid of the member points) and ``first_id`` (the member id
+    when the cell holds a single row). Biggest cells first.
+    """
+    path = geom_path(queryset.model)
+    return (queryset.filter(**{f"{path}__isnull": False})
+            .annotate(cell=SnapToGrid(path, cluster_cell_size(zoom)))
+            .values("cell")
+            .annotate(count=Count("pk"), center=Centroid(Collect(path)), first_id=Min("pk"))
+            .order_by("-count"))
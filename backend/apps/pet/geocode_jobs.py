@@ -0,0 +1,163 @@
+"""
+Asynchronous geocoding for Address rows.
+
+Request handlers call enqueue() after saving an Address without coordinates.
+Results already in the GeocodeResult table are applied on the spot (one
+indexed query, no HTTP); everything else becomes a GeocodeJob and the
+address is marked ``pending``. ``manage.py geocode_worker`` claims due jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, so several workers can share the
+queue, and fills the coordinates in later.
+
+Provider errors are retried with exponential backoff up to
+GEOCODE_JOB_MAX_ATTEMPTS; a "not found" answer is final.
+"""
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import geocoding
+from .models import Address, GeocodeJob, GeocodeResult
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = (GeocodeJob.Status.PENDING, GeocodeJob.Status.RUNNING)
+
+
+def _set_status(address: Address, status: str):
+    # 只改状态不动坐标，不触发 post_save（列表缓存无需失效）
+    Address.objects.filter(pk=address.pk).update(geocode_status=status)
+    address.geocode_status = status
+
+
+def apply_result(address: Address, result: Optional[GeocodeResult]):
+    """Copy a geocoding result onto the address unless it got coordinates in the meantime."""
+    if address.latitude is not None and address.longitude is not None:
+        if address.geocode_status != Address.GeocodeStatus.OK:
+            _set_status(address, Address.GeocodeStatus.OK)
+        return
+    coords = result.coords if result is not None else None
+    if not coords:
+        _set_status(address, Address.GeocodeStatus.NOT_FOUND)
+        return
+    address.longitude, address.latitude = round(coords[0], 6), round(coords[1], 6)
+    address.geocode_status = Address.GeocodeStatus.OK
+    address.save(update_fields=["latitude", "longitude", "geocode_status"])
+
+
+def enqueue(address: Optional[Address], query: Optional[str] = None,
+            context: Optional[Dict[str, Any]] = None) -> Optional[GeocodeJob]:
+    """
+    Schedule geocoding for ``address`` if it has no coordinates. ``query``/``context``
+    default to what the Address row itself can describe (see geocoding.address_query).
+    Returns the queued job, or None when nothing had to be queued.
+    """
+    if address is None or address.pk is None:
+        return None
+    if address.latitude is not None and address.longitude is not None:
+        return None
+    derived = query is None and context is None
+    job = GeocodeJob.objects.filter(address=address, status__in=ACTIVE).first()
+    if job is not None and derived:
+        # 已在队列中；入队时记录的查询通常比 Address 行本身更完整，保留
+        return job
+    if derived:
+        query, context = geocoding.address_query(address)
+    query = query or ""
+    context = {k: v for k, v in (context or {}).items() if v}
+    if not query and not context:
+        return job
+
+    stored = geocoding.geocode(query, context, network=False)
+    if stored is not None:
+        if job is not None:
+            GeocodeJob.objects.filter(pk=job.pk).update(status=GeocodeJob.Status.DONE)
+        apply_result(address, stored)
+        return None
+
+    if not settings.GEOCODE_ASYNC:
+        result = geocoding.geocode(query, context)
+        if result is not None:
+            apply_result(address, result)
+        return None
+
+    if job is None:
+        job = GeocodeJob.objects.create(address=address, query=query, context=context)
+    elif (job.query, job.context) != (query, context):
+        GeocodeJob.objects.filter(pk=job.pk).update(query=query, context=context)
+    _set_status(address, Address.GeocodeStatus.PENDING)
+    return job
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+def claim(limit: int, worker: str) -> List[GeocodeJob]:
+    """
+    Lock up to ``limit`` due jobs for ``worker`` and mark them running. RUNNING jobs
+    whose lock is older than GEOCODE_JOB_LOCK_TIMEOUT (crashed worker) are reclaimed.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.GEOCODE_JOB_LOCK_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            GeocodeJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=GeocodeJob.Status.PENDING, run_after__lte=now)
+                    | Q(status=GeocodeJob.Status.RUNNING, locked_at__lt=stale))
+            .order_by("run_after", "id")[:limit]
+        )
+        if jobs:
+            GeocodeJob.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                status=GeocodeJob.Status.RUNNING, locked_at=now, locked_by=worker,
+                attempts=F("attempts") + 1, updated_at=now,
+            )
+            for job in jobs:
+                job.status, job.locked_at, job.locked_by = GeocodeJob.Status.RUNNING, now, worker
+                job.attempts += 1
+    return jobs
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before retry number ``attempts`` (1-based), with jitter."""
+    delay = min(settings.GEOCODE_JOB_BACKOFF_MAX, settings.GEOCODE_JOB_BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _retry_or_fail(job: GeocodeJob, error: str):
+    job.last_error = error[:2000]
+    job.locked_at, job.locked_by = None, ""
+    if job.attempts >= settings.GEOCODE_JOB_MAX_ATTEMPTS:
+        job.status = GeocodeJob.Status.FAILED
+        Address.objects.filter(pk=job.address_id).update(geocode_status=Address.GeocodeStatus.FAILED)
+    else:
+        job.status = GeocodeJob.Status.PENDING
+        job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    job.save(update_fields=["status", "run_after", "locked_at", "locked_by", "last_error", "updated_at"])
+
+
+def run_job(job: GeocodeJob) -> str:
+    """Process one claimed job; returns its new status."""
+    try:
+        result = geocoding.geocode(job.query, job.context, raise_errors=True)
+    except geocoding.ProviderError as exc:
+        _retry_or_fail(job, str(exc))
+        return job.status
+    except Exception as exc:
+        logger.exception("Geocode job %s crashed", job.pk)
+        _retry_or_fail(job, repr(exc))
+        return job.status
+    address = Address.objects.filter(pk=job.address_id).first()
+    if address is not None:
+        apply_result(address, result)
+    job.status = GeocodeJob.Status.DONE
+    job.locked_at, job.locked_by, job.last_error = None, "", ""
+    job.save(update_fields=["status", "locked_at", "locked_by", "last_error", "updated_at"])
+    return job.status
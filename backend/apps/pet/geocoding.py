@@ -0,0 +1,394 @@
+"""
+Geocoding with a persistent result table.
+
+Lookup order for one address: shared cache (24h) -> GeocodeResult row ->
+providers (Mapbox when a token is configured, then Nominatim). Both hits and
+misses are stored in GeocodeResult; misses expire after
+GEOCODE_NEGATIVE_TTL seconds so the address is retried eventually. Transport
+errors are never stored, so an outage does not poison the table.
+
+geocode_many() resolves a batch: it normalizes and de-duplicates the input,
+answers what it can from the table in one query and sends the rest to the
+providers, throttled by a per-provider token bucket (GEOCODER_RATE_LIMITS).
+In-flight requests per provider are additionally capped by
+GEOCODER_CONCURRENCY, which matters for the threaded geocode_worker.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import GeocodeResult
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "gc:"
+CACHE_TIMEOUT = 24 * 3600
+MIN_MAPBOX_RELEVANCE = 0.7
+
+GeocodeHit = namedtuple("GeocodeHit", "lon lat provider confidence")
+
+
+class ProviderError(Exception):
+    """Transport/HTTP failure; the lookup result is unknown, not negative."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def rate_limiter(provider: str) -> TokenBucket:
+    with _buckets_lock:
+        if provider not in _buckets:
+            rate = settings.GEOCODER_RATE_LIMITS.get(provider, 1)
+            _buckets[provider] = TokenBucket(rate)
+        return _buckets[provider]
+
+
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+
+@contextmanager
+def provider_slot(provider: str):
+    """Hold one of the provider's GEOCODER_CONCURRENCY slots for the duration of a request."""
+    with _buckets_lock:
+        if provider not in _slots:
+            limit = settings.GEOCODER_CONCURRENCY.get(provider, 1)
+            _slots[provider] = threading.BoundedSemaphore(max(1, int(limit)))
+        slot = _slots[provider]
+    with slot:
+        yield
+
+
+# ---------- query normalization ----------
+
+def _normalize_street(s: str) -> str:
+    s = str(s).strip()
+    # strip any trailing apartment/room info after a comma
+    if ',' in s:
+        s = s.split(',')[0].strip()
+    # reorder patterns like "12/16 Kopińska" -> "Kopińska 12/16"
+    m = re.match(r"^(\d+[\w\/-]*)\s+(.+)$", s)
+    if m:
+        return f"{m.group(2).strip()} {m.group(1).strip()}"
+    return s
+
+
+def build_query(address: str, context: Optional[Dict[str, Any]] = None) -> str:
+    """The text sent to providers: structured context wins over the free-form string."""
+    context = context or {}
+    parts = []
+    if context.get('street'):
+        parts.append(_normalize_street(context['street']))
+    for k in ('city', 'postal_code', 'country'):
+        if context.get(k):
+            parts.append(str(context[k]).strip())
+    return ", ".join(p for p in parts if p) or (address or "").strip()
+
+
+def normalize_query(address: str, context: Optional[Dict[str, Any]] = None) -> str:
+    """Canonical form used for the cache/table key (case, spacing and punctuation folded)."""
+    context = context or {}
+    text = build_query(address, context)
+    if context.get('country_code'):
+        text = f"{text} [{context['country_code']}]"
+    text = re.sub(r"[\s,;]+", " ", text.casefold()).strip()
+    return text
+
+
+def query_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def address_query(address) -> Tuple[str, Dict[str, Any]]:
+    """(free-form string, structured context) for a saved Address row."""
+    city = address.city if address.city_id else None
+    region = address.region if address.region_id else None
+    country = address.country if address.country_id else None
+    parts = [
+        address.street or '',
+        address.building_number or '',
+        city.name if city else '',
+        region.name if region else '',
+        country.name if country else '',
+        address.postal_code or '',
+    ]
+    context = {
+        'street': f"{address.street} {address.building_number}".strip() or None,
+        'city': city.name if city else None,
+        'region': region.name if region else None,
+        'country': country.name if country else None,
+        'country_code': country.code if country else None,
+        'postal_code': address.postal_code or None,
+    }
+    return ", ".join(p for p in parts if p), context
+
+
+# ---------- providers ----------
+
+def _check_status(provider: str, resp) -> None:
+    # 只有 404 算“没找到”；401/403（令牌失效）、429（限流）、5xx 都是提供方故障，
+    # 不能当作否定结果缓存起来
+    if not resp.ok and resp.status_code != 404:
+        raise ProviderError(f"{provider}: HTTP {resp.status_code}")
+
+
+def _mapbox_feature(data) -> Optional[GeocodeHit]:
+    feats = (data or {}).get('features', [])
+    if not feats:
+        return None
+    f0 = feats[0]
+    # 要求足够相关且类型为 address/poi 才接受（略微放宽阈值以适配复杂门牌）
+    if f0.get('relevance', 0) >= MIN_MAPBOX_RELEVANCE and any(t in ('address', 'poi') for t in f0.get('place_type', [])):
+        center = f0.get('center')
+        if isinstance(center, list) and len(center) >= 2:
+            return GeocodeHit(float(center[0]), float(center[1]), 'mapbox', float(f0.get('relevance', 0)))
+    return None
+
+
+def mapbox_lookup(query: str, context: Dict[str, Any], session=requests) -> Optional[GeocodeHit]:
+    token = getattr(settings, 'MAPBOX_TOKEN', None) or getattr(settings, 'MAPBOX_ACCESS_TOKEN', None)
+    if not token:
+        return None
+    params = {"access_token": token, "limit": 1, "autocomplete": "false", "types": "address,poi", "language": "pl"}
+    if context.get('country_code'):
+        params['country'] = str(context['country_code']).lower()
+    candidates = [query]
+    # 额外尝试将 “12/16” 简化为 “12”，并确保街道名在前
+    if context.get('street') and '/' in context['street']:
+        s = _normalize_street(context['street'])
+        alt = s.replace('/', ' ').split()[-1]
+        for k in ('city', 'postal_code'):
+            if context.get(k):
+                alt += f", {context[k]}"
+        candidates.append(alt)
+    for text in candidates:
+        rate_limiter('mapbox').acquire()
+        url = f"{settings.GEOCODER_MAPBOX_URL}/{requests.utils.quote(text)}.json"
+        try:
+            with provider_slot('mapbox'):
+                resp = session.get(url, params=params, timeout=settings.GEOCODER_TIMEOUT)
+        except requests.RequestException as exc:
+            raise ProviderError(f"mapbox: {exc}") from exc
+        _check_status('mapbox', resp)
+        if resp.ok:
+            hit = _mapbox_feature(resp.json())
+            if hit:
+                return hit
+    return None
+
+
+def nominatim_lookup(query: str, context: Dict[str, Any], session=requests) -> Optional[GeocodeHit]:
+    headers = {"User-Agent": "straypet/1.0 (geocoder)"}
+    params: Dict[str, Any] = {"format": "jsonv2", "limit": 1, "addressdetails": 1, "accept-language": "pl"}
+    # 尽量使用结构化查询提升精度
+    if any(context.get(k) for k in ('street', 'city', 'country', 'postal_code')):
+        for k, p in (('street', 'street'), ('city', 'city'), ('postal_code', 'postalcode'), ('country', 'country')):
+            if context.get(k):
+                params[p] = context[k]
+    else:
+        params['q'] = query
+    rate_limiter('nominatim').acquire()
+    try:
+        with provider_slot('nominatim'):
+            resp = session.get(settings.GEOCODER_NOMINATIM_URL, params=params, headers=headers,
+                               timeout=settings.GEOCODER_TIMEOUT)
+    except requests.RequestException as exc:
+        raise ProviderError(f"nominatim: {exc}") from exc
+    _check_status('nominatim', resp)
+    if not resp.ok:
+        return None
+    arr = resp.json() or []
+    if not arr:
+        return None
+    importance = arr[0].get('importance')
+    return GeocodeHit(float(arr[0]['lon']), float(arr[0]['lat']), 'nominatim',
+                      float(importance) if importance is not None else None)
+
+
+PROVIDERS = (mapbox_lookup, nominatim_lookup)
+
+
+def lookup(address: str, context: Optional[Dict[str, Any]] = None, session=requests) -> Optional[GeocodeHit]:
+    """
+    Ask the providers in order. Returns a hit, or None when every provider
+    answered "not found"; raises ProviderError when one failed and none found it.
+    """
+    context = context or {}
+    query = build_query(address, context)
+    errors = []
+    for provider in PROVIDERS:
+        try:
+            hit = provider(query, context, session=session)
+        except ProviderError as exc:
+            logger.debug('Geocoding provider failed: %s', exc)
+            errors.append(exc)
+            continue
+        if hit:
+            return hit
+    if errors:
+        # 有提供方没答上来时不能断定“没找到”
+        raise ProviderError("; ".join(str(e) for e in errors))
+    return None
+
+
+# ---------- persistence ----------
+
+def _fresh(row: GeocodeResult, now) -> bool:
+    return row.expires_at is None or row.expires_at > now
+
+
+def _result_fields(hit: Optional[GeocodeHit], now) -> Dict[str, Any]:
+    if hit:
+        return {"found": True, "latitude": hit.lat, "longitude": hit.lon, "provider": hit.provider,
+                "confidence": hit.confidence, "expires_at": None}
+    return {"found": False, "latitude": None, "longitude": None, "provider": "", "confidence": None,
+            "expires_at": now + timedelta(seconds=settings.GEOCODE_NEGATIVE_TTL)}
+
+
+def _cache_set(key: str, row: GeocodeResult):
+    try:
+        cache.set(CACHE_PREFIX + key, row, CACHE_TIMEOUT)
+    except Exception:
+        pass
+
+
+def store(normalized: str, hit: Optional[GeocodeHit]) -> GeocodeResult:
+    key = query_key(normalized)
+    row, _ = GeocodeResult.objects.update_or_create(
+        key=key, defaults={"query": normalized, **_result_fields(hit, timezone.now())},
+    )
+    _cache_set(key, row)
+    return row
+
+
+def geocode(address: str, context: Optional[Dict[str, Any]] = None, *, network: bool = True,
+            raise_errors: bool = False) -> Optional[GeocodeResult]:
+    """
+    Resolve one address to a GeocodeResult (check ``.found`` / ``.coords``).
+    Returns None when nothing is stored and the providers could not be asked
+    (network=False) or did not answer; with raise_errors=True the latter
+    raises ProviderError instead.
+    """
+    if not address and not context:
+        return None
+    normalized = normalize_query(address, context)
+    if not normalized:
+        return None
+    key = query_key(normalized)
+    now = timezone.now()
+    try:
+        row = cache.get(CACHE_PREFIX + key)
+    except Exception:
+        row = None
+    if row is not None and _fresh(row, now):
+        return row
+    row = GeocodeResult.objects.filter(key=key).first()
+    if row is not None and _fresh(row, now):
+        _cache_set(key, row)
+        return row
+    if not network:
+        return None
+    try:
+        hit = lookup(address, context)
+    except ProviderError:
+        if raise_errors:
+            raise
+        return None
+    return store(normalized, hit)
+
+
+_thread_local = threading.local()
+
+
+def _thread_session() -> requests.Session:
+    # requests.Session 不保证线程安全：每个线程一个，复用各自的 keep-alive 连接
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+
+def _lookup_in_thread(item):
+    address, context = item
+    try:
+        return lookup(address, context, session=_thread_session()), None
+    except ProviderError as exc:
+        return None, exc
+
+
+def geocode_many(items: Iterable[Tuple[str, Optional[Dict[str, Any]]]], *, network: bool = True,
+                 workers: int = 1, stats: Optional[Dict[str, int]] = None) -> List[Optional[GeocodeResult]]:
+    """
+    Batch version of geocode(): one result per input item, same order.
+    Identical normalized queries are looked up once; stored results are read
+    in a single query; the rest go to the providers under the rate limits,
+    ``workers`` HTTP lookups at a time. Only the calling thread touches the
+    database. ``stats`` (if given) is incremented with unique/stored/looked_up/errors.
+    """
+    items = list(items)
+    normalized = [normalize_query(a, c) if (a or c) else "" for a, c in items]
+    keys = {n: query_key(n) for n in set(normalized) if n}
+    now = timezone.now()
+    by_key = {
+        row.key: row for row in GeocodeResult.objects.filter(key__in=list(keys.values()))
+        if _fresh(row, now)
+    }
+    stored = len(by_key)
+    todo = {}
+    if network:
+        for (address, context), n in zip(items, normalized):
+            if n and keys[n] not in by_key and n not in todo:
+                todo[n] = (address, context)
+    errors = 0
+    if todo:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode") as pool:
+                answers = list(pool.map(_lookup_in_thread, todo.values()))
+        else:
+            answers = [_lookup_in_thread(item) for item in todo.values()]
+        for n, (hit, error) in zip(todo, answers):
+            if error is not None:
+                errors += 1
+                continue
+            by_key[keys[n]] = store(n, hit)
+    if stats is not None:
+        for name, value in (("unique", len(keys)), ("stored", stored), ("looked_up", len(todo)), ("errors", errors)):
+            stats[name] = stats.get(name, 0) + value
+    return [by_key.get(keys[n]) if n else None for n in normalized]
@@ -0,0 +1,198 @@
+"""
+Index advisor for the public pet catalogue (PetViewSet.list + PetFilter).
+
+Filter combinations are captured from production by sampling list requests
+(PET_FILTER_SAMPLE_RATE) into the ``apps.pet.filter_usage`` logger; access
+logs with ``/pet/?...`` URLs work as well. ``manage.py advise_pet_indexes``
+groups them by the set of filters used and, for every combination, proposes
+one partial B-tree index:
+
+- the catalogue predicate ``status IN (available, pending)`` that every
+  list query carries becomes the index condition;
+- equality filters become leading key columns (``UPPER(col)`` for the
+  ``iexact`` ones, matching the SQL django-filter generates), then the
+  packed ``traits`` column when any trait is filtered (TraitMaskFilterBackend
+  turns them into ``traits IN (...)``), then the age range columns, and the
+  ordering column last when no range precedes it.
+
+Substring filters (name/species/breed/city) and full-text search are left
+to the trigram / tsvector indexes and are ignored here.
+"""
+import hashlib
+import logging
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Upper
+
+from common.traits import TRAITS
+from .models import CATALOGUE_STATUSES, Pet
+
+usage_logger = logging.getLogger("apps.pet.filter_usage")
+
+CAPTURE_MARKER = "pet_filter_query"
+IGNORED_PARAMS = {"page", "page_size", "format", "cursor"}
+# 自由文本参数只记录“用过”，不记录内容
+TEXT_PARAMS = {"q", "search", "name", "species", "breed", "city"}
+EXACT_PARAMS = ("status",)
+IEXACT_PARAMS = ("sex", "size")
+RANGE_PARAMS = ("age_min", "age_max")
+TRAIT_PARAMS = TRAITS
+DEFAULT_ORDERING = "-pub_date"
+
+# 没有采集数据时使用：默认目录页和移动端（status=available）的常见组合
+DEFAULT_QUERIES = (
+    "",
+    "status=available",
+    "status=available&species=_",
+    "age_max=12&age_min=0",
+    "vaccinated=true",
+)
+
+_QUERY_RE = re.compile(r"(?:/pet/|%s )\?([^\s\"']*)" % CAPTURE_MARKER)
+
+
+def normalize(params) -> str:
+    """Canonical, privacy-safe query string for a QueryDict/dict of list parameters."""
+    items = []
+    for key in sorted(params.keys()):
+        if key in IGNORED_PARAMS:
+            continue
+        value = params.get(key)
+        if value in (None, ""):
+            continue
+        items.append((key, "_" if key in TEXT_PARAMS else str(value).lower()))
+    return urlencode(items)
+
+
+def capture(params) -> None:
+    """Log a sample of catalogue filter combinations for advise_pet_indexes."""
+    rate = getattr(settings, "PET_FILTER_SAMPLE_RATE", 0)
+    if rate > 0 and random.random() < rate:
+        usage_logger.info("%s ?%s", CAPTURE_MARKER, normalize(params))
+
+
+def parse_lines(lines: Iterable[str]) -> Counter:
+    """Count normalized query strings in capture logs, access logs or plain ``a=1&b=2`` lines."""
+    counts = Counter()
+    for line in lines:
+        line = line.strip()
+        match = _QUERY_RE.search(line)
+        if match:
+            raw = match.group(1)
+        elif line and " " not in line and ("=" in line or line == "?"):
+            raw = line.lstrip("?")
+        else:
+            continue
+        counts[normalize(dict(parse_qsl(raw)))] += 1
+    return counts
+
+
+@dataclass
+class Proposal:
+    expressions: List[object] = field(default_factory=list)
+    condition: Q = field(default_factory=Q)
+    columns: List[str] = field(default_factory=list)    # 便于阅读的列描述
+
+    @property
+    def name(self) -> str:
+        digest = hashlib.md5(repr((self.columns, self.condition)).encode("utf-8")).hexdigest()[:8]
+        return f"pet_adv_{digest}"
+
+    def index(self, name: Optional[str] = None) -> models.Index:
+        return models.Index(*self.expressions, condition=self.condition, name=name or self.name)
+
+    def describe(self) -> str:
+        terms = [f"{k[:-4]} IN {tuple(v)}" if k.endswith("__in") else f"{k} = {v}"
+                 for k, v in self.condition.children]
+        return f"({', '.join(self.columns)}) WHERE {' AND '.join(terms)}"
+
+    def as_code(self, name: Optional[str] = None) -> str:
+        """The index as it would be written in Pet.Meta.indexes."""
+        parts = []
+        for column in self.columns:
+            if column.startswith("UPPER("):
+                parts.append(f'Upper("{column[6:-1]}")')
+            elif column.startswith("-"):
+                parts.append(f'F("{column[1:]}").desc()')
+            else:
+                parts.append(f'F("{column}")')
+        condition = ", ".join(
+            "status__in=CATALOGUE_STATUSES" if k == "status__in" and tuple(v) == CATALOGUE_STATUSES else f"{k}={v!r}"
+            for k, v in self.condition.children
+        )
+        return f'models.Index({", ".join(parts)}, condition=models.Q({condition}), name="{name or self.name}")'
+
+
+def _ordering(params: Dict[str, str]) -> str:
+    ordering = params.get("ordering") or DEFAULT_ORDERING
+    return ordering.split(",")[0]
+
+
+def propose(query: str) -> Optional[Proposal]:
+    """The partial index serving one normalized query string, or None when nothing is indexable."""
+    params = dict(parse_qsl(query))
+    proposal = Proposal(condition=Q(status__in=CATALOGUE_STATUSES))
+    for name in EXACT_PARAMS:
+        if name in params:
+            proposal.expressions.append(F(name))
+            proposal.columns.append(name)
+    for name in IEXACT_PARAMS:
+        if name in params:
+            proposal.expressions.append(Upper(name))
+            proposal.columns.append(f"UPPER({name})")
+    if any(name in params for name in TRAIT_PARAMS):
+        proposal.expressions.append(F("traits"))
+        proposal.columns.append("traits")
+    has_range = any(name in params for name in RANGE_PARAMS)
+    if has_range:
+        proposal.expressions += [F("age_years"), F("age_months")]
+        proposal.columns += ["age_years", "age_months"]
+    else:
+        ordering = _ordering(params)
+        column = ordering.lstrip("-")
+        if column in {"pk", "id"} or not column:
+            return proposal if proposal.expressions else None
+        proposal.expressions.append(F(column).desc() if ordering.startswith("-") else F(column))
+        proposal.columns.append(ordering)
+    return proposal
+
+
+def same_index(a: models.Index, b: models.Index) -> bool:
+    """True when two indexes have the same definition (names aside)."""
+    def key(index):
+        _, args, kwargs = index.deconstruct()
+        kwargs.pop("name", None)
+        if kwargs.get("fields"):
+            # fields=["-pub_date"] 与 F("pub_date").desc() 等价
+            args = tuple(F(f[1:]).desc() if f.startswith("-") else F(f) for f in kwargs.pop("fields"))
+        return repr(args), repr(kwargs)
+    return key(a) == key(b)
+
+
+def existing_index(proposal: Proposal) -> Optional[models.Index]:
+    candidate = proposal.index()
+    return next((index for index in Pet._meta.indexes if same_index(index, candidate)), None)
+
+
+def catalogue_queryset(query: str):
+    """The queryset PetViewSet.list runs for ``query`` (without serializer prefetches)."""
+    from .filters import PetFilter
+    from .views import PetViewSet
+
+    params = dict(parse_qsl(query))
+    # 文本参数被匿名化了，用一个占位值代替
+    params = {k: ("x" if v == "_" else v) for k, v in params.items()}
+    qs = Pet.objects.filter(status__in=CATALOGUE_STATUSES).defer("search_vector").order_by("-pub_date")
+    qs = PetFilter(params, queryset=qs).qs
+    ordering = params.get("ordering")
+    if ordering and ordering.lstrip("-") in PetViewSet.ordering_fields:
+        qs = qs.order_by(ordering)
+    return qs
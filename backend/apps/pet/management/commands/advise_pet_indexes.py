@@ -0,0 +1,113 @@
+import json
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.pet import index_advisor
+from apps.pet.models import Pet
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _plan(qs):
+    """(total cost, index names used) of a query's plan."""
+    plan = json.loads(qs.explain(format='json'))[0]['Plan']
+    used, stack = set(), [plan]
+    while stack:
+        node = stack.pop()
+        if node.get('Index Name'):
+            used.add(node['Index Name'])
+        stack.extend(node.get('Plans', []))
+    return plan['Total Cost'], used
+
+
+def _cost(query, page_size):
+    """Cost of what one list request runs: the page plus the paginator's COUNT(*)."""
+    qs = index_advisor.catalogue_queryset(query)
+    page_cost, used = _plan(qs[:page_size])
+    count_cost, count_used = _plan(qs.values('pk').order_by())
+    return page_cost + count_cost, used | count_used
+
+
+class Command(BaseCommand):
+    help = ("Read captured pet catalogue filter combinations (apps.pet.filter_usage log lines, access "
+            "logs with /pet/?... URLs, or plain query strings), propose a partial index per combination "
+            "and estimate its benefit with EXPLAIN. Candidate indexes are created inside a transaction "
+            "that is rolled back (this takes a lock on pet_pet: run it against a replica or staging copy).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help="Capture/access log files ('-' for stdin); "
+                                                     "defaults to the built-in catalogue queries")
+        parser.add_argument('--top', type=int, default=20, help='Number of proposals to evaluate')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--no-explain', action='store_true', help='Only list proposals, do not run EXPLAIN')
+
+    def _read(self, files):
+        counts = Counter()
+        for path in files:
+            if path == '-':
+                counts += index_advisor.parse_lines(sys.stdin)
+            else:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    counts += index_advisor.parse_lines(f)
+        return counts
+
+    def handle(self, *args, **options):
+        counts = self._read(options['files'])
+        if not counts:
+            self.stdout.write(self.style.NOTICE('No captured queries; using the default catalogue queries.'))
+            counts = Counter(index_advisor.DEFAULT_QUERIES)
+
+        # 同一个索引能服务的组合合并统计
+        groups = {}
+        for query, n in counts.most_common():
+            proposal = index_advisor.propose(query)
+            if proposal is None:
+                continue
+            group = groups.setdefault(proposal.describe(), {'proposal': proposal, 'count': 0, 'queries': []})
+            group['count'] += n
+            group['queries'].append(query)
+        ranked = sorted(groups.values(), key=lambda g: -g['count'])[:options['top']]
+        self.stdout.write(f'{sum(counts.values())} requests, {len(counts)} combinations, {len(groups)} candidate indexes')
+
+        recommended = []
+        for group in ranked:
+            proposal, query = group['proposal'], group['queries'][0]
+            existing = index_advisor.existing_index(proposal)
+            self.stdout.write('')
+            self.stdout.write(f"[{group['count']}x] {proposal.describe()}")
+            self.stdout.write(f'    e.g. ?{query}' if query else '    e.g. (no filters)')
+            if existing is not None:
+                self.stdout.write(self.style.SUCCESS(f'    already covered by {existing.name}'))
+                continue
+            if options['no_explain']:
+                recommended.append(proposal)
+                continue
+
+            before, _ = _cost(query, options['page_size'])
+            index = proposal.index()
+            try:
+                with transaction.atomic():
+                    with connection.schema_editor(atomic=False) as editor:
+                        editor.add_index(Pet, index)
+                    after, used = _cost(query, options['page_size'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+            gain = (before - after) / before * 100 if before else 0.0
+            line = f'    estimated cost {before:,.0f} -> {after:,.0f} ({gain:.0f}% less)'
+            if index.name in used and gain > 0:
+                self.stdout.write(self.style.SUCCESS(line))
+                recommended.append(proposal)
+            else:
+                self.stdout.write(self.style.WARNING(line + ', planner does not use it'))
+
+        if recommended:
+            self.stdout.write('')
+            self.stdout.write('Add to Pet.Meta.indexes:')
+            for proposal in recommended:
+                self.stdout.write(f'    {proposal.as_code()},')
@@ -0,0 +1,43 @@
+import signal
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from apps.pet import approvals, geocode_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued ApprovalBatch rows (bulk donation approval from the admin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when no batch is pending instead of polling')
+
+    def handle(self, *args, **options):
+        # 与 geocode_worker 同一个 locked_by 取值（截断到 64 个字符）
+        worker = geocode_jobs.worker_name()
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        totals = Counter()
+        self.stdout.write(self.style.NOTICE(f'approval_worker {worker}'))
+        while not self._stop:
+            batch = approvals.claim(worker)
+            if batch is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+            started = time.perf_counter()
+            batch = approvals.run_batch(batch)
+            totals.update(approved=batch.approved, failed=batch.failed)
+            self.stdout.write(f'batch #{batch.pk} {batch.status}: {batch.approved} approved, '
+                              f'{batch.failed} failed of {batch.total} in {time.perf_counter() - started:.1f}s')
+        summary = ', '.join(f'{k}={v}' for k, v in sorted(totals.items())) or 'no batches'
+        self.stdout.write(self.style.SUCCESS(f'Stopped. {summary}'))
+
+    def _request_stop(self, signum, frame):
+        # 处理完当前批次再退出；进程被杀时进度已按块保存，过期后由其他 worker 接着处理
+        self._stop = True
@@ -0,0 +1,84 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from apps.pet.models import Donation, DonationPhoto, Pet, PetPhoto
+
+
+def _legacy_approve(donation):
+    """The previous Donation.approve photo handling: read each file, write it twice, all in the transaction."""
+    with transaction.atomic():
+        pet = Pet.objects.create(name=donation.name, species=donation.species, created_by=donation.donor,
+                                 status=Pet.Status.AVAILABLE)
+        for idx, photo in enumerate(donation.photos.order_by("id")):
+            photo.image.open("rb")
+            data = photo.image.read()
+            photo.image.close()
+            orig_name = photo.image.name.split("/")[-1]
+            if idx == 0:
+                pet.cover.name = default_storage.save(f"pets/{pet.id}_{orig_name}", ContentFile(data))
+                pet.save(update_fields=["cover"])
+            pet_photo = PetPhoto.objects.create(pet=pet, order=idx)
+            pet_photo.image.save(f"pets/photos/{pet.id}_{idx}_{orig_name}", ContentFile(data), save=True)
+        donation.created_pet = pet
+        donation.status = "approved"
+        donation.save(update_fields=["created_pet", "status", "pub_date"])
+    return pet
+
+
+class Command(BaseCommand):
+    help = ("Benchmark Donation.approve with --photos files of --size-mb each, in a temporary MEDIA_ROOT: "
+            "time spent inside the transaction vs after commit, for the previous copy-twice code and "
+            "every MEDIA_SHARE_MODE. Rows are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=8)
+        parser.add_argument('--size-mb', type=float, default=4.0)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _donation(self, donor, source_names):
+        donation = Donation.objects.create(donor=donor, name='Bench', species='dog', status='submitted')
+        DonationPhoto.objects.bulk_create([DonationPhoto(donation=donation, image=name) for name in source_names])
+        return donation
+
+    def _run(self, label, approve, donor, source_names, repeat):
+        inside, after = [], []
+        for _ in range(repeat):
+            donation = self._donation(donor, source_names)
+            t0 = time.perf_counter()
+            with transaction.atomic():
+                approve(donation)
+                t1 = time.perf_counter()
+            t2 = time.perf_counter()  # 退出最外层事务：提交 + on_commit 回调
+            inside.append((t1 - t0) * 1000)
+            after.append((t2 - t1) * 1000)
+        self.stdout.write(f'{label:>10}: in transaction {statistics.median(inside):8.1f} ms, '
+                          f'commit + on_commit {statistics.median(after):8.1f} ms')
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp(prefix='bench_approve_')
+        donor, _ = get_user_model().objects.get_or_create(username='bench_donation_approve')
+        try:
+            with override_settings(MEDIA_ROOT=media, IMAGE_DERIVATIVES_ON_UPLOAD=False):
+                payload = os.urandom(int(options['size_mb'] * 1024 * 1024))
+                sources = [default_storage.save(f'donations/bench_{i}.jpg', ContentFile(payload))
+                           for i in range(options['photos'])]
+                self.stdout.write(f"{options['photos']} photos x {options['size_mb']} MB, "
+                                  f"median of {options['repeat']}")
+                self._run('legacy', _legacy_approve, donor, sources, options['repeat'])
+                for mode in ('reference', 'link', 'copy'):
+                    with override_settings(MEDIA_SHARE_MODE=mode):
+                        self._run(mode, lambda d: d.approve(reviewer=None), donor, sources, options['repeat'])
+        finally:
+            Pet.objects.filter(created_by=donor).delete()
+            Donation.objects.filter(donor=donor).delete()
+            shutil.rmtree(media, ignore_errors=True)
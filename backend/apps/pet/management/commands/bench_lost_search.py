@@ -0,0 +1,118 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.pet.models import Address, City, Country, Lost, Region
+from apps.pet.search import refresh_lost_places, search_lost
+
+NAMES = ['Rex', 'Luna', 'Milo', 'Bella', 'Max', 'Kitty', 'Burek', 'Azor', 'Mruczek', 'Figa']
+BREEDS = ['Labrador', 'Beagle', 'Husky', 'Persian', 'Siamese', 'Maine Coon', 'Mixed']
+COLORS = ['black', 'white', 'ginger', 'tabby', 'brown', 'grey']
+CITIES = ['Warszawa', 'Kraków', 'Łódź', 'Wrocław', 'Poznań', 'Gdańsk', 'Szczecin', 'Lublin']
+WORDS = ('friendly calm shy collar microchip last seen near park station bridge school forest '
+         'limping scared answers name reward please call').split()
+SUGGEST_TARGET_MS = 20
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _sql_array(values):
+    return 'ARRAY[' + ', '.join("'" + v.replace("'", "''") + "'" for v in values) + ']'
+
+
+def _pick(values, seed):
+    return f'({_sql_array(values)})[1 + mod(abs(hashtext(g::text || \'{seed}\')), {len(values)})]'
+
+
+class Command(BaseCommand):
+    help = ("Benchmark lost-report search: the old seven-way icontains filter across the address "
+            "tables vs the Lost.search_vector prefix search, including the suggest (typeahead) query. "
+            "Data is generated inside a transaction and rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=1000000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search text (repeatable); defaults to a few typical typeahead inputs')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE for the suggest query')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples), max(samples)
+
+    def _generate(self, n):
+        owner, _ = get_user_model().objects.get_or_create(username='bench_lost_search')
+        country, _ = Country.objects.get_or_create(code='ZZ', defaults={'name': 'Benchland'})
+        region, _ = Region.objects.get_or_create(country=country, name='Bench Region')
+        addresses = [Address.objects.create(country=country, region=region,
+                                            city=City.objects.get_or_create(region=region, name=name)[0])
+                     for name in CITIES]
+        address_ids = 'ARRAY[' + ', '.join(str(a.pk) for a in addresses) + ']'
+        description = ' || \' \' || '.join(_pick(WORDS, f'd{i}') for i in range(10))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {connection.ops.quote_name(Lost._meta.db_table)} '
+                f'(pet_name, species, breed, color, sex, size, address_id, lost_time, description, status, '
+                f' reporter_id, contact_phone, contact_email, created_at, updated_at, search_places) '
+                f"SELECT {_pick(NAMES, 'n')} || ' ' || g, 'dog', {_pick(BREEDS, 'b')}, {_pick(COLORS, 'c')}, "
+                f"'male', '', ({address_ids})[1 + mod(g, {len(addresses)})], now() - g * interval '1 minute', "
+                f"{description}, 'open', %s, '', '', now() - g * interval '1 minute', now(), '' "
+                f'FROM generate_series(1, %s) g',
+                [owner.pk, n],
+            )
+        refresh_lost_places(Lost.objects.filter(reporter=owner))
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Lost._meta.db_table)}')
+
+    def handle(self, *args, **options):
+        page = options['page_size']
+        repeat = options['repeat']
+        queries = options['queries'] or ['la', 'lab', 'burek', 'warsz', 'black lab', 'reward park']
+
+        def icontains(text):
+            # 原 LostFilter.search 的条件
+            return Lost.objects.filter(
+                Q(pet_name__icontains=text) | Q(address__city__name__icontains=text)
+                | Q(address__region__name__icontains=text) | Q(address__country__name__icontains=text)
+                | Q(description__icontains=text) | Q(color__icontains=text) | Q(breed__icontains=text)
+            ).order_by('-created_at')
+
+        def fulltext(text):
+            return search_lost(Lost.objects.all(), text).order_by('-created_at')
+
+        try:
+            with transaction.atomic():
+                t0 = time.perf_counter()
+                self._generate(options['reports'])
+                self.stdout.write(f"generated {options['reports']} lost reports in {time.perf_counter() - t0:.1f}s")
+
+                for text in queries:
+                    for label, build in (('icontains list', icontains), ('fulltext list ', fulltext)):
+                        qs = build(text)
+                        median, worst = self._time(lambda: (qs.count(), list(qs[:page])), repeat)
+                        self.stdout.write(f'{label} {text!r:16} {median:8.1f} ms median, {worst:8.1f} ms max')
+
+                    suggest = fulltext(text).values('id', 'pet_name', 'species', 'breed', 'color',
+                                                    'status', 'search_places')[:10]
+                    median, worst = self._time(lambda: list(suggest.all()), repeat)
+                    style = self.style.SUCCESS if worst < SUGGEST_TARGET_MS else self.style.WARNING
+                    self.stdout.write(style(f'suggest        {text!r:16} {median:8.1f} ms median, {worst:8.1f} ms max'))
+                    if options['explain']:
+                        for line in suggest.explain(analyze=True).splitlines():
+                            self.stdout.write(f'    {line}')
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('generated rows rolled back')
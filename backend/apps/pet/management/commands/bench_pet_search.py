@@ -0,0 +1,100 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.pet.models import Pet
+from apps.pet.search import search_pets
+
+NAMES = ['Rex', 'Luna', 'Milo', 'Bella', 'Max', 'Kitty', 'Burek', 'Azor', 'Mruczek', 'Figa']
+BREEDS = {'dog': ['Labrador', 'Beagle', 'Husky', 'Poodle', 'Dachshund', 'Mixed'],
+          'cat': ['Persian', 'Siamese', 'Maine Coon', 'Sphynx', 'Ragdoll', 'Mixed']}
+WORDS = ('friendly calm playful shy energetic loves walks kids garden sofa found street shelter '
+         'vaccinated old young small large black white ginger tabby spotted').split()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Benchmark pet search: the old SearchFilter-style icontains OR query vs the "
+            "tsvector/trigram search in apps.pet.search. Data is generated inside a "
+            "transaction and rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pets', type=int, default=100000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search text (repeatable); defaults to a few typical queries')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE for each query')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    def _generate(self, n):
+        rnd = random.Random(42)
+        owner, _ = get_user_model().objects.get_or_create(username='bench_pet_search')
+        pets = []
+        for i in range(n):
+            species = rnd.choice(list(BREEDS))
+            pets.append(Pet(
+                name=f'{rnd.choice(NAMES)} {i}', species=species, breed=rnd.choice(BREEDS[species]),
+                description=' '.join(rnd.choices(WORDS, k=12)), created_by=owner,
+            ))
+        Pet.objects.bulk_create(pets, batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Pet._meta.db_table)}')
+
+    def _explain(self, qs):
+        for line in qs.explain(analyze=True).splitlines():
+            self.stdout.write(f'    {line}')
+
+    def handle(self, *args, **options):
+        page = options['page_size']
+        repeat = options['repeat']
+        queries = options['queries'] or ['labrador', 'labrodor', 'friendly husky', 'Luna']
+
+        def icontains(text):
+            # 与原 SearchFilter(search_fields=name/species/breed/description) 生成的条件相同
+            cond = Q()
+            for field in ('name', 'species', 'breed', 'description'):
+                cond |= Q(**{f'{field}__icontains': text})
+            return Pet.objects.filter(cond).order_by('-pub_date')
+
+        def fulltext(text):
+            return search_pets(Pet.objects.defer('search_vector'), text)
+
+        try:
+            with transaction.atomic():
+                t0 = time.perf_counter()
+                self._generate(options['pets'])
+                self.stdout.write(f"generated {options['pets']} pets in {time.perf_counter() - t0:.1f}s")
+
+                for text in queries:
+                    for label, build in (('icontains', icontains), ('fulltext ', fulltext)):
+                        qs = build(text)
+
+                        def run():
+                            qs.count()
+                            list(qs[:page])
+
+                        self.stdout.write(f'{label} {text!r:20} {self._time(run, repeat):8.1f} ms (median), '
+                                          f'{qs.count()} hits')
+                        if options['explain']:
+                            self._explain(qs[:page])
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('generated rows rolled back')
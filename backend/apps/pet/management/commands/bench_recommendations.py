@@ -0,0 +1,55 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.pet.recommend import FeatureMatrix, Preferences
+from common.traits import ALL_TRAITS
+
+SPECIES = ['dog', 'cat', 'rabbit', 'bird', 'hamster']
+SIZES = ['small', 'medium', 'large', 'xlarge', '']
+SEXES = ['male', 'female']
+
+
+class Command(BaseCommand):
+    help = ("Benchmark recommendation scoring: build a synthetic feature matrix of --pets available "
+            "pets in memory (no database) and time FeatureMatrix.top() for random profiles.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pets', type=int, default=50000)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        now = datetime.now(dt_timezone.utc)
+        rows = [
+            (i, rnd.choice(SPECIES), rnd.choice(SIZES), rnd.choice(SEXES), rnd.randint(0, 15), rnd.randint(0, 11),
+             rnd.randint(0, ALL_TRAITS), rnd.randint(1, 5000), now - timedelta(days=rnd.random() * 365))
+            for i in range(1, options['pets'] + 1)
+        ]
+        t0 = time.perf_counter()
+        matrix = FeatureMatrix()
+        matrix.replace((), rows)
+        self.stdout.write(f"built matrix of {len(matrix)} pets in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        t0 = time.perf_counter()
+        matrix.replace(range(1, 101), rows[:100])
+        self.stdout.write(f"incremental sync of 100 pets: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        samples = []
+        for _ in range(options['requests']):
+            prefs = Preferences(
+                species=rnd.choice(SPECIES + ['']), size=rnd.choice(SIZES), sex=rnd.choice(SEXES + ['']),
+                age_min=rnd.choice([None, 0, 6, 12]), age_max=rnd.choice([None, 24, 60, 120]),
+                traits=rnd.randint(0, ALL_TRAITS),
+            )
+            t0 = time.perf_counter()
+            matrix.top(prefs, options['limit'], exclude_owner=rnd.randint(1, 5000))
+            samples.append((time.perf_counter() - t0) * 1000)
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        self.stdout.write(f"scoring {options['requests']} profiles over {len(matrix)} pets: "
+                          f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms, max {max(samples):.2f} ms")
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from common import images
+
+
+def _init_worker():
+    # spawn 启动的子进程需要重新初始化 Django；fork 时是空操作
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = ("Build thumbnails and WebP/AVIF variants (common/images.py) for every existing image in "
+            "IMAGE_DERIVATIVE_SOURCES, decoding and encoding in a process pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Rebuild derivatives that already exist')
+        parser.add_argument('--source', action='append', default=[],
+                            help='Only this "app_label.Model.field" (repeatable)')
+        parser.add_argument('--chunksize', type=int, default=16, help='Images handed to a worker at a time')
+
+    def _names(self, sources):
+        names = set()
+        for source in sources:
+            label, field = source.rsplit('.', 1)
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as exc:
+                raise CommandError(f'unknown source {source!r}') from exc
+            qs = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            found = set(qs.values_list(field, flat=True).iterator(chunk_size=5000))
+            self.stdout.write(f'{source}: {len(found)} images')
+            names |= found
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        sources = options['source'] or list(settings.IMAGE_DERIVATIVE_SOURCES)
+        self.stdout.write(f"formats {', '.join(images.formats())}, widths {images.widths()}")
+        names = self._names(sources)
+        if not options['force']:
+            ready = images.preload(names)
+            names = [n for n in names if not ready[n]]
+        if not names:
+            self.stdout.write('nothing to do')
+            return
+
+        # 子进程不碰数据库；fork 前关闭连接，避免共享同一个 socket
+        connections.close_all()
+        started = time.perf_counter()
+        written = failed = 0
+        workers = max(1, options['workers'])
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = pool.map(images.build_safely, names, [options['force']] * len(names),
+                               chunksize=max(1, options['chunksize']))
+            for done, (name, count, error) in enumerate(results, 1):
+                if error:
+                    failed += 1
+                    images.mark(name, False)
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    written += count
+                    images.mark(name, True)
+                if done % 500 == 0:
+                    self.stdout.write(f'{done}/{len(names)} images')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names) - failed} images processed, {written} files written, {failed} failed '
+            f'in {elapsed:.1f}s with {workers} workers'))
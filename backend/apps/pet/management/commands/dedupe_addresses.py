@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from apps.pet.addresses import coords_agree, has_coords
+from apps.pet.models import Address, canonical_address_key
+from common.cache import bump_version
+
+FIELDS = ('id', 'country_id', 'region_id', 'city_id', 'street', 'building_number', 'postal_code',
+          'latitude', 'longitude', 'location', 'geocode_status', 'canonical_key')
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Command(BaseCommand):
+    help = ("Assign canonical keys to Address rows and merge duplicates, repointing every "
+            "foreign key (pets, donations, losts, shelters, geocode jobs) to the kept row.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be merged')
+        parser.add_argument('--chunk', type=int, default=500, help='Duplicates merged per transaction')
+
+    def handle(self, *args, **options):
+        dry = options['dry_run']
+        chunk = max(1, options['chunk'])
+
+        rows = [Address(**dict(zip(FIELDS, values)))
+                for values in Address.objects.order_by('id').values_list(*FIELDS).iterator(chunk_size=2000)]
+        groups = defaultdict(list)
+        stale = []          # rows holding a key that no longer matches their text
+        for row in rows:
+            key = canonical_address_key(row.country_id, row.region_id, row.city_id,
+                                        row.street, row.building_number, row.postal_code)
+            if row.canonical_key and row.canonical_key != key:
+                stale.append(row.id)
+                row.canonical_key = None
+            if key:
+                groups[key].append(row)
+
+        merge = {}          # duplicate id -> kept id
+        keep = []           # rows whose key / coordinates change
+        for key, members in groups.items():
+            # 保留顺序：已持有该键的行 > 有坐标的行 > id 最小的行
+            members.sort(key=lambda r: (r.canonical_key != key, not has_coords(r), r.id))
+            kept = members[0]
+            changed = kept.canonical_key != key
+            for row in members[1:]:
+                if not coords_agree(kept, row):
+                    continue  # 坐标不一致的定位点保持独立
+                if not has_coords(kept) and has_coords(row):
+                    kept.latitude, kept.longitude = row.latitude, row.longitude
+                    kept.geocode_status = Address.GeocodeStatus.OK
+                    changed = True
+                merge[row.id] = kept.id
+            if changed:
+                kept.canonical_key = key
+                keep.append(kept)
+
+        self.stdout.write(self.style.NOTICE(
+            f'{len(rows)} addresses, {len(groups)} distinct places, {len(merge)} duplicates to merge, '
+            f'{len(keep)} rows to (re)key'
+        ))
+        if dry:
+            return
+
+        # 指向 Address 的所有外键：pets / donations / losts / shelters / geocode_jobs
+        relations = [rel for rel in Address._meta.related_objects if rel.one_to_many]
+        # 先清掉失效的键，避免与本次分配的键冲突
+        if stale:
+            Address.objects.filter(id__in=stale).update(canonical_key=None)
+        # 每批一个事务；中途中断后重跑会从剩余的重复行继续
+        for part in _chunks(list(merge.items()), chunk):
+            dup_ids = [dup for dup, _ in part]
+            with transaction.atomic():
+                for rel in relations:
+                    column = rel.field.attname
+                    remap = Case(*[When(**{column: dup}, then=Value(kept)) for dup, kept in part],
+                                 output_field=models.BigIntegerField())
+                    rel.related_model._base_manager.filter(**{f'{column}__in': dup_ids}).update(**{column: remap})
+                Address.objects.filter(id__in=dup_ids).delete()
+        for row in keep:
+            row.sync_geom()
+        Address.objects.bulk_update(
+            keep, ['canonical_key', 'latitude', 'longitude', 'geom', 'location', 'geocode_status'], batch_size=chunk
+        )
+
+        # .update()/bulk_update 不发信号，手动让相关缓存失效
+        for model in {Address, *(rel.related_model for rel in relations)}:
+            bump_version(model)
+        self.stdout.write(self.style.SUCCESS(f'Merged {len(merge)} duplicate addresses; keyed {len(keep)} rows.'))
@@ -1,25 +1,41 @@
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from django.contrib.gis.geos import Point
-from apps.pet.models import Address
-from common.utils import geocode_address
 from django.db.models import Q
 
+from apps.pet import geocoding
+from apps.pet.models import Address, GeocodeJob
+from common.cache import bump_version
+
 
 class Command(BaseCommand):
     help = "Geocode Address rows missing latitude/longitude and save results."
 
     def add_arguments(self, parser):
-        parser.add_argument('--limit', type=int, default=500, help='Max rows to process')
+        parser.add_argument('--limit', type=int, default=500, help='Max rows to process (0 = no limit)')
         parser.add_argument('--dry-run', action='store_true', help='Only print, do not write changes')
         parser.add_argument('--recalc', action='store_true', help='Recalculate even if coordinates already exist')
         parser.add_argument('--filter', dest='filter_substr', type=str, help='Only process addresses containing this substring (street/city/region/country/postal/postfix)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Concurrent provider lookups (still throttled by GEOCODER_RATE_LIMITS)')
+        parser.add_argument('--chunk', type=int, default=500, help='Addresses read, geocoded and bulk-updated per round')
+        parser.add_argument('--checkpoint', type=str,
+                            default=os.path.join(settings.BASE_DIR, '.geocode_addresses.checkpoint.json'),
+                            help='Resume file; an interrupted run with the same options continues after the last saved id')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first row')
 
     def handle(self, *args, **options):
         limit = options['limit']
         dry = options['dry_run']
         recalc = options['recalc']
         filt = options.get('filter_substr')
+        chunk = max(1, options['chunk'])
+        workers = max(1, options['workers'])
 
         if recalc:
             qs = Address.objects.all()
@@ -35,47 +51,92 @@ class Command(BaseCommand):
                 Q(region__name__icontains=filt) |
                 Q(country__name__icontains=filt)
             )
+        qs = qs.select_related('city', 'region', 'country').order_by('id')
+
+        # 检查点只对同一组筛选条件有效
+        run_key = hashlib.sha1(json.dumps([recalc, filt or '']).encode()).hexdigest()
+        checkpoint = options['checkpoint']
+        last_id = 0 if (dry or options['restart']) else self._load_checkpoint(checkpoint, run_key)
+        if last_id:
+            self.stdout.write(self.style.NOTICE(f'Resuming after address id={last_id} ({checkpoint})'))
+
+        remaining = qs.filter(id__gt=last_id).count()
+        total = min(remaining, limit) if limit else remaining
+        self.stdout.write(self.style.NOTICE(
+            f'Processing {total} address rows (limit={limit or "none"}, workers={workers}, chunk={chunk})'
+        ))
+
+        stats = {}
+        processed = updated = 0
+        started = time.monotonic()
+        while processed < total:
+            batch = list(qs.filter(id__gt=last_id)[:min(chunk, total - processed)])
+            if not batch:
+                break
+            queries = [geocoding.address_query(addr) for addr in batch]
+            results = geocoding.geocode_many(queries, workers=workers, stats=stats)
+
+            changed = []
+            for addr, (s, _ctx), result in zip(batch, queries, results):
+                coords = result.coords if result is not None else None
+                if not coords:
+                    if result is not None and addr.latitude is None and not dry:
+                        addr.geocode_status = Address.GeocodeStatus.NOT_FOUND
+                        changed.append(addr)
+                    continue
+                lon, lat = coords
+                if dry:
+                    self.stdout.write(f'[dry-run] id={addr.id} -> {lat},{lon} ({s})')
+                    continue
+                addr.longitude, addr.latitude = round(lon, 6), round(lat, 6)
+                addr.geocode_status = Address.GeocodeStatus.OK
+                # bulk_update 不走 Address.save()，这里手动派生 geom / location
+                addr.sync_geom()
+                changed.append(addr)
 
-        qs = qs.order_by('id')[:limit]
-        total = qs.count()
-        self.stdout.write(self.style.NOTICE(f'Processing {total} address rows (limit={limit})'))
-        updated = 0
-
-        for addr in qs:
-            parts = [
-                addr.street or '',
-                addr.building_number or '',
-                getattr(addr.city, 'name', '') if getattr(addr, 'city_id', None) else '',
-                getattr(addr.region, 'name', '') if getattr(addr, 'region_id', None) else '',
-                getattr(addr.country, 'name', '') if getattr(addr, 'country_id', None) else '',
-                addr.postal_code or '',
-            ]
-            s = ', '.join([p for p in parts if p])
-            if not s:
-                continue
-            ctx = {
-                'street': (f"{addr.street} {addr.building_number}".strip()) if (addr.street or addr.building_number) else None,
-                'city': getattr(addr.city, 'name', None) if getattr(addr, 'city_id', None) else None,
-                'region': getattr(addr.region, 'name', None) if getattr(addr, 'region_id', None) else None,
-                'country': getattr(addr.country, 'name', None) if getattr(addr, 'country_id', None) else None,
-                'country_code': getattr(getattr(addr, 'country', None), 'code', None) if getattr(addr, 'country_id', None) else None,
-                'postal_code': addr.postal_code or None,
-            }
-            coords = geocode_address(s, context=ctx)
-            if not coords:
-                continue
-            lon, lat = coords
+            processed += len(batch)
+            last_id = batch[-1].id
             if dry:
-                self.stdout.write(f'[dry-run] id={addr.id} -> {lat},{lon} ({s})')
-                updated += 1
-                continue
-            with transaction.atomic():
-                addr.latitude = lat
-                addr.longitude = lon
-                try:
-                    addr.location = Point(lon, lat)
-                except Exception:
-                    pass
-                addr.save(update_fields=['latitude', 'longitude', 'location'])
-                updated += 1
-        self.stdout.write(self.style.SUCCESS(f'Done. Updated {updated} rows.'))
+                updated += sum(1 for r in results if r is not None and r.coords)
+            else:
+                with transaction.atomic():
+                    Address.objects.bulk_update(
+                        changed, ['latitude', 'longitude', 'geom', 'location', 'geocode_status'], batch_size=chunk
+                    )
+                    GeocodeJob.objects.filter(
+                        address_id__in=[a.id for a in changed], status=GeocodeJob.Status.PENDING
+                    ).update(status=GeocodeJob.Status.DONE)
+                updated += sum(1 for a in changed if a.geocode_status == Address.GeocodeStatus.OK)
+                self._save_checkpoint(checkpoint, run_key, last_id)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{processed}/{total} rows, {updated} updated, {processed / elapsed:.1f} addresses/s')
+
+        if updated and not dry:
+            bump_version(Address)
+        if processed >= remaining and not dry and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. Updated {updated} rows. {processed} addresses in {elapsed:.1f}s ({rate:.1f} addresses/s); '
+            f'unique queries={stats.get("unique", 0)}, from table={stats.get("stored", 0)}, '
+            f'provider lookups={stats.get("looked_up", 0)}, provider errors={stats.get("errors", 0)}'
+        ))
+
+    def _load_checkpoint(self, path, run_key):
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return 0
+        if data.get('run') != run_key:
+            return 0
+        return int(data.get('last_id') or 0)
+
+    def _save_checkpoint(self, path, run_key, last_id):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'run': run_key, 'last_id': last_id}, fh)
+        os.replace(tmp, path)
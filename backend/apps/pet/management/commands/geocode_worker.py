@@ -0,0 +1,63 @@
+import signal
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.pet import geocode_jobs
+
+
+def _run_in_thread(job):
+    try:
+        return geocode_jobs.run_job(job)
+    finally:
+        # 线程池里的每个线程各自持有数据库连接，用完即关
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Process queued GeocodeJob rows (address geocoding) with retries/backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Jobs processed concurrently; per-provider limits still apply (GEOCODER_CONCURRENCY)')
+        parser.add_argument('--batch', type=int, default=0, help='Jobs claimed per round (default: 2 x threads)')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of polling')
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        batch = options['batch'] or threads * 2
+        worker = geocode_jobs.worker_name()
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        totals = Counter()
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='geocode') if threads > 1 else None
+        self.stdout.write(self.style.NOTICE(f'geocode_worker {worker}: threads={threads} batch={batch}'))
+        try:
+            while not self._stop:
+                jobs = geocode_jobs.claim(batch, worker)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                if pool is None:
+                    statuses = [geocode_jobs.run_job(job) for job in jobs]
+                else:
+                    statuses = list(pool.map(_run_in_thread, jobs))
+                totals.update(statuses)
+                self.stdout.write(', '.join(f'{k}={v}' for k, v in sorted(Counter(statuses).items())))
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        summary = ', '.join(f'{k}={v}' for k, v in sorted(totals.items())) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(f'Stopped. {summary}'))
+
+    def _request_stop(self, signum, frame):
+        # 处理完当前批次再退出
+        self._stop = True
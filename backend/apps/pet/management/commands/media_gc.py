@@ -0,0 +1,122 @@
+import re
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from common.storage import ContentAddressedStorage
+
+# common/images.py 派生图：<原图>.<宽>w.<格式>
+DERIVATIVE_RE = re.compile(r"\.\d+w\.[a-z0-9]+$")
+
+
+def _size(num: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if num < 1024 or unit == "GB":
+            return f"{num:.1f} {unit}" if unit != "B" else f"{num} B"
+        num /= 1024
+
+
+class Command(BaseCommand):
+    help = ("Content-addressed media store (common/storage.py): report disk usage and dedup savings "
+            "per top-level prefix, fold existing duplicate files into the blob store (--adopt), "
+            "delete blobs no name links to any more and, with --delete-orphans, files no FileField "
+            "references under the FileFields' own upload_to directories.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt', action='store_true',
+                            help='Hash files saved before dedup and hardlink duplicates to one blob')
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='Delete media files (and their derivatives) no model row references')
+        parser.add_argument('--min-age', type=float, default=24.0,
+                            help='Hours a file must be untouched before it counts as an orphan')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def _file_fields(self):
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if isinstance(field, models.FileField):
+                    yield model, field
+
+    def _referenced(self):
+        names = set()
+        for model, field in self._file_fields():
+            qs = model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            names.update(qs.values_list(field.name, flat=True).iterator(chunk_size=5000))
+        return names
+
+    def _prefixes(self):
+        """
+        Directories the FileFields upload into. Only these are searched for
+        orphans: blog_images/ and root-level editor uploads are referenced
+        from article text, not from a FileField, and must never be collected.
+        """
+        prefixes = set()
+        for model, field in self._file_fields():
+            if callable(field.upload_to):
+                try:
+                    sample = field.upload_to(model(), 'x')
+                except Exception:
+                    continue  # 推不出目录就不碰
+                prefix = sample.split('/', 1)[0] + '/' if '/' in sample else ''
+            else:
+                # 'avatars/%Y/%m/%d/' -> 'avatars/'
+                prefix = field.upload_to.split('%', 1)[0].rpartition('/')[0]
+                prefix = prefix + '/' if prefix else ''
+            if prefix:
+                prefixes.add(prefix)
+        return tuple(sorted(prefixes))
+
+    def _orphans(self, storage, min_age):
+        referenced = self._referenced()
+        prefixes = self._prefixes()
+        cutoff = time.time() - min_age * 3600
+        for name, st in storage.walk():
+            if not name.startswith(prefixes):
+                continue
+            if st.st_mtime > cutoff:
+                continue  # 刚上传、事务可能还没提交
+            if name in referenced or DERIVATIVE_RE.sub('', name) in referenced:
+                continue
+            yield name, st
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('the default storage is not common.storage.ContentAddressedStorage '
+                               '(see STORAGES / MEDIA_DEDUP in settings)')
+        dry_run = options['dry_run']
+
+        if options['adopt']:
+            shared = total = 0
+            for name, _ in list(storage.walk()):
+                total += 1
+                if not dry_run and storage.adopt(name):
+                    shared += 1
+            self.stdout.write(f'adopted {total} files, {shared} replaced by links to an identical blob'
+                              if not dry_run else f'{total} files would be adopted')
+
+        if options['delete_orphans']:
+            count = size = 0
+            for name, st in self._orphans(storage, options['min_age']):
+                count += 1
+                size += st.st_size
+                if dry_run:
+                    self.stdout.write(f'orphan {name}')
+                else:
+                    storage.delete(name)
+            self.stdout.write(f"{'would delete' if dry_run else 'deleted'} {count} unreferenced files "
+                              f"({_size(size)} of names)")
+
+        blobs, freed = storage.collect_garbage(dry_run=dry_run)
+        self.stdout.write(f"{'would free' if dry_run else 'freed'} {blobs} unreferenced blobs ({_size(freed)})")
+
+        self.stdout.write(f"{'prefix':<16}{'files':>8}{'logical':>12}{'on disk':>12}{'saved':>12}{'%':>8}")
+        for prefix, row in storage.usage().items():
+            saved = row['logical'] - row['physical']
+            pct = f"{saved * 100 / row['logical']:.1f}%" if row['logical'] else '-'
+            line = (f"{prefix:<16}{row['files']:>8}{_size(row['logical']):>12}{_size(row['physical']):>12}"
+                    f"{_size(saved):>12}{pct:>8}")
+            self.stdout.write(self.style.SUCCESS(line) if prefix == 'total' else line)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.pet.models import Pet, PetFavorite, Adoption
+from common.cache import bump_version
+
+
+def _count_subquery(model):
+    return Coalesce(Subquery(
+        model.objects.filter(pet=OuterRef('pk')).order_by()
+        .values('pet').annotate(c=Count('id')).values('c')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = "Rebuild Pet.favorites_count / Pet.applications_count from PetFavorite and Adoption rows in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows, do not write changes')
+
+    def handle(self, *args, **options):
+        drifted = (
+            Pet.objects
+            .annotate(real_favorites=_count_subquery(PetFavorite), real_applications=_count_subquery(Adoption))
+            .exclude(favorites_count=F('real_favorites'), applications_count=F('real_applications'))
+        )
+        total = drifted.count()
+        if options['dry_run']:
+            self.stdout.write(self.style.NOTICE(f'[dry-run] {total} pet row(s) have drifted counters'))
+            return
+
+        updated = Pet.objects.filter(pk__in=drifted.values('pk')).update(
+            favorites_count=_count_subquery(PetFavorite),
+            applications_count=_count_subquery(Adoption),
+        )
+        # queryset.update() 不触发 post_save，手动让公共列表缓存失效
+        bump_version(Pet)
+        self.stdout.write(self.style.SUCCESS(f'Done. Recounted {updated} pet row(s).'))
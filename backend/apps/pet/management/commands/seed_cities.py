@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from apps.pet import gazetteer
 from apps.pet.models import Country, Region, City
 
 # 你可以继续往这个 dict 里加其它国家/地区
@@ -54,4 +55,6 @@ class Command(BaseCommand):
                 obj, is_new = City.objects.get_or_create(region=region, name=name)
                 created += int(is_new)
 
+        # 让所有进程的地名索引重新加载
+        gazetteer.bump()
         self.stdout.write(self.style.SUCCESS(f"Seeded {created} city rows for country {code}"))
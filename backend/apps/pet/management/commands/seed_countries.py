@@ -3,6 +3,7 @@
 # apps/pet/management/commands/seed_countries.py
 from django.core.management.base import BaseCommand
 import pycountry
+from apps.pet import gazetteer
 from apps.pet.models import Country, Region  # 现在都在一个 models.py 里
 
 
@@ -26,4 +27,6 @@ class Command(BaseCommand):
                 defaults={"code": sub.code},
             )
 
+        # 让所有进程的地名索引重新加载
+        gazetteer.bump()
         self.stdout.write(self.style.SUCCESS("Seeded countries & regions"))
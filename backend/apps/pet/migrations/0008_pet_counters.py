@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Pet = apps.get_model('pet', 'Pet')
+    PetFavorite = apps.get_model('pet', 'PetFavorite')
+    Adoption = apps.get_model('pet', 'Adoption')
+
+    def _count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(pet=OuterRef('pk')).order_by()
+            .values('pet').annotate(c=Count('id')).values('c')
+        ), 0)
+
+    Pet.objects.update(favorites_count=_count(PetFavorite), applications_count=_count(Adoption))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0007_holidayfamily'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='applications_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Applications'),
+        ),
+        migrations.AddField(
+            model_name='pet',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Favorites'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['-favorites_count'], name='pet_favorites_count_idx'),
+        ),
+    ]
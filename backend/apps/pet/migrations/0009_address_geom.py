@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:04
+
+import django.contrib.gis.db.models.fields
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations
+
+# latitude/longitude 优先；老数据只有 location GeoJSON 时从中取坐标并回填经纬度
+BACKFILL_SQL = """
+UPDATE pet_address
+SET latitude = round((location->'coordinates'->>1)::numeric, 6),
+    longitude = round((location->'coordinates'->>0)::numeric, 6)
+WHERE (latitude IS NULL OR longitude IS NULL)
+  AND CASE WHEN jsonb_typeof(location->'coordinates') = 'array'
+           THEN jsonb_array_length(location->'coordinates') = 2
+                AND jsonb_typeof(location->'coordinates'->0) = 'number'
+                AND jsonb_typeof(location->'coordinates'->1) = 'number'
+           ELSE false END;
+
+UPDATE pet_address
+SET geom = ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326)
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0008_pet_counters'),
+    ]
+
+    operations = [
+        CreateExtension('postgis'),
+        migrations.AddField(
+            model_name='address',
+            name='geom',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326, verbose_name='Geometry'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
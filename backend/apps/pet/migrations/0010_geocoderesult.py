@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0009_address_geom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Query Hash')),
+                ('query', models.TextField(verbose_name='Normalized Query')),
+                ('found', models.BooleanField(default=False)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('provider', models.CharField(blank=True, default='', max_length=20)),
+                ('confidence', models.FloatField(blank=True, help_text='Provider relevance/importance, 0..1', null=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Empty = never expires', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Geocode Result',
+                'verbose_name_plural': 'Geocode Results',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# 已有坐标的地址视为已完成地理编码
+BACKFILL_SQL = """
+UPDATE pet_address SET geocode_status = 'ok'
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0010_geocoderesult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='geocode_status',
+            field=models.CharField(blank=True, choices=[('', 'Not requested'), ('pending', 'Pending'), ('ok', 'Geocoded'), ('not_found', 'Not found'), ('failed', 'Failed')], default='', max_length=10, verbose_name='Geocode Status'),
+        ),
+        migrations.CreateModel(
+            name='GeocodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.TextField(blank=True, default='', verbose_name='Query')),
+                ('context', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Not picked up before this time (retry backoff)')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=64)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geocode_jobs', to='pet.address')),
+            ],
+            options={
+                'verbose_name': 'Geocode Job',
+                'verbose_name_plural': 'Geocode Jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='pet_geocodejob_due_idx')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
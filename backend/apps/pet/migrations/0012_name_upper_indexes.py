@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0011_geocodejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(models.F('region'), django.db.models.functions.text.Upper('name'), name='pet_city_region_uname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='pet_city_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='pet_country_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(django.db.models.functions.text.Upper('code'), name='pet_country_code_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='region',
+            index=models.Index(models.F('country'), django.db.models.functions.text.Upper('name'), name='pet_region_country_uname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='region',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='pet_region_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0012_name_upper_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='canonical_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Canonical Key'),
+        ),
+    ]
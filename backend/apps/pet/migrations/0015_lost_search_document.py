@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:24
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+UPDATE pet_lost l
+SET search_places = CONCAT_WS(' ', ci.name, r.name, co.name)
+FROM pet_address a
+LEFT JOIN pet_city ci ON ci.id = a.city_id
+LEFT JOIN pet_region r ON r.id = a.region_id
+LEFT JOIN pet_country co ON co.id = a.country_id
+WHERE l.address_id = a.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0014_pet_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lost',
+            name='search_places',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        # 先填好地名，生成列和 GIN 索引只需计算/构建一次
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddField(
+            model_name='lost',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('pet_name', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('species', 'breed', 'color', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), '||', django.contrib.postgres.search.SearchVector('search_places', config='simple', weight='C'), django.contrib.postgres.search.SearchConfig('simple')), '||', django.contrib.postgres.search.SearchVector('description', config='simple', weight='D'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='lost',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pet_lost_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lost',
+            index=models.Index(fields=['-created_at'], name='pet_lost_created_idx'),
+        ),
+    ]
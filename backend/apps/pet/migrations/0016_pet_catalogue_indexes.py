@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0015_lost_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(models.OrderBy(models.F('pub_date'), descending=True), condition=models.Q(('status__in', ('available', 'pending'))), name='pet_catalog_pub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(models.F('status'), models.OrderBy(models.F('pub_date'), descending=True), condition=models.Q(('status__in', ('available', 'pending'))), name='pet_catalog_status_pub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(models.F('age_years'), models.F('age_months'), condition=models.Q(('status__in', ('available', 'pending'))), name='pet_catalog_age_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:30
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pet', '0016_pet_catalogue_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='traits',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('dewormed'), models.IntegerField()), '*', models.Value(1)), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('vaccinated'), models.IntegerField()), '*', models.Value(2))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('microchipped'), models.IntegerField()), '*', models.Value(4))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('sterilized'), models.IntegerField()), '*', models.Value(8))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('child_friendly'), models.IntegerField()), '*', models.Value(16))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('trained'), models.IntegerField()), '*', models.Value(32))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('loves_play'), models.IntegerField()), '*', models.Value(64))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('loves_walks'), models.IntegerField()), '*', models.Value(128))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('good_with_dogs'), models.IntegerField()), '*', models.Value(256))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('good_with_cats'), models.IntegerField()), '*', models.Value(512))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('affectionate'), models.IntegerField()), '*', models.Value(1024))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('needs_attention'), models.IntegerField()), '*', models.Value(2048))), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='pet',
+            name='traits',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('dewormed'), models.IntegerField()), '*', models.Value(1)), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('vaccinated'), models.IntegerField()), '*', models.Value(2))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('microchipped'), models.IntegerField()), '*', models.Value(4))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('sterilized'), models.IntegerField()), '*', models.Value(8))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('child_friendly'), models.IntegerField()), '*', models.Value(16))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('trained'), models.IntegerField()), '*', models.Value(32))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('loves_play'), models.IntegerField()), '*', models.Value(64))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('loves_walks'), models.IntegerField()), '*', models.Value(128))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('good_with_dogs'), models.IntegerField()), '*', models.Value(256))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('good_with_cats'), models.IntegerField()), '*', models.Value(512))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('affectionate'), models.IntegerField()), '*', models.Value(1024))), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('needs_attention'), models.IntegerField()), '*', models.Value(2048))), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(models.F('traits'), models.OrderBy(models.F('pub_date'), descending=True), condition=models.Q(('status__in', ('available', 'pending'))), name='pet_catalog_traits_idx'),
+        ),
+    ]
@@ -1,17 +1,31 @@
 # apps/pet/models.py
+import hashlib
+import re
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.contrib.gis.db import models as gis_models
+from django.contrib.gis.geos import Point
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from smart_selects.db_fields import ChainedForeignKey
 
+from common.models import CounterFieldsMixin
+from common.traits import mask_expression
+
 User = get_user_model()
 
 
-class Pet(models.Model):
+# 公开目录（PetViewSet.list）只展示的状态，取值与 Pet.Status 一致；部分索引的条件也用它
+CATALOGUE_STATUSES = ("available", "pending")
+
+
+class Pet(CounterFieldsMixin, models.Model):
     SEX_CHOICES = (
         ("male", "Boy"),
         ("female", "Girl"),
@@ -54,6 +68,8 @@ class Pet(models.Model):
     affectionate = models.BooleanField("Affectionate", default=False)
     needs_attention = models.BooleanField("Needs Attention", default=False)
     sterilized = models.BooleanField("Sterilized/Neutered", default=False)
+    # 上面各特性的位掩码（common/traits.py），由数据库生成
+    traits = models.GeneratedField(expression=mask_expression(), output_field=models.IntegerField(), db_persist=True)
     contact_phone = models.CharField("Contact Phone", max_length=30, blank=True, default="")
     
     address = models.ForeignKey(
@@ -72,9 +88,27 @@ class Pet(models.Model):
         User, on_delete=models.CASCADE, related_name="pets", verbose_name="Owner"
     )
 
+    # 冗余计数列：由 signals 中的 F() 原子更新维护，recount_pet_counters 可整体重算
+    favorites_count = models.PositiveIntegerField("Favorites", default=0, editable=False)
+    applications_count = models.PositiveIntegerField("Applications", default=0, editable=False)
+
     add_date = models.DateTimeField("Created At", auto_now_add=True)
     pub_date = models.DateTimeField("Updated At", auto_now=True)
 
+    # 全文检索向量：数据库生成列（name > species/breed > description），GIN 索引，见 PetFilter.search
+    # 使用 'simple' 配置：内容中英波兰文混杂，不做词干化
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("name", weight="A", config="simple")
+            + SearchVector("species", "breed", weight="B", config="simple")
+            + SearchVector("description", weight="C", config="simple")
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    COUNTER_FIELDS = ("favorites_count", "applications_count")
+
     class Meta:
         verbose_name = "Pet"
         verbose_name_plural = "Pets"
@@ -83,6 +117,21 @@ class Pet(models.Model):
             models.Index(fields=["status"]),
             models.Index(fields=["species", "breed"]),
             models.Index(fields=["created_by"]),
+            models.Index(fields=["-favorites_count"], name="pet_favorites_count_idx"),
+            GinIndex(fields=["search_vector"], name="pet_pet_search_vector_idx"),
+            # 三元组索引建在 UPPER(col) 上：既服务 name/breed 的 icontains（UPPER(col) LIKE ...），也服务模糊匹配
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="pet_pet_name_trgm_idx"),
+            GinIndex(OpClass(Upper("breed"), name="gin_trgm_ops"), name="pet_pet_breed_trgm_idx"),
+            # 目录页的部分索引（manage.py advise_pet_indexes 对默认查询给出的建议）
+            models.Index(F("pub_date").desc(), condition=models.Q(status__in=CATALOGUE_STATUSES),
+                         name="pet_catalog_pub_idx"),
+            models.Index(F("status"), F("pub_date").desc(), condition=models.Q(status__in=CATALOGUE_STATUSES),
+                         name="pet_catalog_status_pub_idx"),
+            models.Index(F("age_years"), F("age_months"), condition=models.Q(status__in=CATALOGUE_STATUSES),
+                         name="pet_catalog_age_idx"),
+            # 任意特性组合都走这一个索引（traits IN (...)，见 TraitMaskFilterBackend）
+            models.Index(F("traits"), F("pub_date").desc(), condition=models.Q(status__in=CATALOGUE_STATUSES),
+                         name="pet_catalog_traits_idx"),
         ]
 
     def __str__(self):
@@ -162,6 +211,7 @@ class Donation(models.Model):
     good_with_cats = models.BooleanField("Good with Cats", default=False)
     affectionate = models.BooleanField("Affectionate", default=False)
     needs_attention = models.BooleanField("Needs Attention", default=False)
+    traits = models.GeneratedField(expression=mask_expression(), output_field=models.IntegerField(), db_persist=True)
     is_stray = models.BooleanField("Found as Stray", default=False)
     contact_phone = models.CharField("Contact Phone", max_length=30, blank=True, default="")
 
@@ -196,73 +246,67 @@ class Donation(models.Model):
     def __str__(self):
         return f"{self.donor} -> {self.name} ({self.species}) [{self.status}]"
 
+    # 可以审核通过（创建 Pet）的状态
+    APPROVABLE_STATUSES = ("submitted", "reviewing", "approved")
+
+    def new_pet(self, cover=None) -> "Pet":
+        """未保存的 Pet，内容取自本捐赠；cover 为已存文件名"""
+        return Pet(
+            name=self.name, species=self.species, breed=self.breed, sex=self.sex,
+            age_years=self.age_years, age_months=self.age_months,
+            description=self.description,
+            address_id=self.address_id,
+            dewormed=self.dewormed,
+            vaccinated=self.vaccinated,
+            microchipped=self.microchipped,
+            sterilized=self.sterilized,
+            child_friendly=self.child_friendly,
+            trained=self.trained,
+            loves_play=self.loves_play,
+            loves_walks=self.loves_walks,
+            good_with_dogs=self.good_with_dogs,
+            good_with_cats=self.good_with_cats,
+            affectionate=self.affectionate,
+            needs_attention=self.needs_attention,
+            contact_phone=self.contact_phone,
+            status=Pet.Status.AVAILABLE,
+            created_by_id=self.donor_id,  # 或 reviewer/机构账号
+            cover=cover,
+        )
+
     # —— 审核通过时自动创建 Pet，并将第一张图设为封面 ——
     def approve(self, reviewer, note=""):
+        """
+        事务内只写数据库：封面和 PetPhoto 直接引用捐赠照片已存的文件（common/storage.py），
+        不读取、不重写文件；MEDIA_SHARE_MODE 为 link/copy 时在提交后再各自建立独立文件。
+        批量审核见 apps/pet/approvals.py。
+        """
         from django.db import transaction
+        from common import images
+        from common.storage import share_on_commit
+
         with transaction.atomic():
             if self.created_pet:
                 return self.created_pet  # 避免重复创建
 
-            if self.status not in ("submitted", "reviewing", "approved"):
+            if self.status not in self.APPROVABLE_STATUSES:
                 raise ValueError("Current status can't process")
 
-            pet = Pet.objects.create(
-                name=self.name, species=self.species, breed=self.breed, sex=self.sex,
-                age_years=self.age_years, age_months=self.age_months,
-                description=self.description,
-                address=self.address,
-                dewormed=self.dewormed,
-                vaccinated=self.vaccinated,
-                microchipped=self.microchipped,
-                sterilized=self.sterilized,
-                child_friendly=self.child_friendly,
-                trained=self.trained,
-                loves_play=self.loves_play,
-                loves_walks=self.loves_walks,
-                good_with_dogs=self.good_with_dogs,
-                good_with_cats=self.good_with_cats,
-                affectionate=self.affectionate,
-                needs_attention=self.needs_attention,
-                contact_phone=self.contact_phone,
-                status=Pet.Status.AVAILABLE,
-                created_by=self.donor,  # 或 reviewer/机构账号
+            names = [name for name in self.photos.order_by("id").values_list("image", flat=True) if name]
+            pet = self.new_pet(cover=names[0] if names else None)  # 第一张设为封面
+            pet.save()
+
+            # 所有照片（包括封面）都进 PetPhoto，photos 数组里能看到全部
+            photos = PetPhoto.objects.bulk_create(
+                [PetPhoto(pet=pet, image=name, order=idx) for idx, name in enumerate(names)]
             )
-            
-            # 复制所有照片到 PetPhoto
-            donation_photos = self.photos.order_by("id").all()
-            for idx, donation_photo in enumerate(donation_photos):
-                if not donation_photo.image:
-                    continue
-                    
-                try:
-                    # 读取照片数据
-                    donation_photo.image.open("rb")
-                    data = donation_photo.image.read()
-                    donation_photo.image.close()
-                    
-                    # 生成新文件名
-                    orig_name = donation_photo.image.name.split("/")[-1]
-                    
-                    # 第一张设为封面
-                    if idx == 0:
-                        target_path = f"pets/{pet.id}_{orig_name}"
-                        saved_path = default_storage.save(target_path, ContentFile(data))
-                        pet.cover.name = saved_path
-                        pet.save(update_fields=["cover"])
-                    
-                    # 创建 PetPhoto（包括第一张，这样在 photos 数组中也能看到所有照片）
-                    pet_photo = PetPhoto.objects.create(
-                        pet=pet,
-                        order=idx,
-                    )
-                    photo_target_path = f"pets/photos/{pet.id}_{idx}_{orig_name}"
-                    pet_photo.image.save(photo_target_path, ContentFile(data), save=True)
-                    
-                except Exception as e:
-                    # 出错也不阻断主流程
-                    import logging
-                    logging.error(f"Failed to copy photo {idx} for pet {pet.id}: {e}")
-                    continue
+            for idx, photo in enumerate(photos):
+                images.schedule(photo)  # bulk_create 不发 post_save
+                share_on_commit(PetPhoto, photo.pk, "image", photo.image.name,
+                                pet_photo_name(pet.id, idx, photo.image.name), then=images.share_derivatives)
+            if names:
+                share_on_commit(Pet, pet.pk, "cover", names[0], pet_cover_name(pet.id, names[0]),
+                                then=images.share_derivatives)
 
             self.created_pet = pet
             self.status = "approved"
@@ -272,6 +316,15 @@ class Donation(models.Model):
             return pet
 
 
+def pet_cover_name(pet_id, source: str) -> str:
+    """捐赠照片转成 Pet 封面时的独立文件名（MEDIA_SHARE_MODE=link/copy）"""
+    return f"pets/{pet_id}_{source.split('/')[-1]}"
+
+
+def pet_photo_name(pet_id, idx: int, source: str) -> str:
+    return f"pets/photos/{pet_id}_{idx}_{source.split('/')[-1]}"
+
+
 class PetPhoto(models.Model):
     """ Pet 的额外照片（多图） """
     pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name="photos", verbose_name="Pet")
@@ -314,6 +367,11 @@ class Country(models.Model):
         ordering = ["name"]
         verbose_name = "Country"
         verbose_name_plural = "Countries"
+        # name__iexact / code__iexact 生成 UPPER(col::text) = UPPER(%s)，普通 B-tree 用不上
+        indexes = [
+            models.Index(Upper("name"), name="pet_country_name_upper_idx"),
+            models.Index(Upper("code"), name="pet_country_code_upper_idx"),
+        ]
 
     def __str__(self): return self.name
 
@@ -328,7 +386,11 @@ class Region(models.Model):  # 省/州
         ordering = ["name"]
         verbose_name = "Region"
         verbose_name_plural = "Regions"
-        indexes = [models.Index(fields=["country", "name"])]
+        indexes = [
+            models.Index(fields=["country", "name"]),
+            models.Index(F("country"), Upper("name"), name="pet_region_country_uname_idx"),
+            models.Index(Upper("name"), name="pet_region_name_upper_idx"),
+        ]
 
     def __str__(self): return self.name
 
@@ -342,12 +404,50 @@ class City(models.Model):
         ordering = ["name"]
         verbose_name = "City"
         verbose_name_plural = "Cities"
-        indexes = [models.Index(fields=["region", "name"])]
+        indexes = [
+            models.Index(fields=["region", "name"]),
+            models.Index(F("region"), Upper("name"), name="pet_city_region_uname_idx"),
+            models.Index(Upper("name"), name="pet_city_name_upper_idx"),
+        ]
 
     def __str__(self): return self.name
 
 
+_STREET_PREFIX_RE = re.compile(r"^(ul\.?|ulica)\s+")
+_PUNCT_RE = re.compile(r"[.,;:/\\-]+")
+
+
+def canonical_address_key(country_id, region_id, city_id, street, building_number, postal_code):
+    """
+    Hash identifying "the same place" for Address de-duplication: street and building
+    number (case/spacing/punctuation folded, "ul." dropped, in either field), postal
+    code and the most specific locality id. None when there is nothing to identify.
+    """
+    line = " ".join(p for p in (street or "", building_number or "") if p).casefold()
+    line = _STREET_PREFIX_RE.sub("", " ".join(line.split()))
+    line = " ".join(_PUNCT_RE.sub(" ", line).split())
+    postal = re.sub(r"[^0-9A-Za-z]", "", postal_code or "").upper()
+    if city_id:
+        locality = f"c{city_id}"
+    elif region_id:
+        locality = f"r{region_id}"
+    elif country_id:
+        locality = f"k{country_id}"
+    else:
+        locality = ""
+    if not (line or postal or locality):
+        return None
+    return hashlib.sha256(f"{locality}|{line}|{postal}".encode("utf-8")).hexdigest()
+
+
 class Address(models.Model):
+    class GeocodeStatus(models.TextChoices):
+        NONE = "", "Not requested"
+        PENDING = "pending", "Pending"  # 已入队，等待 geocode_worker
+        OK = "ok", "Geocoded"
+        NOT_FOUND = "not_found", "Not found"
+        FAILED = "failed", "Failed"  # 重试次数用尽
+
     country = models.ForeignKey(
         Country, on_delete=models.PROTECT, verbose_name="Country",
         null=True, blank=True  # ← 允许空（第一次迁移更顺滑）
@@ -369,8 +469,18 @@ class Address(models.Model):
     postal_code = models.CharField("Postal Code", max_length=20, blank=True, default="")
     latitude = models.DecimalField("Lat", max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField("Lng", max_digits=9, decimal_places=6, null=True, blank=True)
-  # ✅ 新增：地理点（WGS84，经纬度）
+    # 空间查询用的几何点（WGS84），带 GiST 索引；由 latitude/longitude 派生，见 save()
+    geom = gis_models.PointField("Geometry", srid=4326, null=True, blank=True, spatial_index=True)
+    # 旧的 GeoJSON 副本，仅为兼容现有接口输出保留，同样由 latitude/longitude 派生
     location  = models.JSONField(default=dict, null=True, blank=True)
+    geocode_status = models.CharField(
+        "Geocode Status", max_length=10, choices=GeocodeStatus.choices, default=GeocodeStatus.NONE, blank=True
+    )
+    # 规范地址哈希（见 canonical_address_key）：相同地址只存一行，由 apps/pet/addresses.py 复用。
+    # 为空表示非共享行（例如与规范行坐标不一致的地图定位点）
+    canonical_key = models.CharField(
+        "Canonical Key", max_length=64, null=True, blank=True, unique=True, editable=False
+    )
 
     class Meta:
         ordering = ["country", "region", "city", "street"]
@@ -391,6 +501,158 @@ class Address(models.Model):
         ]
         return ", ".join([p for p in parts if p]) or "Address"
 
+    def sync_geom(self):
+        """Derive geom/location from latitude/longitude (falling back to legacy location JSON)."""
+        if self.latitude is None or self.longitude is None:
+            coords = (self.location or {}).get("coordinates") if isinstance(self.location, dict) else None
+            if coords and len(coords) == 2 and None not in coords:
+                self.longitude, self.latitude = round(float(coords[0]), 6), round(float(coords[1]), 6)
+        if self.latitude is None or self.longitude is None:
+            self.geom = None
+            return
+        lon, lat = float(self.longitude), float(self.latitude)
+        self.geom = Point(lon, lat, srid=4326)
+        self.location = {"type": "Point", "coordinates": [lon, lat]}
+
+    KEY_FIELDS = {"country", "region", "city", "street", "building_number", "postal_code"}
+
+    def compute_canonical_key(self):
+        return canonical_address_key(
+            self.country_id, self.region_id, self.city_id, self.street, self.building_number, self.postal_code
+        )
+
+    def _refresh_canonical_key(self, update_fields):
+        # 只有共享行需要跟随文本修改；新键已被别的行占用时退出共享，而不是报唯一约束错误
+        if not self.canonical_key:
+            return update_fields
+        if update_fields is not None and not self.KEY_FIELDS & set(update_fields):
+            return update_fields
+        key = self.compute_canonical_key()
+        if key == self.canonical_key:
+            return update_fields
+        if key and Address.objects.filter(canonical_key=key).exclude(pk=self.pk).exists():
+            key = None
+        self.canonical_key = key
+        return None if update_fields is None else set(update_fields) | {"canonical_key"}
+
+    def save(self, *args, **kwargs):
+        self.sync_geom()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude", "location"} & set(update_fields):
+            update_fields = set(update_fields) | {"latitude", "longitude", "geom", "location"}
+        update_fields = self._refresh_canonical_key(update_fields)
+        if update_fields is not None:
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
+
+class GeocodeResult(models.Model):
+    """
+    Persistent geocoder cache keyed by the normalized query (see apps/pet/geocoding.py).
+    found=False rows are negative results; they expire so the address is retried later.
+    """
+    key = models.CharField("Query Hash", max_length=64, unique=True)
+    query = models.TextField("Normalized Query")
+    found = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    provider = models.CharField(max_length=20, blank=True, default="")
+    confidence = models.FloatField(null=True, blank=True, help_text="Provider relevance/importance, 0..1")
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Empty = never expires")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Geocode Result"
+        verbose_name_plural = "Geocode Results"
+
+    def __str__(self):
+        if self.found:
+            return f"{self.query} -> {self.latitude},{self.longitude} ({self.provider})"
+        return f"{self.query} -> not found"
+
+    @property
+    def coords(self):
+        """(lon, lat) like geocode_address(), or None for negative results."""
+        if self.found and self.latitude is not None and self.longitude is not None:
+            return self.longitude, self.latitude
+        return None
+
+
+class GeocodeJob(models.Model):
+    """
+    Queued geocoding request for one Address, processed by ``manage.py geocode_worker``.
+    query/context are captured at enqueue time because free-text parts that did not
+    resolve to a City/Region/Country row are not stored on the Address itself.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    address = models.ForeignKey(Address, on_delete=models.CASCADE, related_name="geocode_jobs")
+    query = models.TextField("Query", blank=True, default="")
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Geocode Job"
+        verbose_name_plural = "Geocode Jobs"
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="pet_geocodejob_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"GeocodeJob#{self.pk} address={self.address_id} {self.status}"
+
+
+class ApprovalBatch(models.Model):
+    """
+    Donations approved together from the admin, processed in chunks by
+    ``manage.py approval_worker`` (apps/pet/approvals.py). Counters are
+    updated after every chunk so the admin can show progress; donations
+    that fail are listed in ``errors`` while the rest go through.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    donation_ids = models.JSONField(default=list)
+    reviewer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    note = models.CharField(max_length=200, blank=True, default="")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    approved = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=dict, blank=True, help_text="Donation id -> error")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Approval Batch"
+        verbose_name_plural = "Approval Batches"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="pet_approvalbatch_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"ApprovalBatch#{self.pk} {self.processed}/{self.total} {self.status}"
+
 
 class LostStatus(models.TextChoices):
     OPEN = "open", "Open"  # 待寻找
@@ -435,10 +697,37 @@ class Lost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # 冗余的地名（城市/地区/国家），让检索不必 join 地址表；见 apps/pet/search.py
+    search_places = models.TextField(blank=True, default="", editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("pet_name", weight="A", config="simple")
+            + SearchVector("species", "breed", "color", weight="B", config="simple")
+            + SearchVector("search_places", weight="C", config="simple")
+            + SearchVector("description", weight="D", config="simple")
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Lost"
         verbose_name_plural = "Losts"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="pet_lost_search_vector_idx"),
+            # 联想接口按最新排序取前几条
+            models.Index(fields=["-created_at"], name="pet_lost_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"address", "address_id"} & set(update_fields):
+            from .search import place_text
+            self.search_places = place_text(self.address if self.address_id else None)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"search_places"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         base = self.pet_name or f"{self.species} ({self.color})"
@@ -0,0 +1,234 @@
+"""
+Adopter -> pet recommendations scored with NumPy.
+
+Every process keeps a feature matrix of all AVAILABLE pets (species, size,
+sex, age in months, trait bitmask, owner, last update) as parallel NumPy
+arrays, so scoring 50k candidates for one UserProfile is a handful of
+vectorized operations plus an ``argpartition`` for the top K.
+
+The matrix is tagged with the Pet version counter (common.cache, bumped on
+every Pet write). At most every RECOMMEND_CHECK_INTERVAL seconds a request
+compares it; when it moved, only pets whose ``pub_date`` (auto_now) is newer
+than the last sync, minus RECOMMEND_SYNC_OVERLAP for transactions that
+committed late, are re-read and patched in. A row count that no longer
+matches the database (deletes, writes that bypass save()) and
+RECOMMEND_FULL_REBUILD seconds both force a full reload.
+"""
+import copy
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from common.cache import get_versions
+from common.traits import ALL_TRAITS, mask_from
+from .models import Pet
+
+FIELDS = ("id", "species", "size", "sex", "age_years", "age_months", "traits", "created_by_id", "pub_date")
+
+# 各项得分权重；特性按偏好命中的比例计分
+WEIGHTS = {
+    "species": 4.0,
+    "size": 1.5,
+    "sex": 1.0,
+    "age": 2.0,
+    "traits": 3.0,
+    "recency": 0.5,
+}
+# 超出偏好年龄范围时按距离衰减（月）
+AGE_DECAY_MONTHS = 12.0
+# 新近程度：这么多天前更新的宠物得到一半的 recency 分
+RECENCY_HALF_LIFE_DAYS = 30.0
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(ALL_TRAITS + 1)], dtype=np.float32)
+
+
+def _code(value) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+@dataclass
+class Preferences:
+    species: str = ""
+    size: str = ""
+    sex: str = ""
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+    traits: int = 0
+
+    @classmethod
+    def from_profile(cls, profile) -> "Preferences":
+        if profile is None:
+            return cls()
+        return cls(
+            species=_code(profile.preferred_species),
+            size=_code(profile.preferred_size),
+            sex=_code(profile.preferred_gender),
+            age_min=profile.preferred_age_min,
+            age_max=profile.preferred_age_max,
+            traits=mask_from(profile, prefix="prefer_"),
+        )
+
+
+class FeatureMatrix:
+    def __init__(self, version=None):
+        self.version = version
+        self.synced_at = None           # 数据库时间水位（pub_date）
+        self.built_at = time.monotonic()
+        self.codes: Dict[str, Dict[str, int]] = {"species": {}, "size": {}, "sex": {}}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.species = np.empty(0, dtype=np.int32)
+        self.size = np.empty(0, dtype=np.int32)
+        self.sex = np.empty(0, dtype=np.int32)
+        self.age = np.empty(0, dtype=np.float32)
+        self.traits = np.empty(0, dtype=np.int32)
+        self.owner = np.empty(0, dtype=np.int64)
+        self.updated = np.empty(0, dtype=np.float64)   # pub_date，unix 秒
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copy(self) -> "FeatureMatrix":
+        # 数组只会被整体替换、不会原地修改，浅拷贝即可
+        clone = copy.copy(self)
+        clone.codes = {column: dict(table) for column, table in self.codes.items()}
+        return clone
+
+    def _encode(self, column: str, value) -> int:
+        # 0 留给“空值”，不会与任何偏好匹配
+        value = _code(value)
+        if not value:
+            return 0
+        table = self.codes[column]
+        return table.setdefault(value, len(table) + 1)
+
+    def code_of(self, column: str, value) -> int:
+        """Code of a preference value; -1 when no pet has it (matches nothing)."""
+        value = _code(value)
+        return self.codes[column].get(value, -1) if value else -1
+
+    def _arrays(self, rows) -> Tuple[np.ndarray, ...]:
+        return (
+            np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((self._encode("species", r[1]) for r in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter((self._encode("size", r[2]) for r in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter((self._encode("sex", r[3]) for r in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter(((r[4] or 0) * 12 + (r[5] or 0) for r in rows), dtype=np.float32, count=len(rows)),
+            np.fromiter(((r[6] or 0) for r in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter(((r[7] or 0) for r in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((r[8].timestamp() for r in rows), dtype=np.float64, count=len(rows)),
+        )
+
+    _COLUMNS = ("ids", "species", "size", "sex", "age", "traits", "owner", "updated")
+
+    def replace(self, remove_ids, rows) -> None:
+        """Drop ``remove_ids`` and append ``rows`` (tuples in FIELDS order)."""
+        keep = ~np.isin(self.ids, np.asarray(list(remove_ids), dtype=np.int64)) if len(remove_ids) else None
+        new = self._arrays(rows)
+        for name, added in zip(self._COLUMNS, new):
+            current = getattr(self, name)
+            if keep is not None:
+                current = current[keep]
+            setattr(self, name, np.concatenate([current, added]) if len(added) else current)
+
+    def score(self, prefs: Preferences, now: float, exclude_owner: Optional[int] = None) -> np.ndarray:
+        """One float32 score per row; excluded rows get -inf."""
+        score = np.zeros(len(self), dtype=np.float32)
+        if prefs.species:
+            score += WEIGHTS["species"] * (self.species == self.code_of("species", prefs.species))
+        if prefs.size:
+            score += WEIGHTS["size"] * (self.size == self.code_of("size", prefs.size))
+        if prefs.sex:
+            score += WEIGHTS["sex"] * (self.sex == self.code_of("sex", prefs.sex))
+        if prefs.age_min is not None or prefs.age_max is not None:
+            low = np.float32(prefs.age_min if prefs.age_min is not None else 0)
+            high = np.float32(prefs.age_max if prefs.age_max is not None else np.inf)
+            distance = np.maximum(low - self.age, 0) + np.maximum(self.age - high, 0)
+            score += WEIGHTS["age"] * np.exp(-distance / AGE_DECAY_MONTHS)
+        if prefs.traits:
+            wanted = POPCOUNT[prefs.traits]
+            score += WEIGHTS["traits"] * POPCOUNT[self.traits & prefs.traits] / wanted
+        age_days = np.maximum(now - self.updated, 0) / 86400.0
+        score += WEIGHTS["recency"] * np.exp2(-age_days / RECENCY_HALF_LIFE_DAYS)
+        if exclude_owner is not None:
+            score[self.owner == exclude_owner] = -np.inf
+        return score
+
+    def top(self, prefs: Preferences, limit: int, now: Optional[float] = None,
+            exclude_owner: Optional[int] = None) -> List[Tuple[int, float]]:
+        """The ``limit`` best (pet id, score) pairs, best first."""
+        if not len(self) or limit <= 0:
+            return []
+        score = self.score(prefs, time.time() if now is None else now, exclude_owner)
+        k = min(limit, len(score))
+        candidates = np.argpartition(-score, k - 1)[:k]
+        # 同分时 id 大的（较新）在前，结果稳定
+        order = np.lexsort((-self.ids[candidates], -score[candidates]))
+        picked = candidates[order]
+        return [(int(self.ids[i]), float(score[i])) for i in picked if np.isfinite(score[i])]
+
+
+def _available():
+    return Pet.objects.filter(status=Pet.Status.AVAILABLE)
+
+
+def build(version=None) -> FeatureMatrix:
+    matrix = FeatureMatrix(version)
+    matrix.synced_at = timezone.now()
+    matrix.replace((), list(_available().values_list(*FIELDS).iterator(chunk_size=5000)))
+    return matrix
+
+
+def sync(matrix: FeatureMatrix, version) -> FeatureMatrix:
+    """Patch in pets changed since the last sync; fall back to a full build when counts disagree."""
+    if time.monotonic() - matrix.built_at > settings.RECOMMEND_FULL_REBUILD:
+        return build(version)
+    now = timezone.now()
+    since = matrix.synced_at - timedelta(seconds=settings.RECOMMEND_SYNC_OVERLAP)
+    changed = list(Pet.objects.filter(pub_date__gt=since).values_list("status", *FIELDS))
+    matrix.replace([row[1] for row in changed],
+                   [row[1:] for row in changed if row[0] == Pet.Status.AVAILABLE])
+    matrix.synced_at = now
+    matrix.version = version
+    if len(matrix) != _available().count():
+        return build(version)
+    return matrix
+
+
+_current: Optional[FeatureMatrix] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get() -> FeatureMatrix:
+    """The current matrix, synced when the Pet version counter has moved."""
+    global _current, _checked_at
+    now = time.monotonic()
+    matrix = _current
+    if matrix is not None and now - _checked_at < settings.RECOMMEND_CHECK_INTERVAL:
+        return matrix
+    version = get_versions(Pet)
+    with _lock:
+        if _current is None:
+            _current = build(version)
+        elif _current.version != version:
+            # 在副本上增量更新，正在打分的请求继续用旧数组
+            _current = sync(_current.copy(), version)
+        _checked_at = now
+        return _current
+
+
+def reset():
+    global _current, _checked_at
+    with _lock:
+        _current, _checked_at = None, 0.0
+
+
+def recommend(user, limit: int) -> List[Tuple[int, float]]:
+    profile = getattr(user, "profile", None)
+    return get().top(Preferences.from_profile(profile), limit, exclude_owner=user.pk)
@@ -0,0 +1,98 @@
+"""
+Pet and Lost full-text search.
+
+Pet.search_vector is a stored generated tsvector (name weight A,
+species/breed B, description C) with a GIN index. A query matches when the
+vector matches the websearch-style tsquery, or when name/breed is
+trigram-similar to the text (typos like "labrodor"); both predicates are
+index-backed, so Postgres combines them with a BitmapOr instead of the
+sequential scans the icontains-based SearchFilter needed.
+
+Lost.search_vector covers pet name, species/breed/colour, place names and
+description. The place names live in Lost.search_places, a denormalized
+copy of the address' city/region/country kept current by Lost.save() and
+the Address/City/Region/Country signals, so searching never joins the
+address tables. Lost queries use prefix terms ("lab bur" -> lab:* & bur:*),
+which serves both the q filter and the typeahead endpoint.
+"""
+import re
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import ExpressionWrapper, F, FloatField, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Greatest, Upper
+
+from . import gazetteer
+from .models import Address
+
+SEARCH_CONFIG = "simple"
+MAX_QUERY_LENGTH = 200
+MAX_PREFIX_TERMS = 8
+# 模糊匹配分数的权重，低于全文命中（name 权重 A 的 ts_rank 约 0.6）
+FUZZY_WEIGHT = 0.5
+
+
+def search_pets(qs, text: str):
+    """Filter ``qs`` to pets matching ``text`` and order by relevance (``search_rank``)."""
+    text = " ".join(str(text or "").split())[:MAX_QUERY_LENGTH]
+    if not text:
+        return qs
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    # UPPER(col) 与三元组索引的表达式一致；相似度本身不区分大小写
+    needle = Value(text.upper())
+    name, breed = Upper("name"), Upper("breed")
+    matches = (
+        Q(search_vector=query)
+        | Q(TrigramSimilar(name, needle))
+        | Q(TrigramSimilar(breed, needle))
+    )
+    rank = SearchRank(F("search_vector"), query) + FUZZY_WEIGHT * Greatest(
+        TrigramSimilarity(name, needle), TrigramSimilarity(breed, needle)
+    )
+    return (
+        qs.filter(matches)
+        .annotate(search_rank=ExpressionWrapper(rank, output_field=FloatField()))
+        .order_by("-search_rank", "-pub_date")
+    )
+
+
+def prefix_query(text: str):
+    """``lab bur`` -> ``lab:* & bur:*``; None when there is nothing to search for."""
+    terms = re.findall(r"\w+", str(text or "").lower()[:MAX_QUERY_LENGTH])[:MAX_PREFIX_TERMS]
+    if not terms:
+        return None
+    # 只保留 \w 字符，拼接 raw tsquery 不会有注入/语法错误
+    return SearchQuery(" & ".join(f"{t}:*" for t in terms), search_type="raw", config=SEARCH_CONFIG)
+
+
+def search_lost(qs, text: str):
+    """Filter ``qs`` (Lost) to reports whose search document matches every prefix in ``text``."""
+    query = prefix_query(text)
+    return qs if query is None else qs.filter(search_vector=query)
+
+
+# ---------- Lost.search_places ----------
+
+def place_text(address) -> str:
+    """City, region and country names of ``address`` (from the gazetteer, no queries on a hit)."""
+    if address is None:
+        return ""
+    names = []
+    for pk, lookup in ((address.city_id, gazetteer.city_by_id),
+                       (address.region_id, gazetteer.region_by_id),
+                       (address.country_id, gazetteer.country_by_id)):
+        place = lookup(pk) if pk else None
+        if place is not None and place.name:
+            names.append(place.name)
+    return " ".join(names)
+
+
+def refresh_lost_places(lost_qs) -> int:
+    """Recompute search_places for ``lost_qs`` in one UPDATE (used after place/address renames)."""
+    names = (
+        Address.objects.filter(pk=OuterRef("address_id"))
+        .annotate(text=Func(F("city__name"), F("region__name"), F("country__name"),
+                            template="CONCAT_WS(' ', %(expressions)s)", output_field=TextField()))
+        .values("text")[:1]
+    )
+    return lost_qs.update(search_places=Coalesce(Subquery(names), Value("")))
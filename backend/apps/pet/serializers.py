@@ -2,9 +2,14 @@ from __future__ import annotations
 # apps/pet/serializers.py
 from rest_framework import serializers
 import json
-from .models import Pet, Adoption, DonationPhoto, Donation, Lost, Address, Country, Region, City, PetFavorite, Shelter, Ticket, HolidayFamily
+from django.db.models import Prefetch
+from .models import Pet, Adoption, DonationPhoto, Donation, Lost, Address, Country, Region, City, PetFavorite, PetPhoto, Shelter, Ticket, HolidayFamily
 from typing import TYPE_CHECKING
-from common.utils import geocode_address
+from common import images
+from common.images import SrcsetField, ThumbnailField, variants
+from . import gazetteer
+from .addresses import get_or_create_address
+from .geocode_jobs import enqueue as enqueue_geocode
 if TYPE_CHECKING:
     from apps.pet.models import Location
 
@@ -25,16 +30,14 @@ def _create_or_resolve_address(address_data: dict) -> Address:
     def _norm(s):
         return str(s).strip() if s is not None else None
 
+    # 名称解析走进程内 gazetteer，常见情况下不查库（见 apps/pet/gazetteer.py）
     cval = address_data.get('country')
     if cval is not None:
         if isinstance(cval, int):
-            country = Country.objects.filter(pk=cval).first()
+            country = gazetteer.country_by_id(cval)
         else:
             cstr = _norm(cval)
-            if len(cstr or '') == 2:
-                country = Country.objects.filter(code__iexact=cstr).first()
-            if not country:
-                country = Country.objects.filter(name__iexact=cstr).first()
+            country = gazetteer.resolve_country(cstr)
             if not country:
                 # fallback: create with a guessed code
                 code = ''.join([ch for ch in cstr if ch.isalpha()])[:2].upper() or 'XX'
@@ -43,35 +46,27 @@ def _create_or_resolve_address(address_data: dict) -> Address:
     rval = address_data.get('region')
     if rval is not None:
         if isinstance(rval, int):
-            region = Region.objects.filter(pk=rval).first()
+            region = gazetteer.region_by_id(rval)
         else:
             rstr = _norm(rval)
-            if country:
-                region = Region.objects.filter(country=country, name__iexact=rstr).first()
-            if not region:
-                region = Region.objects.filter(name__iexact=rstr).first()
+            region = gazetteer.resolve_region(rstr, country)
             if not region and country:
                 region, _ = Region.objects.get_or_create(country=country, name=rstr)
 
     ctyval = address_data.get('city')
     if ctyval is not None:
         if isinstance(ctyval, int):
-            city = City.objects.filter(pk=ctyval).first()
+            city = gazetteer.city_by_id(ctyval)
         else:
             cstr = _norm(ctyval)
-            if region:
-                city = City.objects.filter(region=region, name__iexact=cstr).first()
-            if not city:
-                city = City.objects.filter(name__iexact=cstr).first()
+            city = gazetteer.resolve_city(cstr, region)
             if not city and region:
                 city, _ = City.objects.get_or_create(region=region, name=cstr)
 
-    # If only city string provided and we didn't find a city, try find any city by name
-    if not city and isinstance(address_data.get('city'), str):
-        city = City.objects.filter(name__iexact=_norm(address_data.get('city'))).first()
-        if city and not region:
-            region = city.region
-            country = city.region.country if city.region else country
+    # If only the city was given, take region/country from it
+    if city and not region:
+        region = city.region
+        country = city.region.country if city.region else country
 
     # Build Address kwargs
     addr_kwargs = {}
@@ -117,7 +112,20 @@ def _create_or_resolve_address(address_data: dict) -> Address:
     
     logger.warning(f"Final addr_kwargs: {addr_kwargs}")
 
-    # If coordinates were not provided, try geocoding from the textual address
+    if lat_val is not None and lon_val is not None:
+        try:
+            # Store location as JSON with lon,lat
+            addr_kwargs['location'] = {"type": "Point", "coordinates": [lon_val, lat_val]}
+        except Exception:
+            # don't fail the whole flow if Point creation fails
+            pass
+
+    # 相同地址复用已有的规范行（连同其坐标），见 apps/pet/addresses.py
+    addr, created = get_or_create_address(**addr_kwargs)
+    logger.debug('Address %s id=%s with kwargs=%r', 'created' if created else 'reused', addr.id, addr_kwargs)
+
+    # If coordinates were not provided, queue geocoding from the textual address
+    # (the request never waits on the geocoder; see apps/pet/geocode_jobs.py)
     if (lat_val is None or lon_val is None):
         # Prefer resolved model names for city/region/country when available
         parts = []
@@ -148,33 +156,18 @@ def _create_or_resolve_address(address_data: dict) -> Address:
             parts.append(_norm(address_data.get('postal_code')))
 
         addr_str = ", ".join([p for p in parts if p])
+        ctx = {
+            'street': (f"{street} {bnum}" if street else bnum) if (street or bnum) else None,
+            'city': city.name if city else None,
+            'region': region.name if region else None,
+            'country': country.name if country else None,
+            'country_code': country.code if country else None,
+            'postal_code': _norm(address_data.get('postal_code')) if address_data.get('postal_code') else None,
+        }
         try:
-            ctx = {
-                'street': (f"{street} {bnum}" if street else bnum) if (street or bnum) else None,
-                'city': city.name if city else None,
-                'region': region.name if region else None,
-                'country': country.name if country else None,
-                'country_code': country.code if country else None,
-                'postal_code': _norm(address_data.get('postal_code')) if address_data.get('postal_code') else None,
-            }
-            coords = geocode_address(addr_str, context=ctx) if addr_str else None
-        except Exception:
-            coords = None
-        if coords:
-            lon_val, lat_val = coords
-            addr_kwargs['latitude'] = lat_val
-            addr_kwargs['longitude'] = lon_val
-
-    if lat_val is not None and lon_val is not None:
-        try:
-            # Store location as JSON with lon,lat
-            addr_kwargs['location'] = {"type": "Point", "coordinates": [lon_val, lat_val]}
+            enqueue_geocode(addr, addr_str, ctx)
         except Exception:
-            # don't fail the whole flow if Point creation fails
-            pass
-
-    addr = Address.objects.create(**addr_kwargs)
-    logger.debug('Address created id=%s with kwargs=%r', getattr(addr, 'id', None), addr_kwargs)
+            logger.exception('Failed to queue geocoding for address id=%s', addr.id)
     return addr
 
 
@@ -240,9 +233,30 @@ class LostGeoSerializer(serializers.ModelSerializer):
         model = Lost
         fields = ("id", "status", "pet_name", "species", "breed", "color", "sex", "size", "reporter", "lost_time", "geometry")
 
+class PetListBulkSerializer(serializers.ListSerializer):
+    """
+    列表页批量补全：整页只用一次查询取出当前用户收藏过的宠物 ID，
+    子序列化器的 get_is_favorited 直接查集合，不再逐行 exists()；
+    封面和照片的派生图状态也整页一次 get_many 取出。
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        u = getattr(request, 'user', None)
+        if u and u.is_authenticated:
+            self.context['favorited_pet_ids'] = set(
+                PetFavorite.objects.filter(user=u, pet_id__in=[p.pk for p in items])
+                .values_list('pet_id', flat=True)
+            )
+        names = [p.cover.name for p in items if p.cover]
+        names += [photo.image.name for p in items for photo in p.photos.all() if photo.image]
+        self.context.setdefault('derivatives_ready', {}).update(images.preload(names))
+        return super().to_representation(items)
+
+
 class PetListSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
-    applications_count = serializers.IntegerField(read_only=True, default=0)  # 预留统计字段
     age_display = serializers.SerializerMethodField()
     address_display = serializers.SerializerMethodField()
     city = serializers.SerializerMethodField()  # 城市名称
@@ -252,8 +266,11 @@ class PetListSerializer(serializers.ModelSerializer):
     cover = serializers.SerializerMethodField()  # 封面照片 URL
     photo = serializers.SerializerMethodField()  # 别名，同 cover
     photos = serializers.SerializerMethodField()  # 多张照片数组
+    # 缩略图与响应式图片（common/images.py），派生图生成前回退到原图
+    cover_thumb = ThumbnailField(source="cover")
+    cover_srcset = SrcsetField(source="cover")
+    photo_thumbs = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
-    favorites_count = serializers.IntegerField(source='favorites.count', read_only=True)
     # 收容所信息
     shelter_name = serializers.SerializerMethodField()
     shelter_address = serializers.SerializerMethodField()
@@ -268,6 +285,7 @@ class PetListSerializer(serializers.ModelSerializer):
             "id", "name", "species", "breed", "sex",
             "age_years", "age_months", "age_display", "size",
             "description", "address_display", "city", "cover", 'photo', 'photos',
+            "cover_thumb", "cover_srcset", "photo_thumbs",
             "address_lat", "address_lon",
             "dewormed", "vaccinated", "microchipped", "child_friendly", "trained",
             "loves_play", "loves_walks", "good_with_dogs", "good_with_cats",
@@ -277,7 +295,28 @@ class PetListSerializer(serializers.ModelSerializer):
             "is_favorited", "favorites_count",
             "shelter_id", "shelter_name", "shelter_address", "shelter_phone", "shelter_website", "shelter_description",
         )
-        read_only_fields = ("status", "created_by", "applications_count", "add_date", "pub_date")
+        read_only_fields = ("status", "created_by", "applications_count", "favorites_count", "add_date", "pub_date")
+        list_serializer_class = PetListBulkSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        为列表/详情预先加载所有 get_* 方法会访问的关联，保证查询数与页大小无关：
+        外键走 select_related，照片走单次 Prefetch；收藏数/申请数直接读 Pet 上的计数列。
+        """
+        return (
+            queryset
+            .select_related(
+                'created_by',
+                'address', 'address__city', 'address__region', 'address__country',
+                'shelter', 'shelter__address', 'shelter__address__city',
+                'shelter__address__region', 'shelter__address__country',
+                'from_donor', 'from_donor__shelter', 'from_donor__shelter__address',
+                'from_donor__shelter__address__city', 'from_donor__shelter__address__region',
+                'from_donor__shelter__address__country',
+            )
+            .prefetch_related(Prefetch('photos', queryset=PetPhoto.objects.order_by('order', 'id')))
+        )
 
     def get_cover(self, obj: Pet) -> str:
         """返回封面照片的绝对 URL"""
@@ -308,11 +347,19 @@ class PetListSerializer(serializers.ModelSerializer):
                     urls.append(photo.image.url)
         return urls
 
+    def get_photo_thumbs(self, obj: Pet):
+        """额外照片的缩略图 URL，与 photos 一一对应"""
+        request = self.context.get('request')
+        return [variants(photo.image, request, self.context)['thumb'] for photo in obj.photos.all() if photo.image]
+
     def get_is_favorited(self, obj: Pet) -> bool:
         request = self.context.get('request')
         u = getattr(request, 'user', None)
         if not (u and u.is_authenticated):
             return False
+        favorited_ids = self.context.get('favorited_pet_ids')
+        if favorited_ids is not None:
+            return obj.pk in favorited_ids
         return PetFavorite.objects.filter(user=u, pet=obj).exists()
 
     def get_age_display(self, obj: Pet) -> str:
@@ -486,60 +533,14 @@ class PetCreateUpdateSerializer(serializers.ModelSerializer):
         return super().to_internal_value(normalized_data)
 
     def _ensure_address_coords(self, address: Address):
-        """自动为地址地理编码（如果坐标缺失）"""
+        """坐标缺失时把地址放进地理编码队列（不在请求里同步调用地理编码服务）"""
         try:
-            if not address:
-                return
-            
-            # 检查是否需要地理编码
-            lat_missing = getattr(address, 'latitude', None) is None
-            lon_missing = getattr(address, 'longitude', None) is None
-            
-            # 如果坐标都存在，跳过
-            if not (lat_missing or lon_missing):
-                return
-            
-            # 构建地址字符串
-            parts = [
-                address.street or '',
-                address.building_number or '',
-                address.city.name if getattr(address, 'city_id', None) else '',
-                address.region.name if getattr(address, 'region_id', None) else '',
-                address.country.name if getattr(address, 'country_id', None) else '',
-                address.postal_code or '',
-            ]
-            addr_str = ", ".join([p for p in parts if p])
-            
-            # 构建地理编码上下文
-            ctx = {
-                'street': (f"{address.street} {address.building_number}".strip()) if (address.street or address.building_number) else None,
-                'city': address.city.name if getattr(address, 'city_id', None) else None,
-                'region': address.region.name if getattr(address, 'region_id', None) else None,
-                'country': address.country.name if getattr(address, 'country_id', None) else None,
-                'country_code': getattr(getattr(address, 'country', None), 'code', None) if getattr(address, 'country_id', None) else None,
-                'postal_code': address.postal_code or None,
-            }
-            
-            # 执行地理编码
-            coords = geocode_address(addr_str, context=ctx) if addr_str else None
-            
-            if coords:
-                lon, lat = coords
-                address.latitude = lat
-                address.longitude = lon
-                try:
-                    address.location = {"type": "Point", "coordinates": [lon, lat]}
-                except Exception:
-                    pass
-                address.save(update_fields=["latitude", "longitude", "location"])
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(f"✅ Address {address.id} geocoded: ({lat}, {lon})")
+            enqueue_geocode(address)
         except Exception as e:
             # 不阻断主流程，但记录错误
             import logging
             logger = logging.getLogger(__name__)
-            logger.warning(f"Failed to geocode address {getattr(address, 'id', '?')}: {e}")
+            logger.warning(f"Failed to queue geocoding for address {getattr(address, 'id', '?')}: {e}")
 
     def create(self, validated_data):
         # Handle address_data if provided
@@ -616,9 +617,12 @@ class AdoptionReviewSerializer(serializers.ModelSerializer):
 
 
 class DonationPhotoSerializer(serializers.ModelSerializer):
+    thumb = ThumbnailField(source="image")
+    srcset = SrcsetField(source="image")
+
     class Meta:
         model = DonationPhoto
-        fields = ["id", "image"]
+        fields = ["id", "image", "thumb", "srcset"]
 
 
 class DonationCreateSerializer(serializers.ModelSerializer):
@@ -697,7 +701,7 @@ class DonationCreateSerializer(serializers.ModelSerializer):
                                     fallback_kwargs['location'] = {"type": "Point", "coordinates": [lon_val, lat_val]}
                                 except Exception:
                                     pass
-                            address = Address.objects.create(**fallback_kwargs)
+                            address, _ = get_or_create_address(**fallback_kwargs)
                             validated_data['address'] = address
                             logger.debug('Fallback minimal Address created id=%s with kwargs=%r', address.id, fallback_kwargs)
                     except Exception:
@@ -816,6 +820,8 @@ class LostSerializer(serializers.ModelSerializer):
     latitude = serializers.SerializerMethodField(read_only=True)
     longitude = serializers.SerializerMethodField(read_only=True)
     photo_url = serializers.SerializerMethodField(read_only=True)
+    photo_thumb = ThumbnailField(source='photo')
+    photo_srcset = SrcsetField(source='photo')
 
     # 接受 JSON 字符串或字典 - 使用 CharField 避免 JSONField 在 to_internal_value 前的处理
     address_data = serializers.CharField(write_only=True, required=False, allow_blank=True)
@@ -826,7 +832,7 @@ class LostSerializer(serializers.ModelSerializer):
             'id', 'pet_name', 'species', 'breed', 'color', 'sex', 'size',
             'address', 'address_data',  # ✅ 新增
             'country', 'region', 'city', 'street', 'postal_code', 'latitude', 'longitude',
-            'lost_time', 'description', 'reward', 'photo', 'photo_url',
+            'lost_time', 'description', 'reward', 'photo', 'photo_url', 'photo_thumb', 'photo_srcset',
             'status', 'reporter', 'reporter_username',
             'contact_phone', 'contact_email',
             'created_at', 'updated_at',
@@ -963,13 +969,15 @@ class ShelterListSerializer(serializers.ModelSerializer):
     longitude = serializers.FloatField(source='address.longitude', read_only=True, allow_null=True)
     logo_url = serializers.SerializerMethodField(read_only=True)
     cover_url = serializers.SerializerMethodField(read_only=True)
+    logo_thumb = ThumbnailField(source='logo')
+    cover_thumb = ThumbnailField(source='cover_image')
 
     class Meta:
         model = Shelter
         fields = [
             'id', 'name', 'description', 'email', 'phone', 'website',
             'street', 'building_number', 'city', 'region', 'country', 'postal_code', 'latitude', 'longitude',
-            'logo_url', 'cover_url',
+            'logo_url', 'cover_url', 'logo_thumb', 'cover_thumb',
             'capacity', 'current_animals', 'available_capacity', 'occupancy_rate',
             'is_verified', 'is_active', 'created_at', 'updated_at'
         ]
@@ -1007,6 +1015,8 @@ class ShelterDetailSerializer(serializers.ModelSerializer):
     longitude = serializers.FloatField(source='address.longitude', read_only=True, allow_null=True)
     logo_url = serializers.SerializerMethodField(read_only=True)
     cover_url = serializers.SerializerMethodField(read_only=True)
+    logo_thumb = ThumbnailField(source='logo')
+    cover_thumb = ThumbnailField(source='cover_image')
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
 
     class Meta:
@@ -1014,7 +1024,7 @@ class ShelterDetailSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'description', 'email', 'phone', 'website',
             'address', 'street', 'building_number', 'city', 'region', 'country', 'postal_code', 'latitude', 'longitude',
-            'logo_url', 'cover_url',
+            'logo_url', 'cover_url', 'logo_thumb', 'cover_thumb',
             'capacity', 'current_animals', 'available_capacity', 'occupancy_rate',
             'founded_year', 'is_verified', 'is_active',
             'facebook_url', 'instagram_url', 'twitter_url',
@@ -1,9 +1,15 @@
 # apps/pet/signals.py
 from django.db import transaction
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
-from .models import Pet, Adoption, LostStatus, Lost
+from common import images
+from common.cache import bump_version
+from . import gazetteer
+from .search import place_text, refresh_lost_places
+from .models import Pet, Adoption, LostStatus, Lost, PetFavorite, PetPhoto, Shelter, Address, Country, Region, City, \
+    DonationPhoto
 
 OPEN_STATUSES = {"submitted", "processing"}  # 未结案申请的状态集合
 
@@ -70,6 +76,36 @@ def handle_status_transitions(sender, instance: Adoption, **kwargs):
             pet.save(update_fields=["status", "pub_date"])
 
 
+def _bump_counter(pet_id, field: str, delta: int):
+    """对 Pet 的冗余计数列做原子增减（不会减到负数）"""
+    qs = Pet.objects.filter(pk=pet_id)
+    if delta < 0:
+        qs = qs.filter(**{f"{field}__gte": -delta})
+    qs.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=PetFavorite)
+def incr_favorites_count(sender, instance: PetFavorite, created, **kwargs):
+    if created:
+        _bump_counter(instance.pet_id, "favorites_count", 1)
+
+
+@receiver(post_delete, sender=PetFavorite)
+def decr_favorites_count(sender, instance: PetFavorite, **kwargs):
+    _bump_counter(instance.pet_id, "favorites_count", -1)
+
+
+@receiver(post_save, sender=Adoption)
+def incr_applications_count(sender, instance: Adoption, created, **kwargs):
+    if created:
+        _bump_counter(instance.pet_id, "applications_count", 1)
+
+
+@receiver(post_delete, sender=Adoption)
+def decr_applications_count(sender, instance: Adoption, **kwargs):
+    _bump_counter(instance.pet_id, "applications_count", -1)
+
+
 def _safe_sex(value: str) -> str:
     choices = {c[0] for c in Pet.SEX_CHOICES}
     return value if value in choices else 'male'
@@ -126,3 +162,72 @@ def sync_pet_with_lost(sender, instance: Lost, created, **kwargs):
     if instance.status in (LostStatus.FOUND, LostStatus.CLOSED) and pet.status == Pet.Status.LOST:
         pet.status = Pet.Status.AVAILABLE
         pet.save(update_fields=["status", "pub_date"])
+
+
+# 新上传的图片在提交后交给后台线程生成缩略图/WebP/AVIF（common/images.py），
+# 生成完再递增一次版本号，之后缓存的列表页就带上缩略图
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=PetPhoto)
+@receiver(post_save, sender=DonationPhoto)
+@receiver(post_save, sender=Lost)
+@receiver(post_save, sender=Shelter)
+def build_image_derivatives(sender, instance, **kwargs):
+    images.schedule(instance)
+
+
+# 公共宠物列表缓存和地图瓦片缓存的版本号：提交后再递增，保证之后的请求一定读到新数据
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+@receiver(post_save, sender=PetPhoto)
+@receiver(post_delete, sender=PetPhoto)
+@receiver(post_save, sender=PetFavorite)
+@receiver(post_delete, sender=PetFavorite)
+@receiver(post_save, sender=Shelter)
+@receiver(post_delete, sender=Shelter)
+@receiver(post_save, sender=Adoption)
+@receiver(post_delete, sender=Adoption)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+@receiver(post_save, sender=Lost)
+@receiver(post_delete, sender=Lost)
+def bump_pet_list_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+# 地名索引（apps/pet/gazetteer.py）：本进程立即丢弃，其他进程在提交后通过版本号重新加载
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_gazetteer(sender, **kwargs):
+    gazetteer.reset()
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+# Lost.search_places 是地址地名的冗余副本：地址或地名变化时同步
+PLACE_FIELDS = {"country", "region", "city", "country_id", "region_id", "city_id"}
+
+
+@receiver(post_save, sender=Address)
+def sync_lost_places_on_address(sender, instance: Address, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not PLACE_FIELDS & set(update_fields)):
+        return  # 新地址还没有 Lost 引用；只改坐标/地理编码状态时地名不变
+    Lost.objects.filter(address_id=instance.pk).update(search_places=place_text(instance))
+
+
+@receiver(pre_delete, sender=Address)
+def clear_lost_places_on_address_delete(sender, instance: Address, **kwargs):
+    # 外键 SET_NULL 不发 Lost 的信号
+    Lost.objects.filter(address_id=instance.pk).update(search_places="")
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Region)
+@receiver(post_save, sender=City)
+def sync_lost_places_on_rename(sender, instance, created, **kwargs):
+    if created:
+        return
+    field = sender._meta.model_name  # country / region / city
+    refresh_lost_places(Lost.objects.filter(**{f"address__{field}": instance}))
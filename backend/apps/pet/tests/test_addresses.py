@@ -0,0 +1,102 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.pet import gazetteer
+from apps.pet.addresses import get_or_create_address
+from apps.pet.models import (Address, City, Country, Donation, GeocodeJob, Lost, Pet, Region, Shelter,
+                             canonical_address_key)
+from apps.pet.serializers import _create_or_resolve_address
+from common.testing import LOCMEM_CACHES
+
+
+class CanonicalKeyTest(SimpleTestCase):
+    def test_equivalent_spellings_share_a_key(self):
+        key = canonical_address_key(1, 2, 3, 'ul. Marszałkowska', '1', '00-001')
+        self.assertEqual(key, canonical_address_key(1, 2, 3, 'MARSZAŁKOWSKA  1', '', '00 001'))
+        self.assertEqual(key, canonical_address_key(None, None, 3, 'marszałkowska 1', '', '00001'))
+
+    def test_different_places_differ(self):
+        key = canonical_address_key(1, 2, 3, 'Marszałkowska', '1', '')
+        self.assertNotEqual(key, canonical_address_key(1, 2, 4, 'Marszałkowska', '1', ''))
+        self.assertNotEqual(key, canonical_address_key(1, 2, 3, 'Marszałkowska', '12', ''))
+        self.assertIsNone(canonical_address_key(None, None, None, '', '', ''))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GEOCODE_ASYNC=True)
+class CanonicalAddressTest(TestCase):
+    def setUp(self):
+        gazetteer.reset()
+        self.addCleanup(gazetteer.reset)
+        pl = Country.objects.create(code='PL', name='Poland')
+        self.city = City.objects.create(region=Region.objects.create(country=pl, name='Mazowieckie'), name='Warszawa')
+
+    def test_same_place_is_reused_with_its_coordinates(self):
+        first, created = get_or_create_address(city=self.city, street='Marszałkowska 1')
+        self.assertTrue(created)
+        self.assertIsNotNone(first.canonical_key)
+        # 第二次带坐标：复用并补上坐标
+        again, created = get_or_create_address(city=self.city, street='ul. marszałkowska', building_number='1',
+                                               latitude=52.23, longitude=21.01)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+        first.refresh_from_db()
+        self.assertIsNotNone(first.geom)
+        self.assertEqual(Address.objects.count(), 1)
+
+    def test_distant_pin_gets_a_private_row(self):
+        canonical, _ = get_or_create_address(city=self.city, street='Marszałkowska 1', latitude=52.23, longitude=21.01)
+        pin, created = get_or_create_address(city=self.city, street='Marszałkowska 1', latitude=52.25, longitude=21.05)
+        self.assertTrue(created)
+        self.assertNotEqual(pin.pk, canonical.pk)
+        self.assertIsNone(pin.canonical_key)
+
+    def test_submissions_share_one_address_and_one_geocode_job(self):
+        data = {'country': 'Poland', 'region': 'Mazowieckie', 'city': 'Warszawa', 'street': 'Nowy Świat 5'}
+        a = _create_or_resolve_address(dict(data))
+        b = _create_or_resolve_address(dict(data, street='nowy świat  5'))
+        self.assertEqual(a.pk, b.pk)
+        self.assertEqual(GeocodeJob.objects.count(), 1)
+
+    def test_dedupe_command_merges_and_repoints(self):
+        user = get_user_model().objects.create_user(username='dedupe', password='pass')
+        rows = [Address.objects.create(city=self.city, street=s, latitude=lat, longitude=lon)
+                for s, lat, lon in [('Marszałkowska 1', None, None),
+                                    ('marszałkowska 1', Decimal('52.23'), Decimal('21.01')),
+                                    ('ul. Marszałkowska 1', None, None),
+                                    ('Marszałkowska 1', Decimal('52.30'), Decimal('21.20')),  # 远处的定位点
+                                    ('Nowy Świat 5', None, None)]]
+        self.assertTrue(all(r.canonical_key is None for r in rows))
+        pet = Pet.objects.create(name='Rex', species='dog', created_by=user, address=rows[0])
+        donation = Donation.objects.create(donor=user, name='Tom', species='cat', address=rows[2])
+        lost = Lost.objects.create(pet_name='Mia', species='cat', address=rows[0], lost_time=timezone.now(), reporter=user)
+        shelter = Shelter.objects.create(name='Shelter', address=rows[2])
+        pin_lost = Lost.objects.create(pet_name='Pin', species='cat', address=rows[3], lost_time=timezone.now(), reporter=user)
+
+        out = StringIO()
+        call_command('dedupe_addresses', '--dry-run', stdout=out)
+        self.assertIn('2 duplicates to merge', out.getvalue())
+        self.assertEqual(Address.objects.count(), 5)
+
+        call_command('dedupe_addresses', '--chunk', '1', stdout=StringIO())
+        # 有坐标的那一行被保留
+        kept = rows[1]
+        self.assertEqual(set(Address.objects.values_list('id', flat=True)), {kept.id, rows[3].id, rows[4].id})
+        for obj in (pet, donation, lost, shelter):
+            obj.refresh_from_db()
+            self.assertEqual(obj.address_id, kept.id)
+        pin_lost.refresh_from_db()
+        self.assertEqual(pin_lost.address_id, rows[3].id)
+        kept.refresh_from_db()
+        self.assertIsNotNone(kept.canonical_key)
+        self.assertIsNone(Address.objects.get(pk=rows[3].id).canonical_key)
+
+        # 再跑一次无事可做；之后新提交直接复用规范行
+        out = StringIO()
+        call_command('dedupe_addresses', stdout=out)
+        self.assertIn('0 duplicates to merge, 0 rows to (re)key', out.getvalue())
+        self.assertEqual(get_or_create_address(city=self.city, street='Marszałkowska', building_number='1')[0].pk, kept.id)
@@ -0,0 +1,87 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import RequestFactory
+from django.urls import reverse
+
+from apps.pet import approvals
+from apps.pet.models import ApprovalBatch, Donation, DonationPhoto, Pet, PetPhoto
+from common.testing import LOCMEM_CACHES
+
+
+class DonationAdminActionsTest(SimpleTestCase):
+    def test_actions_are_registered(self):
+        request = RequestFactory().get('/admin/pet/donation/')
+        request.user = get_user_model()(is_superuser=True, is_staff=True, is_active=True)
+        actions = admin.site._registry[Donation].get_actions(request)
+        self.assertIn('approve_and_create_pet', actions)
+        self.assertIn('close_donation', actions)
+
+
+class ApprovalWorkerNameTest(SimpleTestCase):
+    def test_fits_locked_by(self):
+        hostname = 'approval-worker-7f9c8d6b5-x2k4q.ip-10-0-12-34.eu-central-1.compute.internal'
+        with mock.patch('socket.gethostname', return_value=hostname), \
+                mock.patch('apps.pet.approvals.claim', return_value=None) as claim:
+            call_command('approval_worker', '--once', stdout=StringIO())
+        worker = claim.call_args.args[0]
+        self.assertLessEqual(len(worker), ApprovalBatch._meta.get_field('locked_by').max_length)
+        self.assertTrue(worker.startswith('approval-worker-'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_DERIVATIVES_ON_UPLOAD=False, DONATION_APPROVAL_CHUNK=2,
+                   DONATION_APPROVAL_ASYNC=True)
+class ApprovalBatchTest(TestCase):
+    def setUp(self):
+        self.donor = get_user_model().objects.create_user(username='donor', password='pass')
+        self.admin = get_user_model().objects.create_superuser(username='boss', password='pass', email='b@x.pl')
+
+        def donation(name, status='submitted', photos=0):
+            d = Donation.objects.create(donor=self.donor, name=name, species='dog', status=status, vaccinated=True)
+            DonationPhoto.objects.bulk_create(
+                [DonationPhoto(donation=d, image=f'donations/{name}_{i}.jpg') for i in range(photos)])
+            return d
+
+        self.rex = donation('rex', photos=2)
+        self.mia = donation('mia', status='reviewing')
+        self.closed = donation('closed', status='closed')
+        self.done = donation('done')
+        self.done_pet = self.done.approve(reviewer=self.admin)
+
+    def test_batch_approves_in_bulk_with_partial_success(self):
+        ids = [self.rex.pk, self.mia.pk, self.closed.pk, self.done.pk, 999999]
+        batch = approvals.create_batch(ids, self.admin, 'bulk')
+        self.assertEqual(batch.status, ApprovalBatch.Status.PENDING)
+        self.assertEqual(approvals.claim('test').pk, batch.pk)
+        self.assertIsNone(approvals.claim('other'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = approvals.run_batch(batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.processed, batch.approved, batch.failed),
+                         (ApprovalBatch.Status.DONE, 5, 3, 2))
+        self.assertEqual(set(batch.errors), {str(self.closed.pk), '999999'})
+
+        self.rex.refresh_from_db()
+        pet = self.rex.created_pet
+        self.assertEqual((self.rex.status, self.rex.reviewer, pet.vaccinated), ('approved', self.admin, True))
+        self.assertEqual(pet.cover.name, 'donations/rex_0.jpg')
+        self.assertEqual(list(PetPhoto.objects.filter(pet=pet).values_list('image', flat=True)),
+                         ['donations/rex_0.jpg', 'donations/rex_1.jpg'])
+        self.done.refresh_from_db()
+        self.assertEqual(self.done.created_pet, self.done_pet)
+        self.assertEqual(Pet.objects.filter(created_by=self.donor).count(), 3)
+
+    @override_settings(DONATION_APPROVAL_ASYNC=False)
+    def test_admin_action_runs_batch_inline(self):
+        self.client.force_login(self.admin)
+        resp = self.client.post(reverse('admin:pet_donation_changelist'), {
+            'action': 'approve_and_create_pet', '_selected_action': [self.rex.pk, self.closed.pk],
+        }, follow=True)
+        self.assertContains(resp, 'Pass 1 time(s); Fail 1 time(s)')
+        batch = ApprovalBatch.objects.get()
+        self.assertContains(self.client.get(reverse('admin:pet_approvalbatch_change', args=[batch.pk])), '2/2 (100%)')
@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from common import cache as cache_helpers
+from common.cache_backends import TwoTierCache
+from common.checks import check_shared_cache_tier
+
+
+def make_cache(**options):
+    opts = {
+        'SHARED_BACKEND': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-test'},
+        'LOCAL_TIMEOUT': 5,
+        'LOCAL_SHARDS': 2,
+    }
+    opts.update(options)
+    cache = TwoTierCache('', {'TIMEOUT': 300, 'OPTIONS': opts})
+    cache.shared.clear()
+    return cache
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def test_reads_are_served_locally_after_first_fetch(self):
+        cache = make_cache()
+        cache.shared.set('petlist:a', {'n': 1})
+        self.assertEqual(cache.get('petlist:a'), {'n': 1})
+        self.assertEqual(cache.get('petlist:a'), {'n': 1})
+        stats = cache.stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['hit_rate'], 1.0)
+
+    def test_local_copy_expires_after_local_timeout(self):
+        cache = make_cache(LOCAL_TIMEOUT=1)
+        with mock.patch('common.cache_backends.time.monotonic', return_value=100.0):
+            cache.set('k', 'old')
+        cache.shared.set('k', 'new')
+        with mock.patch('common.cache_backends.time.monotonic', return_value=100.5):
+            self.assertEqual(cache.get('k'), 'old')
+        with mock.patch('common.cache_backends.time.monotonic', return_value=101.5):
+            self.assertEqual(cache.get('k'), 'new')
+
+    def test_lru_bound_and_delete(self):
+        cache = make_cache(LOCAL_MAX_ENTRIES=4)
+        for i in range(10):
+            cache.set(f'k{i}', i)
+        self.assertLessEqual(cache.stats()['local_entries'], 4)
+        self.assertEqual(cache.get('k0'), 0)  # 本地被淘汰，共享层仍有
+        cache.delete('k9')
+        self.assertIsNone(cache.get('k9'))
+
+    def test_prefix_rules_and_counters_use_shared_tier(self):
+        cache = make_cache(LOCAL_PREFIXES=('petlist:',))
+        cache.set('user@example.com', '1234')
+        cache.shared.delete('user@example.com')
+        self.assertIsNone(cache.get('user@example.com'))
+
+        cache.set('ver:pet', 1)
+        cache.shared.incr('ver:pet')
+        self.assertEqual(cache.get('ver:pet'), 2)
+        self.assertEqual(cache.incr('ver:pet'), 3)
+
+    def test_file_tier_increments_are_not_lost(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        params = {'OPTIONS': {'SHARED_BACKEND': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}}
+        TwoTierCache('', params).set('ver:pet', 0, None)
+
+        def bump():
+            cache = TwoTierCache('', params)  # 每个线程一个实例，相当于不同的 worker
+            for _ in range(25):
+                cache.incr('ver:pet')
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(TwoTierCache('', params).get('ver:pet'), 200)
+
+class CacheStatsTest(SimpleTestCase):
+    def setUp(self):
+        cache_helpers.reset_stats()
+        self.addCleanup(cache_helpers.reset_stats)
+
+    def test_counting_never_touches_the_cache(self):
+        with mock.patch.object(cache_helpers, 'cache') as shared:
+            for _ in range(3):
+                cache_helpers.incr_stat('hit')
+            cache_helpers.incr_stat('miss')
+            self.assertEqual(cache_helpers.get_stats(['hit', 'miss', 'other']), {'hit': 3, 'miss': 1, 'other': 0})
+        self.assertEqual(shared.method_calls, [])
+
+    @override_settings(CACHE_STATS_FLUSH_INTERVAL=3600)
+    def test_redis_tier_gets_batched_increments(self):
+        redis = make_cache().shared  # 代替 Redis：支持 incr/add
+        with mock.patch.object(cache_helpers, '_redis_tier', return_value=redis):
+            for _ in range(5):
+                cache_helpers.incr_stat('hit')
+            self.assertIsNone(redis.get('stats:hit'))  # 还没到推送间隔
+            self.assertEqual(cache_helpers.get_stats(['hit']), {'hit': 5})
+            cache_helpers.incr_stat('hit')
+            self.assertEqual(cache_helpers.get_stats(['hit']), {'hit': 6})
+
+
+class SharedTierCheckTest(SimpleTestCase):
+    def test_file_tier_warns(self):
+        def caches(backend):
+            return {'default': {'BACKEND': 'common.cache_backends.TwoTierCache', 'OPTIONS': {'SHARED_ALIAS': 'shared'}},
+                    'shared': {'BACKEND': backend, 'LOCATION': '/tmp/unused'}}
+
+        with override_settings(CACHES=caches('django.core.cache.backends.filebased.FileBasedCache')):
+            self.assertEqual([w.id for w in check_shared_cache_tier(None)], ['common.W001'])
+        with override_settings(CACHES=caches('django.core.cache.backends.redis.RedisCache')):
+            self.assertEqual(check_shared_cache_tier(None), [])
@@ -0,0 +1,87 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.pet.models import Adoption, Pet, PetFavorite
+from common.testing import LOCMEM_CACHES
+
+
+class PetSaveFieldsTest(SimpleTestCase):
+    def test_full_save_leaves_counters_out(self):
+        pet = Pet(id=1, name='Mia', species='cat')
+        pet._state.adding = False
+        with mock.patch.object(models.Model, 'save') as save:
+            pet.save()
+        fields = save.call_args.kwargs['update_fields']
+        self.assertIn('name', fields)
+        self.assertFalse(set(Pet.COUNTER_FIELDS) & set(fields))
+
+        with mock.patch.object(models.Model, 'save') as save:
+            pet.save(update_fields=['favorites_count'])
+        self.assertEqual(save.call_args.kwargs['update_fields'], ['favorites_count'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PetCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username='owner', password='pass')
+        cls.fan = User.objects.create_user(username='fan', password='pass')
+        cls.pet = Pet.objects.create(name='Mia', species='cat', created_by=cls.owner, status='available')
+
+    def counts(self):
+        return tuple(Pet.objects.filter(pk=self.pet.pk).values_list('favorites_count', 'applications_count').get())
+
+    def test_favorite_and_unfavorite(self):
+        client = APIClient()
+        client.force_authenticate(self.fan)
+        resp = client.post(reverse('pet:pet-favorite', args=[self.pet.pk]))
+        self.assertEqual(resp.data['count'], 1)
+        # 重复收藏不重复计数
+        self.assertEqual(client.post(reverse('pet:pet-favorite', args=[self.pet.pk])).data['count'], 1)
+        self.assertEqual(self.counts(), (1, 0))
+        resp = client.delete(reverse('pet:pet-unfavorite', args=[self.pet.pk]))
+        self.assertEqual(resp.data['count'], 0)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_applications_and_floor_at_zero(self):
+        application = Adoption.objects.create(pet=self.pet, applicant=self.fan)
+        self.assertEqual(self.counts(), (0, 1))
+        application.delete()
+        self.assertEqual(self.counts(), (0, 0))
+        # 计数已漂移到 0 时删除也不会减成负数
+        favorite = PetFavorite.objects.create(user=self.fan, pet=self.pet)
+        Pet.objects.filter(pk=self.pet.pk).update(favorites_count=0)
+        favorite.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_stale_instance_does_not_overwrite_counters(self):
+        stale = Pet.objects.get(pk=self.pet.pk)
+        PetFavorite.objects.create(user=self.fan, pet=self.pet)
+        Adoption.objects.create(pet=self.pet, applicant=self.fan)
+        stale.description = 'Loves laps'
+        stale.save()
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual(Pet.objects.get(pk=self.pet.pk).description, 'Loves laps')
+
+    def test_recount_repairs_drift(self):
+        PetFavorite.objects.create(user=self.fan, pet=self.pet)
+        Pet.objects.filter(pk=self.pet.pk).update(favorites_count=5, applications_count=3)
+
+        out = StringIO()
+        call_command('recount_pet_counters', '--dry-run', stdout=out)
+        self.assertIn('1 pet row(s)', out.getvalue())
+        self.assertEqual(self.counts(), (5, 3))
+
+        call_command('recount_pet_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0))
+        out = StringIO()
+        call_command('recount_pet_counters', '--dry-run', stdout=out)
+        self.assertIn('0 pet row(s)', out.getvalue())
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.pet.models import Donation, DonationPhoto, PetPhoto
+from common.storage import share
+from common.testing import LOCMEM_CACHES
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class MediaShareTest(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=root)
+        self.name = self.storage.save('donations/a.jpg', ContentFile(b'jpeg bytes'))
+
+    def test_modes(self):
+        self.assertEqual(share(self.name, 'pets/a.jpg', self.storage, mode='reference'), self.name)
+
+        linked = share(self.name, 'pets/a.jpg', self.storage, mode='link')
+        self.assertEqual(linked, 'pets/a.jpg')
+        self.assertTrue(os.path.samefile(self.storage.path(linked), self.storage.path(self.name)))
+
+        copied = share(self.name, 'pets/a.jpg', self.storage, mode='copy')
+        self.assertNotEqual(copied, linked)  # 目标已存在时换一个可用的名字
+        self.assertFalse(os.path.samefile(self.storage.path(copied), self.storage.path(self.name)))
+        with self.storage.open(copied) as fh:
+            self.assertEqual(fh.read(), b'jpeg bytes')
+
+        with self.assertRaises(ValueError):
+            share(self.name, 'pets/a.jpg', self.storage, mode='move')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=LOCMEM_CACHES, IMAGE_DERIVATIVES_ON_UPLOAD=False)
+class DonationApproveTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.donor = get_user_model().objects.create_user(username='donor', password='pass')
+        self.donation = Donation.objects.create(donor=self.donor, name='Rex', species='dog', status='submitted')
+        self.names = [default_storage.save(f'donations/rex_{i}.jpg', ContentFile(b'photo %d' % i)) for i in range(3)]
+        DonationPhoto.objects.bulk_create([DonationPhoto(donation=self.donation, image=n) for n in self.names])
+
+    def test_pet_references_donation_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pet = self.donation.approve(reviewer=None)
+        self.assertEqual(pet.cover.name, self.names[0])
+        self.assertEqual(list(PetPhoto.objects.filter(pet=pet).values_list('image', flat=True)), self.names)
+        self.assertFalse(default_storage.exists('pets'))
+        self.assertEqual(self.donation.approve(reviewer=None), pet)
+
+    @override_settings(MEDIA_SHARE_MODE='link')
+    def test_link_mode_gives_pet_its_own_names_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            pet = self.donation.approve(reviewer=None)
+        # 提交前仍引用原文件
+        self.assertEqual(pet.cover.name, self.names[0])
+        for callback in callbacks:
+            callback()
+        pet.refresh_from_db()
+        self.assertEqual(pet.cover.name, f'pets/{pet.id}_rex_0.jpg')
+        photos = list(PetPhoto.objects.filter(pet=pet).values_list('image', flat=True))
+        self.assertEqual(photos, [f'pets/photos/{pet.id}_{i}_rex_{i}.jpg' for i in range(3)])
+        self.assertTrue(os.path.samefile(default_storage.path(photos[1]), default_storage.path(self.names[1])))
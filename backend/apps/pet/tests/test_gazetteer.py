@@ -0,0 +1,71 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.pet import gazetteer
+from apps.pet.models import City, Country, Region
+from apps.pet.serializers import _create_or_resolve_address
+from common.testing import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GAZETTEER_CHECK_INTERVAL=0, GEOCODE_ASYNC=True)
+class GazetteerTest(TestCase):
+    def setUp(self):
+        self.pl = Country.objects.create(code='PL', name='Poland')
+        self.maz = Region.objects.create(country=self.pl, name='Mazowieckie', code='PL-14')
+        self.waw = City.objects.create(region=self.maz, name='Warszawa')
+        # 另一个国家里的同名城市
+        de = Country.objects.create(code='DE', name='Germany')
+        City.objects.create(region=Region.objects.create(country=de, name='Berlin'), name='Warszawa')
+        gazetteer.reset()
+        # 测试数据回滚不会触发信号，别把本用例的快照留给后面的用例
+        self.addCleanup(gazetteer.reset)
+
+    def test_lookups_hit_memory(self):
+        gazetteer.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(gazetteer.resolve_country('pl').pk, self.pl.pk)
+            self.assertEqual(gazetteer.resolve_country(' POLAND ').pk, self.pl.pk)
+            region = gazetteer.resolve_region('mazowieckie', self.pl)
+            city = gazetteer.resolve_city('WARSZAWA', region)
+            self.assertEqual(city.pk, self.waw.pk)
+            self.assertEqual(city.region.country.name, 'Poland')
+            self.assertEqual(gazetteer.city_by_id(self.waw.pk).name, 'Warszawa')
+
+    def test_miss_falls_back_to_database(self):
+        gazetteer.get()
+        # 绕过信号写入，内存索引看不到
+        City.objects.bulk_create([City(region=self.maz, name='Radom')])
+        with self.assertNumQueries(1):
+            self.assertEqual(gazetteer.resolve_city('radom', self.maz).name, 'Radom')
+        self.assertIsNone(gazetteer.resolve_city('Atlantis', self.maz))
+
+    def test_version_bump_reloads(self):
+        before = gazetteer.get()
+        self.assertIs(gazetteer.get(), before)
+        City.objects.bulk_create([City(region=self.maz, name='Płock')])
+        gazetteer.bump()
+        self.assertIsNot(gazetteer.get(), before)
+        with self.assertNumQueries(0):
+            self.assertEqual(gazetteer.resolve_city('płock').name, 'Płock')
+
+    def test_signals_invalidate_local_copy(self):
+        gazetteer.get()
+        City.objects.create(region=self.maz, name='Siedlce')
+        with self.assertNumQueries(3):  # 重新加载 3 张表
+            self.assertEqual(gazetteer.resolve_city('Siedlce', self.maz).name, 'Siedlce')
+
+    def test_address_resolution_does_not_query_place_tables(self):
+        gazetteer.get()
+        with CaptureQueriesContext(connection) as ctx:
+            address = _create_or_resolve_address({'country': 'Poland', 'region': 'Mazowieckie',
+                                                  'city': 'warszawa', 'street': 'Marszałkowska 1'})
+        place_selects = [q['sql'] for q in ctx.captured_queries
+                         if q['sql'].startswith('SELECT') and any(t in q['sql'] for t in ('"pet_country"', '"pet_region"', '"pet_city"'))]
+        self.assertEqual(place_selects, [])
+        address.refresh_from_db()
+        self.assertEqual((address.country_id, address.region_id, address.city_id), (self.pl.pk, self.maz.pk, self.waw.pk))
+
+    def test_city_only_fills_region_and_country(self):
+        address = _create_or_resolve_address({'city': 'Warszawa'})
+        self.assertEqual((address.country_id, address.region_id), (self.pl.pk, self.maz.pk))
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.pet import geo
+from apps.pet.models import Address, Lost, Shelter
+from common.testing import LOCMEM_CACHES
+
+
+class GeoParsingTest(SimpleTestCase):
+    def test_parse_bbox_and_point(self):
+        self.assertEqual(geo.parse_bbox('20.9,52.1,21.1,52.3'), (20.9, 52.1, 21.1, 52.3))
+        self.assertEqual(geo.parse_point('52.23,21.01'), (52.23, 21.01))
+        for bad in ('1,2,3', 'a,b,c,d', '0,10,1,5', '0,0,200,1'):
+            with self.assertRaises(ValueError):
+                geo.parse_bbox(bad)
+        with self.assertRaises(ValueError):
+            geo.parse_point('95,0')
+
+    def test_radius_bbox_widens_with_latitude(self):
+        min_lon, min_lat, max_lon, max_lat = geo.radius_bbox(60.0, 10.0, 111.32)
+        self.assertAlmostEqual(max_lat - min_lat, 2.0, places=3)
+        self.assertAlmostEqual(max_lon - min_lon, 4.0, places=2)  # cos(60°) = 0.5
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GeoQueryTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='geo', password='pass')
+        # 华沙市中心、华沙郊区（约 15km）、克拉科夫（约 250km）
+        self.center = self._lost('center', 52.2297, 21.0122)
+        self.suburb = self._lost('suburb', 52.1000, 21.0122)
+        self.krakow = self._lost('krakow', 50.0647, 19.9450)
+
+    def _lost(self, name, lat, lon):
+        address = Address.objects.create(latitude=Decimal(str(lat)), longitude=Decimal(str(lon)))
+        return Lost.objects.create(pet_name=name, species='dog', address=address,
+                                   lost_time=timezone.now(), reporter=self.user)
+
+    def test_save_derives_geom_and_location(self):
+        address = self.center.address
+        self.assertAlmostEqual(address.geom.x, 21.0122)
+        self.assertAlmostEqual(address.geom.y, 52.2297)
+        self.assertEqual(address.location['coordinates'], [21.0122, 52.2297])
+
+        address.latitude = Decimal('52.0')
+        address.save(update_fields=['latitude'])
+        address.refresh_from_db()
+        self.assertAlmostEqual(address.geom.y, 52.0)
+
+    def test_within_radius_orders_by_distance(self):
+        rows = list(geo.within_radius(Lost.objects.all(), 52.2297, 21.0122, 20))
+        self.assertEqual([r.pk for r in rows], [self.center.pk, self.suburb.pk])
+        self.assertLess(rows[0].distance.m, 1)
+        self.assertAlmostEqual(rows[1].distance.km, 14.4, delta=0.5)
+
+    def test_in_bbox(self):
+        qs = geo.in_bbox(Lost.objects.all(), (19.0, 49.5, 20.5, 50.5))
+        self.assertEqual(list(qs.values_list('pk', flat=True)), [self.krakow.pk])
+
+    def test_filter_backend_on_shelter_list(self):
+        Shelter.objects.create(name='Near', address=self.center.address)
+        Shelter.objects.create(name='Far', address=self.krakow.address)
+        client = APIClient()
+        resp = client.get(reverse('pet:shelter_list'), {'near': '52.23,21.01', 'radius': 5})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual([r['name'] for r in resp.data['results']], ['Near'])
+        resp = client.get(reverse('pet:shelter_list'), {'bbox': 'nope'})
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,114 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.pet import geocode_jobs, geocoding
+from apps.pet.models import Address, City, Country, GeocodeJob, GeocodeResult, Region
+from apps.pet.serializers import _create_or_resolve_address
+from common.testing import LOCMEM_CACHES
+
+HIT = geocoding.GeocodeHit(21.01, 52.23, 'mapbox', 0.9)
+
+
+@override_settings(GEOCODE_JOB_BACKOFF_BASE=30, GEOCODE_JOB_BACKOFF_MAX=600)
+class GeocodeBackoffTest(SimpleTestCase):
+    def test_backoff_grows_and_is_capped(self):
+        with mock.patch('apps.pet.geocode_jobs.random.uniform', return_value=1.0):
+            self.assertEqual([geocode_jobs.backoff(n) for n in (1, 2, 3, 6, 20)], [30, 60, 120, 600, 600])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GEOCODE_ASYNC=True, GEOCODE_JOB_MAX_ATTEMPTS=2)
+class GeocodeJobQueueTest(TestCase):
+    def setUp(self):
+        country = Country.objects.create(code='PL', name='Poland')
+        region = Region.objects.create(country=country, name='Mazowieckie')
+        self.city = City.objects.create(region=region, name='Warszawa')
+
+    def _address(self):
+        return Address.objects.create(city=self.city, street='Marszałkowska', building_number='1')
+
+    def _work(self):
+        call_command('geocode_worker', '--once', '--threads', '1', stdout=StringIO())
+
+    def test_create_path_queues_instead_of_calling_providers(self):
+        with mock.patch.object(geocoding, 'lookup') as lookup:
+            address = _create_or_resolve_address({'city': 'Warszawa', 'street': 'Marszałkowska 1'})
+        lookup.assert_not_called()
+        address.refresh_from_db()
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.PENDING)
+        self.assertIsNone(address.latitude)
+        job = GeocodeJob.objects.get(address=address)
+        self.assertEqual(job.context['city'], 'Warszawa')
+
+        # 重复入队不会产生第二个任务，也不会覆盖入队时的查询
+        self.assertEqual(geocode_jobs.enqueue(address), job)
+        self.assertEqual(GeocodeJob.objects.count(), 1)
+
+    def test_stored_result_is_applied_without_a_job(self):
+        address = self._address()
+        query, context = geocoding.address_query(address)
+        geocoding.store(geocoding.normalize_query(query, context), HIT)
+        self.assertIsNone(geocode_jobs.enqueue(address))
+        address.refresh_from_db()
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.OK)
+        self.assertAlmostEqual(float(address.latitude), 52.23)
+        self.assertIsNotNone(address.geom)
+        self.assertFalse(GeocodeJob.objects.exists())
+
+    def test_worker_fills_in_coordinates(self):
+        address = self._address()
+        job = geocode_jobs.enqueue(address)
+        with mock.patch.object(geocoding, 'lookup', return_value=HIT):
+            self._work()
+        job.refresh_from_db()
+        address.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GeocodeJob.Status.DONE, 1))
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.OK)
+        self.assertAlmostEqual(float(address.longitude), 21.01)
+        self.assertTrue(GeocodeResult.objects.filter(found=True).exists())
+
+    def test_not_found_is_final(self):
+        address = self._address()
+        job = geocode_jobs.enqueue(address)
+        with mock.patch.object(geocoding, 'lookup', return_value=None):
+            self._work()
+        job.refresh_from_db()
+        address.refresh_from_db()
+        self.assertEqual(job.status, GeocodeJob.Status.DONE)
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.NOT_FOUND)
+
+    def test_provider_errors_back_off_then_fail(self):
+        address = self._address()
+        job = geocode_jobs.enqueue(address)
+        with mock.patch.object(geocoding, 'lookup', side_effect=geocoding.ProviderError('HTTP 503')):
+            self._work()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (GeocodeJob.Status.PENDING, 1))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIn('503', job.last_error)
+
+            # 未到重试时间不会被领取
+            self._work()
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, 1)
+
+            GeocodeJob.objects.update(run_after=timezone.now())
+            self._work()
+        job.refresh_from_db()
+        address.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GeocodeJob.Status.FAILED, 2))
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.FAILED)
+        self.assertFalse(GeocodeResult.objects.exists())
+
+    @override_settings(GEOCODE_JOB_LOCK_TIMEOUT=60)
+    def test_stale_running_jobs_are_reclaimed(self):
+        job = geocode_jobs.enqueue(self._address())
+        self.assertEqual(geocode_jobs.claim(10, 'crashed'), [job])
+        self.assertEqual(geocode_jobs.claim(10, 'other'), [])
+        GeocodeJob.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        reclaimed = geocode_jobs.claim(10, 'other')
+        self.assertEqual([(j.pk, j.locked_by, j.attempts) for j in reclaimed], [(job.pk, 'other', 2)])
@@ -0,0 +1,240 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, unquote, urlparse
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.pet import geocoding
+from apps.pet.models import Address, GeocodeResult
+from common.testing import LOCMEM_CACHES
+from common.utils import geocode_address
+
+
+# 桩服务器已知的地址：Mapbox 只认识第一个，Nominatim 认识两个
+MAPBOX_KNOWN = {'marszałkowska 1, warszawa': (21.01, 52.23)}
+NOMINATIM_KNOWN = {'floriańska 5': (19.94, 50.06)}
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+    fail = False
+    mapbox_status = None  # 只让 Mapbox 返回这个状态码
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = unquote(url.path)
+        type(self).requests_seen.append((path, params))
+        if type(self).fail:
+            return self._send(503, {})
+        if path.startswith('/mapbox/') and type(self).mapbox_status:
+            return self._send(type(self).mapbox_status, {'message': 'stub error'})
+        if path.startswith('/mapbox/'):
+            query = path[len('/mapbox/'):-len('.json')].casefold()
+            coords = MAPBOX_KNOWN.get(query)
+            features = [{'center': list(coords), 'relevance': 0.95, 'place_type': ['address']}] if coords else []
+            return self._send(200, {'features': features})
+        if path == '/nominatim':
+            coords = NOMINATIM_KNOWN.get((params.get('street') or params.get('q') or '').casefold())
+            rows = [{'lon': str(coords[0]), 'lat': str(coords[1]), 'importance': 0.5}] if coords else []
+            return self._send(200, rows)
+        return self._send(404, {})
+
+
+class StubGeocoderMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeocoderHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls._stub_settings = override_settings(
+            MAPBOX_TOKEN='test-token',
+            GEOCODER_MAPBOX_URL=f'{base}/mapbox',
+            GEOCODER_NOMINATIM_URL=f'{base}/nominatim',
+            GEOCODER_TIMEOUT=2,
+            GEOCODER_RATE_LIMITS={'mapbox': 1000, 'nominatim': 1000},
+            CACHES=LOCMEM_CACHES,
+        )
+        cls._stub_settings.enable()
+        geocoding._buckets.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._stub_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        geocoding._buckets.clear()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        StubGeocoderHandler.requests_seen = []
+        StubGeocoderHandler.fail = False
+        StubGeocoderHandler.mapbox_status = None
+
+
+class GeocodingProviderTest(StubGeocoderMixin, SimpleTestCase):
+    def test_mapbox_then_nominatim_fallback(self):
+        hit = geocoding.lookup('Marszałkowska 1, Warszawa')
+        self.assertEqual((hit.lon, hit.lat, hit.provider), (21.01, 52.23, 'mapbox'))
+
+        hit = geocoding.lookup('', {'street': 'Floriańska 5', 'city': 'Kraków'})
+        self.assertEqual((hit.provider, hit.confidence), ('nominatim', 0.5))
+        self.assertEqual([p for p, _ in StubGeocoderHandler.requests_seen],
+                         ['/mapbox/Marszałkowska 1, Warszawa.json', '/mapbox/Floriańska 5, Kraków.json', '/nominatim'])
+
+    def test_provider_outage_is_an_error_not_a_miss(self):
+        StubGeocoderHandler.fail = True
+        with self.assertRaises(geocoding.ProviderError):
+            geocoding.lookup('Nowhere 1')
+
+    def test_client_errors_other_than_404_are_errors(self):
+        for status in (401, 403, 429):
+            StubGeocoderHandler.mapbox_status = status
+            with self.assertRaisesRegex(geocoding.ProviderError, f'mapbox: HTTP {status}'):
+                geocoding.mapbox_lookup('Marszałkowska 1, Warszawa', {})
+            # Nominatim 也没找到时不能当成否定结果
+            with self.assertRaises(geocoding.ProviderError):
+                geocoding.lookup('Nowhere 1')
+        # Nominatim 找到了照样返回
+        hit = geocoding.lookup('', {'street': 'Floriańska 5'})
+        self.assertEqual(hit.provider, 'nominatim')
+
+        StubGeocoderHandler.mapbox_status = 404
+        self.assertIsNone(geocoding.lookup('Nowhere 1'))
+
+    def test_normalize_query_folds_case_and_spacing(self):
+        a = geocoding.normalize_query('  Marszałkowska 1,  WARSZAWA ')
+        b = geocoding.normalize_query('marszałkowska 1 warszawa')
+        self.assertEqual(a, b)
+        self.assertEqual(geocoding.normalize_query('', {'street': '12/16 Kopińska', 'city': 'Warszawa'}),
+                         'kopińska 12/16 warszawa')
+
+    def test_token_bucket_throttles(self):
+        bucket = geocoding.TokenBucket(rate=20, capacity=1)
+        t0 = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - t0, 0.14)
+
+
+class GeocodeResultTableTest(StubGeocoderMixin, TestCase):
+    def test_results_are_persisted_and_reused(self):
+        self.assertEqual(geocode_address('Marszałkowska 1, Warszawa'), (21.01, 52.23))
+        self.assertEqual(GeocodeResult.objects.get().provider, 'mapbox')
+        # 缓存清空后仍从表里取，不再访问网络
+        from django.core.cache import cache
+        cache.clear()
+        n = len(StubGeocoderHandler.requests_seen)
+        self.assertEqual(geocode_address('marszałkowska 1,   warszawa'), (21.01, 52.23))
+        self.assertEqual(len(StubGeocoderHandler.requests_seen), n)
+
+    def test_negative_results_are_cached_until_expiry(self):
+        self.assertIsNone(geocode_address('Nowhere 1'))
+        row = GeocodeResult.objects.get()
+        self.assertFalse(row.found)
+        self.assertIsNotNone(row.expires_at)
+        n = len(StubGeocoderHandler.requests_seen)
+        self.assertIsNone(geocode_address('Nowhere 1'))
+        self.assertEqual(len(StubGeocoderHandler.requests_seen), n)
+
+        GeocodeResult.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        from django.core.cache import cache
+        cache.clear()
+        geocode_address('Nowhere 1')
+        self.assertGreater(len(StubGeocoderHandler.requests_seen), n)
+
+    def test_outage_is_not_stored(self):
+        StubGeocoderHandler.fail = True
+        self.assertIsNone(geocode_address('Marszałkowska 1, Warszawa'))
+        self.assertFalse(GeocodeResult.objects.exists())
+
+    def test_batch_dedupes_and_uses_table(self):
+        geocoding.geocode('Marszałkowska 1, Warszawa')
+        StubGeocoderHandler.requests_seen = []
+        results = geocoding.geocode_many([
+            ('Marszałkowska 1, Warszawa', None),
+            ('', {'street': 'Floriańska 5', 'city': 'Kraków'}),
+            ('', {'street': 'floriańska 5', 'city': 'KRAKÓW'}),
+            ('Nowhere 1', None),
+            ('', None),
+        ])
+        self.assertEqual(results[0].coords, (21.01, 52.23))
+        self.assertEqual(results[1].coords, (19.94, 50.06))
+        self.assertEqual(results[1].pk, results[2].pk)
+        self.assertFalse(results[3].found)
+        self.assertIsNone(results[4])
+        # 已入表的不再请求；重复的 Floriańska 只请求一次（mapbox + nominatim）
+        nominatim_calls = [p for p, _ in StubGeocoderHandler.requests_seen if p == '/nominatim']
+        self.assertEqual(len(nominatim_calls), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GeocodeAddressesCommandTest(TestCase):
+    def setUp(self):
+        streets = ['Marszałkowska 1', 'Nowy Świat 2', 'marszałkowska 1', 'Nowhere 3', 'Nowy Świat 2']
+        self.addresses = [Address.objects.create(street=street) for street in streets]
+        fd, self.checkpoint = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.checkpoint)
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+
+    def _fake_lookup(self, address, context=None, session=None):
+        street = (context or {}).get('street', '').casefold()
+        if street.startswith('marszałkowska'):
+            return geocoding.GeocodeHit(21.01, 52.23, 'mapbox', 0.9)
+        if street.startswith('nowy'):
+            return geocoding.GeocodeHit(21.02, 52.235, 'mapbox', 0.9)
+        return None
+
+    def _run(self, *args):
+        out = StringIO()
+        with mock.patch.object(geocoding, 'lookup', side_effect=self._fake_lookup) as lookup:
+            call_command('geocode_addresses', '--workers', '2', '--chunk', '2',
+                         '--checkpoint', self.checkpoint, *args, stdout=out)
+        return lookup, out.getvalue()
+
+    def test_parallel_run_dedupes_and_bulk_updates(self):
+        lookup, out = self._run('--limit', '0')
+        # 3 个不同的规范化查询，各请求一次
+        self.assertEqual(lookup.call_count, 3)
+        for addr in self.addresses:
+            addr.refresh_from_db()
+        self.assertEqual([a.geocode_status for a in self.addresses], ['ok', 'ok', 'ok', 'not_found', 'ok'])
+        self.assertAlmostEqual(float(self.addresses[2].latitude), 52.23)
+        self.assertIsNotNone(self.addresses[1].geom)
+        self.assertIn('addresses/s', out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        self._run('--limit', '2')
+        with open(self.checkpoint) as fh:
+            self.assertEqual(json.load(fh)['last_id'], self.addresses[1].id)
+
+        lookup, out = self._run('--limit', '0')
+        self.assertIn(f'Resuming after address id={self.addresses[1].id}', out)
+        self.assertIn('Processing 3 address rows', out)
+        # 前一次已入表的两个查询不再请求
+        self.assertEqual(lookup.call_count, 1)
+        self.assertFalse(os.path.exists(self.checkpoint))
@@ -0,0 +1,131 @@
+import io
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.pet.models import Pet
+from common import images
+from common.cache import get_versions
+from common.testing import LOCMEM_CACHES
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def _image_bytes(size, mode='RGB', fmt='JPEG'):
+    buf = io.BytesIO()
+    Image.new(mode, size, (200, 100, 50, 128) if mode == 'RGBA' else (200, 100, 50)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_DERIVATIVE_WIDTHS=(200, 400, 800), IMAGE_THUMB_WIDTH=400)
+class ImageDerivativesTest(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=root, base_url='/media/')
+
+    def _save(self, name, data):
+        return self.storage.save(name, ContentFile(data))
+
+    def test_builds_every_width_and_format(self):
+        name = self._save('pets/rex.jpg', _image_bytes((1600, 1200)))
+        self.assertFalse(images.has_derivatives(name, self.storage))
+        self.assertEqual(images.generate(name, self.storage), 3 * len(images.formats()))
+        for width in (200, 400, 800):
+            with self.storage.open(images.derivative_name(name, width, 'webp')) as fh:
+                self.assertEqual(Image.open(fh).size, (width, width * 3 // 4))
+        # 已存在的不再重复生成
+        self.assertEqual(images.generate(name, self.storage), 0)
+
+    def test_small_originals_are_not_upscaled(self):
+        name = self._save('logo.png', _image_bytes((300, 100), mode='RGBA', fmt='PNG'))
+        images.generate(name, self.storage)
+        with self.storage.open(images.derivative_name(name, 800, 'webp')) as fh:
+            image = Image.open(fh)
+            self.assertEqual((image.size, image.mode), ((300, 100), 'RGBA'))
+
+    def test_variants_fall_back_to_original(self):
+        name = self._save('pets/mia.jpg', _image_bytes((900, 900)))
+        file = self.storage.open(name)
+        file.name, file.storage, file.url = name, self.storage, self.storage.url(name)
+        self.assertEqual(images.variants(file), {'thumb': '/media/pets/mia.jpg', 'srcset': {}})
+
+        self.assertTrue(images.ensure(name, self.storage))
+        found = images.variants(file)
+        self.assertEqual(found['thumb'], '/media/pets/mia.jpg.400w.webp')
+        self.assertEqual(found['srcset']['image/webp'].split(', ')[0], '/media/pets/mia.jpg.200w.webp 200w')
+        file.close()
+
+    def test_readiness_is_resolved_once_per_page(self):
+        names = [self._save(f'pets/p{i}.jpg', _image_bytes((300, 300))) for i in range(4)]
+        images.ensure(names[0], self.storage)
+        with mock.patch.object(images, 'cache', wraps=images.cache) as cache:
+            ready = images.preload(names + [names[0], ''], self.storage)
+            self.assertEqual(ready, {names[0]: True, names[1]: False, names[2]: False, names[3]: False})
+            self.assertEqual([c[0] for c in cache.method_calls], ['get_many', 'set_many'])
+
+            context = {'derivatives_ready': ready}
+            for name in names:
+                file = mock.Mock(storage=self.storage, url=self.storage.url(name))
+                file.name = name
+                images.variants(file, context=context)
+                images.variants(file, context=context)
+            self.assertEqual(len(cache.method_calls), 2)  # 之后只查 context
+
+    def test_broken_image_is_logged_not_raised(self):
+        name = self._save('pets/broken.jpg', b'not an image')
+        with self.assertLogs('common.images', 'WARNING'):
+            self.assertFalse(images.ensure(name, self.storage))
+        self.assertEqual(images.build_safely('missing.jpg')[1:2], (0,))
+
+    @override_settings(IMAGE_DERIVATIVE_WORKERS=1)
+    def test_encoding_runs_off_the_request_thread(self):
+        name = self._save('pets/bg.jpg', _image_bytes((800, 600)))
+        release, done = threading.Event(), threading.Event()
+        real_generate = images.generate
+
+        def slow_generate(*args, **kwargs):
+            release.wait(5)
+            try:
+                return real_generate(*args, **kwargs)
+            finally:
+                done.set()
+
+        before = get_versions(Pet)[0]
+        with mock.patch('common.images.generate', side_effect=slow_generate):
+            images._submit(Pet, [(name, self.storage)])  # 提交回调：只排队，立即返回
+            self.assertFalse(done.is_set())
+            release.set()
+            self.assertTrue(done.wait(5))
+            images._executor().submit(lambda: None).result(5)
+        self.assertTrue(images.has_derivatives(name, self.storage))
+        self.assertNotEqual(get_versions(Pet)[0], before)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=LOCMEM_CACHES, IMAGE_DERIVATIVE_WORKERS=0)
+class PetCoverThumbTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_upload_builds_thumbnail_after_commit(self):
+        owner = get_user_model().objects.create_user(username='thumbs', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            pet = Pet.objects.create(name='Rex', species='dog', created_by=owner, status='available',
+                                     cover=SimpleUploadedFile('rex.jpg', _image_bytes((1200, 900))))
+        self.assertTrue(images.has_derivatives(pet.cover.name))
+        resp = APIClient().get(reverse('pet:pet-detail', args=[pet.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data['cover_thumb'].endswith('.400w.webp'))
+        self.assertIn('image/webp', resp.data['cover_srcset'])
@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase, override_settings
+
+from apps.pet import index_advisor
+from apps.pet.models import Pet
+
+
+class IndexAdvisorTest(SimpleTestCase):
+    def test_parse_capture_access_and_plain_lines(self):
+        counts = index_advisor.parse_lines([
+            'INFO pet_filter_query ?sex=male&status=available',
+            '10.0.0.1 - - "GET /pet/?status=AVAILABLE&sex=male&page=3 HTTP/1.1" 200 512',
+            'page=1&search=my%20dog&species=Dog',
+            'GET /user/?status=available',
+            'not a query',
+        ])
+        self.assertEqual(counts, {'sex=male&status=available': 2, 'search=_&species=_': 1})
+
+    def test_capture_samples_anonymised_queries(self):
+        with override_settings(PET_FILTER_SAMPLE_RATE=1), self.assertLogs('apps.pet.filter_usage') as logs:
+            index_advisor.capture({'name': 'Rex', 'vaccinated': 'True', 'page': '2'})
+        self.assertEqual(logs.records[0].getMessage(), 'pet_filter_query ?name=_&vaccinated=true')
+
+    def test_proposals(self):
+        p = index_advisor.propose('sex=male&status=available&vaccinated=true&trained=false')
+        self.assertEqual(p.columns, ['status', 'UPPER(sex)', 'traits', '-pub_date'])
+        self.assertEqual(p.describe(), "(status, UPPER(sex), traits, -pub_date) "
+                                       "WHERE status IN ('available', 'pending')")
+        self.assertIn('F("traits"), F("pub_date").desc(), condition=models.Q(status__in=CATALOGUE_STATUSES)',
+                      p.as_code())
+        self.assertEqual(index_advisor.propose('age_min=6&ordering=name&size=small').columns,
+                         ['UPPER(size)', 'age_years', 'age_months'])
+        self.assertEqual(index_advisor.propose('ordering=-favorites_count&species=_').columns, ['-favorites_count'])
+        # 同一组合的不同取值得到同一个索引
+        self.assertEqual(index_advisor.propose('sex=female').name, index_advisor.propose('sex=male').name)
+
+    def test_default_catalogue_queries_are_indexed(self):
+        for query in index_advisor.DEFAULT_QUERIES:
+            existing = index_advisor.existing_index(index_advisor.propose(query))
+            self.assertIsNotNone(existing, query)
+            self.assertIn(existing, Pet._meta.indexes)
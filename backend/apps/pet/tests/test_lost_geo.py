@@ -0,0 +1,59 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.pet.models import Address, Lost
+from common.testing import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOST_GEO_MAX_FEATURES=5, LOST_GEO_CLUSTER_MAX_ZOOM=10)
+class LostGeoViewSetTest(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='reporter', password='pass')
+        # 华沙附近 4 个点，克拉科夫 3 个点
+        coords = [(52.23, 21.01), (52.231, 21.011), (52.232, 21.012), (52.233, 21.013),
+                  (50.06, 19.94), (50.061, 19.941), (50.062, 19.942)]
+        for i, (lat, lon) in enumerate(coords):
+            address = Address.objects.create(latitude=Decimal(str(lat)), longitude=Decimal(str(lon)))
+            Lost.objects.create(pet_name=f'lost {i}', species='cat', address=address,
+                                lost_time=timezone.now(), reporter=user)
+        Lost.objects.create(pet_name='no address', species='cat', lost_time=timezone.now(), reporter=user)
+        self.client = APIClient()
+        self.url = reverse('pet:lost_geo')
+
+    def _stream(self, params):
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/geo+json')
+        return json.loads(b''.join(resp.streaming_content))
+
+    def test_points_are_capped(self):
+        data = self._stream({})
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(len(data['features']), 5)
+        self.assertTrue(data['truncated'])
+
+    def test_bbox_and_radius(self):
+        data = self._stream({'bbox': '19.5,49.5,20.5,50.5'})
+        self.assertEqual(len(data['features']), 3)
+        self.assertFalse(data['truncated'])
+        lon, lat = data['features'][0]['geometry']['coordinates']
+        self.assertAlmostEqual(lat, 50.06, places=1)
+
+        data = self._stream({'near': '52.23,21.01', 'radius': 2})
+        self.assertEqual(len(data['features']), 4)
+        self.assertEqual(data['features'][0]['properties']['pet_name'], 'lost 0')
+
+    def test_low_zoom_returns_clusters(self):
+        resp = self.client.get(self.url, {'zoom': 5})
+        self.assertEqual(resp.status_code, 200)
+        counts = sorted(f['properties']['count'] for f in resp.data['features'])
+        self.assertEqual(counts, [3, 4])
+        self.assertTrue(all(f['properties']['cluster'] for f in resp.data['features']))
+
+        self.assertEqual(self.client.get(self.url, {'zoom': 'far'}).status_code, 400)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.pet import gazetteer
+from apps.pet.models import Address, City, Country, Lost, Region
+from apps.pet.search import search_lost
+from common.testing import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GAZETTEER_CHECK_INTERVAL=0, LOST_SUGGEST_LIMIT=5)
+class LostSearchTest(TestCase):
+    def setUp(self):
+        gazetteer.reset()
+        self.addCleanup(gazetteer.reset)
+        pl = Country.objects.create(code='PL', name='Poland')
+        self.maz = Region.objects.create(country=pl, name='Mazowieckie')
+        self.waw = City.objects.create(region=self.maz, name='Warszawa')
+        self.radom = City.objects.create(region=self.maz, name='Radom')
+        self.address = Address.objects.create(country=pl, region=self.maz, city=self.waw, street='Nowy Świat 5')
+        user = get_user_model().objects.create_user(username='lost-search', password='pass')
+        self.burek = Lost.objects.create(pet_name='Burek', species='dog', breed='Labrador', color='black',
+                                         address=self.address, lost_time=timezone.now(), reporter=user)
+        self.mia = Lost.objects.create(pet_name='Mia', species='cat', color='ginger', description='Last seen by the bridge',
+                                       lost_time=timezone.now(), reporter=user)
+
+    def _search(self, text):
+        return set(search_lost(Lost.objects.all(), text).values_list('pk', flat=True))
+
+    def test_document_covers_report_and_place_names(self):
+        self.burek.refresh_from_db()
+        self.assertEqual(self.burek.search_places, 'Warszawa Mazowieckie Poland')
+        self.assertEqual(self._search('lab warsz'), {self.burek.pk})
+        self.assertEqual(self._search('BRID'), {self.mia.pk})
+        self.assertEqual(self._search('ging'), {self.mia.pk})
+        self.assertEqual(self._search('burek radom'), set())
+        self.assertEqual(self._search(' !? '), {self.burek.pk, self.mia.pk})
+
+    def test_address_and_place_changes_refresh_the_document(self):
+        self.address.city = self.radom
+        self.address.save()
+        self.assertEqual(self._search('radom'), {self.burek.pk})
+
+        self.radom.name = 'Radom-Miasto'
+        self.radom.save()
+        self.assertEqual(self._search('miasto'), {self.burek.pk})
+
+        self.mia.address = self.address
+        self.mia.save(update_fields=['address'])
+        self.assertEqual(self._search('mazow'), {self.burek.pk, self.mia.pk})
+
+        self.address.delete()
+        self.assertEqual(self._search('mazow'), set())
+
+    def test_list_q_filter(self):
+        resp = APIClient().get(reverse('pet:pet_lost'), {'q': 'warsz'})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual([r['id'] for r in resp.data['results']], [self.burek.pk])
+
+    def test_suggest(self):
+        client = APIClient()
+        url = reverse('pet:pet_lost_suggest')
+        resp = client.get(url, {'q': 'bu'})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data['results'], [{
+            'id': self.burek.pk, 'pet_name': 'Burek', 'species': 'dog', 'breed': 'Labrador', 'color': 'black',
+            'status': 'open', 'places': 'Warszawa Mazowieckie Poland',
+        }])
+        self.assertEqual(client.get(url, {'q': 'b'}).data['results'], [])
+        self.assertEqual(client.get(url, {'q': 'bu', 'limit': 'x'}).status_code, 400)
+
+        # 新报告让缓存的结果失效
+        with self.captureOnCommitCallbacks(execute=True):
+            Lost.objects.create(pet_name='Bubu', species='cat', lost_time=timezone.now(), reporter=self.burek.reporter)
+        self.assertEqual([r['pet_name'] for r in client.get(url, {'q': 'bu'}).data['results']], ['Bubu', 'Burek'])
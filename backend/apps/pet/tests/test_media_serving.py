@@ -0,0 +1,93 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+
+from common.media import parse_range
+from common.storage import ContentAddressedStorage
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_URL='/media/', MEDIA_SERVE=True, MEDIA_SENDFILE_HEADER='',
+                   MEDIA_VERSIONED_URLS=True, MEDIA_IMMUTABLE_MAX_AGE=31536000,
+                   MEDIA_PUBLIC_PREFIXES=('pets/', 'avatars/', 'blog_images/'))
+class MediaServingTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+        self.name = self.storage.save('avatars/mia.png', ContentFile(b'0123456789'))
+        self.addCleanup(self.storage.delete, self.name)
+
+    def get(self, url, **headers):
+        resp = self.client.get(url, headers=headers)
+        body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+        resp.close()
+        return resp, body
+
+    def test_versioned_url_is_immutable(self):
+        url = self.storage.url(self.name)
+        self.assertRegex(url, r'^/media/_v/[0-9a-f]{12}/avatars/mia\.png$')
+        resp, body = self.get(url)
+        self.assertEqual((resp.status_code, body, resp['Content-Type']), (200, b'0123456789', 'image/png'))
+        self.assertEqual(resp['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        # 文件变了：旧地址仍能取到当前内容，但不能再长期缓存
+        os.utime(self.storage.path(self.name), ns=(1, 1))
+        self.assertNotEqual(self.storage.url(self.name), url)
+        self.assertEqual(self.get(url)[0]['Cache-Control'], 'no-cache')
+
+    def test_unversioned_url_revalidates(self):
+        resp, _ = self.get('/media/avatars/mia.png')
+        self.assertEqual(resp['Cache-Control'], 'no-cache')
+        not_modified, body = self.get('/media/avatars/mia.png', if_none_match=resp['ETag'])
+        self.assertEqual((not_modified.status_code, body), (304, b''))
+        self.assertEqual(not_modified['ETag'], resp['ETag'])
+
+    def test_personal_documents_stay_private(self):
+        name = self.storage.save('holiday_family/id_documents/id.png', ContentFile(b'passport scan'))
+        self.addCleanup(self.storage.delete, name)
+        resp, body = self.get(self.storage.url(name))
+        self.assertEqual((resp.status_code, body), (200, b'passport scan'))
+        self.assertEqual(resp['Cache-Control'], 'private, max-age=31536000, immutable')
+        self.assertEqual(self.get(f'/media/{name}')[0]['Cache-Control'], 'private, no-cache')
+
+    def test_ranges(self):
+        url = self.storage.url(self.name)
+        resp, body = self.get(url, range='bytes=2-5')
+        self.assertEqual((resp.status_code, body, resp['Content-Range']), (206, b'2345', 'bytes 2-5/10'))
+        self.assertEqual(resp['Content-Length'], '4')
+        self.assertEqual(self.get(url, range='bytes=-3')[1], b'789')
+        self.assertEqual(self.get(url, range='bytes=20-')[0].status_code, 416)
+        resp, body = self.get(url, range='bytes=2-5', if_range='"stale"')
+        self.assertEqual((resp.status_code, body), (200, b'0123456789'))
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+        self.assertIsNone(parse_range('items=0-1', 10))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=-0', 10)
+
+    def test_blob_store_and_traversal_are_hidden(self):
+        self.assertEqual(self.client.get('/media/.blobs/tmp/x').status_code, 404)
+        blob = self.storage.blob_name(hashlib.sha256(b'0123456789').hexdigest())
+        self.assertTrue(self.storage.exists(blob))
+        for url in (f'/media/./{blob}', f'/media/avatars/%2E%2E/{blob}', f'/media/_v/0/./{blob}'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.post('/media/avatars/mia.png').status_code, 405)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect', MEDIA_SENDFILE_PREFIX='/protected-media/')
+    def test_sendfile_header(self):
+        resp = self.client.get('/media/avatars/mia.png')
+        self.assertEqual(resp['X-Accel-Redirect'], '/protected-media/avatars/mia.png')
+        self.assertEqual(resp.content, b'')
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Value
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.pet.models import Pet
+from common.pagination import KeysetPagination
+from common.testing import LOCMEM_CACHES
+
+
+class CursorTokenTest(SimpleTestCase):
+    def _paginator(self, url='/pet/?cursor='):
+        paginator = KeysetPagination()
+        paginator.request = Request(APIRequestFactory().get(url))
+        paginator.model = Pet
+        paginator.fields = [('pub_date', True), ('id', False)]
+        return paginator
+
+    def test_round_trip_keeps_microseconds(self):
+        paginator = self._paginator('/pet/?page=3&cursor=')
+        stamp = timezone.now().replace(microsecond=123456)
+        link = paginator.encode_cursor(Pet(id=7, pub_date=stamp), backwards=True)
+        self.assertNotIn('page=', link)
+        request = Request(APIRequestFactory().get(link))
+        self.assertEqual(paginator.decode_cursor(request), ([stamp, 7], True))
+
+    def test_after_seeks_on_first_column(self):
+        paginator = self._paginator()
+        where = str(Pet.objects.filter(paginator.after([timezone.now(), 7])).query)
+        self.assertIn('"pub_date" <=', where)
+        self.assertIn('"id" >', where)
+
+    def test_rejects_querysets_ordered_by_a_filter(self):
+        view = type('View', (), {'cursor_ordering': ('-pub_date', 'id')})()
+        request = Request(APIRequestFactory().get('/pet/', {'cursor': ''}))
+        ranked = Pet.objects.annotate(search_rank=Value(1.0), distance=Value(0.0))
+        for qs in (ranked.order_by('-search_rank', '-pub_date'), ranked.order_by('distance'),
+                   Pet.objects.order_by('-favorites__add_date')):
+            with self.assertRaises(ValidationError):
+                KeysetPagination().paginate_queryset(qs, request, view)
+
+    def test_rejects_garbage(self):
+        paginator = self._paginator()
+        for token in ('nope', 'eyJ2IjpbMV19', 'W10'):
+            with self.assertRaises(NotFound):
+                paginator.decode_cursor(Request(APIRequestFactory().get('/pet/', {'cursor': token})))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user(username='pager', password='pass')
+        pets = [Pet.objects.create(name=f'Pet {i}', species='dog', created_by=owner, status='available')
+                for i in range(7)]
+        # 两两同一时间戳，验证 id 打破平局
+        stamp = timezone.now()
+        for i, pet in enumerate(pets):
+            Pet.objects.filter(pk=pet.pk).update(pub_date=stamp - timedelta(minutes=i // 2))
+        cls.expected = list(Pet.objects.order_by('-pub_date', 'id').values_list('name', flat=True))
+
+    def _get(self, url, params=None):
+        resp = APIClient().get(url, params)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def test_walks_every_row_once_in_both_directions(self):
+        page = self._get(reverse('pet:pet-list'), {'cursor': '', 'page_size': 3, 'with_count': 1})
+        self.assertEqual(page['count'], 7)
+        self.assertIsNone(page['previous'])
+        seen, pages = [], []
+        while True:
+            pages.append(page)
+            seen += [r['name'] for r in page['results']]
+            if not page['next']:
+                break
+            page = self._get(page['next'])
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+
+        back = self._get(pages[-1]['previous'])
+        self.assertEqual([r['name'] for r in back['results']], self.expected[3:6])
+        back = self._get(back['previous'])
+        self.assertEqual([r['name'] for r in back['results']], self.expected[:3])
+        self.assertIsNone(back['previous'])
+
+    def test_page_numbers_stay_default(self):
+        page = self._get(reverse('pet:pet-list'), {'page_size': 3})
+        self.assertEqual(page['count'], 7)
+        resp = APIClient().get(reverse('pet:pet-list'), {'cursor': '', 'ordering': 'name'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(APIClient().get(reverse('pet:pet-list'), {'cursor': 'bogus'}).status_code, 404)
+
+    def test_search_order_is_not_replaced(self):
+        resp = APIClient().get(reverse('pet:pet-list'), {'cursor': '', 'q': 'pet'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('cursor', resp.data)
@@ -0,0 +1,50 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+
+from apps.pet.models import Pet, PetFavorite
+from common.cache import get_stats, reset_stats
+from common.testing import LOCMEM_CACHES
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class PetListCacheTest(APITestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.user = get_user_model().objects.create_user(username='owner', password='pass')
+        self.pet = Pet.objects.create(name='Rex', species='dog', created_by=self.user)
+        self.client = APIClient()
+        self.url = reverse('pet:pet-list')
+
+    def test_anonymous_list_is_served_from_cache(self):
+        first = self.client.get(self.url, {'page': 1, 'species': 'dog'})
+        second = self.client.get(self.url, {'species': 'dog', 'page': 1})
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_stats(['pet_list_cache_hit', 'pet_list_cache_miss']),
+                         {'pet_list_cache_hit': 1, 'pet_list_cache_miss': 1})
+
+    def test_writes_invalidate_cached_pages(self):
+        self.assertEqual(self.client.get(self.url).data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pet.objects.create(name='Tom', species='cat', created_by=self.user)
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PetFavorite.objects.create(user=self.user, pet=self.pet)
+        rows = {r['id']: r for r in self.client.get(self.url).data['results']}
+        self.assertEqual(rows[self.pet.id]['favorites_count'], 1)
@@ -0,0 +1,124 @@
+import copy
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+
+from apps.pet.models import Pet, PetPhoto, PetFavorite, Shelter
+from common.testing import LOCMEM_CACHES
+
+MEDIA_ROOT = tempfile.mkdtemp()
+CACHE_DIR = tempfile.mkdtemp()
+# 项目实际的缓存配置（两级缓存），文件缓存目录换成临时目录
+REAL_CACHES = copy.deepcopy(settings.CACHES)
+if REAL_CACHES['shared']['BACKEND'].endswith('FileBasedCache'):
+    REAL_CACHES['shared']['LOCATION'] = CACHE_DIR
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class PetListQueryCountTest(APITestCase):
+    """The public pet list must issue a constant number of queries whatever the page size."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='lister', password='pass')
+        shelter = Shelter.objects.create(name='Query Shelter')
+        for i in range(30):
+            pet = Pet.objects.create(
+                name=f'Pet {i}', species='dog', created_by=self.user,
+                shelter=shelter if i % 2 else None,
+            )
+            for order in range(2):
+                PetPhoto.objects.create(
+                    pet=pet, order=order,
+                    image=SimpleUploadedFile(f'p{i}_{order}.jpg', b'x', content_type='image/jpeg'),
+                )
+            if i % 3 == 0:
+                PetFavorite.objects.create(user=self.user, pet=pet)
+        self.client = APIClient()
+        self.url = reverse('pet:pet-list')
+
+    def _count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url, {'page_size': page_size})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(len(resp.data['results']), page_size)
+        return len(ctx.captured_queries), resp
+
+    def test_anonymous_list_query_count_is_constant(self):
+        small, _ = self._count_queries(5)
+        large, _ = self._count_queries(30)
+        self.assertEqual(small, large)
+        # COUNT(*) + page + photos prefetch
+        self.assertEqual(large, 3)
+
+    def test_authenticated_list_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.user)
+        small, _ = self._count_queries(5)
+        large, resp = self._count_queries(30)
+        self.assertEqual(small, large)
+        # COUNT(*) + page + photos prefetch + favorited ids
+        self.assertEqual(large, 4)
+
+        rows = {row['id']: row for row in resp.data['results']}
+        favorited = set(PetFavorite.objects.filter(user=self.user).values_list('pet_id', flat=True))
+        for pet_id, row in rows.items():
+            self.assertEqual(row['is_favorited'], pet_id in favorited)
+            self.assertEqual(row['favorites_count'], 1 if pet_id in favorited else 0)
+            self.assertEqual(len(row['photos']), 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=REAL_CACHES)
+class PetListRealCacheQueryCountTest(PetListQueryCountTest):
+    """Same limits with the project's two-tier cache, and a constant number of shared-tier round trips."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        self.client.get(self.url, {'page_size': 1})  # 初始化版本号，之后每次请求的读写次数固定
+
+    def _count_queries(self, page_size):
+        shared = type(caches['shared'])
+        calls = []
+        patches = [
+            mock.patch.object(shared, name, autospec=True,
+                              side_effect=lambda *a, _orig=getattr(shared, name), _name=name, **kw:
+                              calls.append(_name) or _orig(*a, **kw))
+            for name in ('get', 'get_many', 'set', 'set_many', 'add', 'incr')
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            queries, resp = super()._count_queries(page_size)
+        finally:
+            for patch in patches:
+                patch.stop()
+        self.round_trips = getattr(self, 'round_trips', []) + [len(calls)]
+        return queries, resp
+
+    def test_anonymous_list_query_count_is_constant(self):
+        super().test_anonymous_list_query_count_is_constant()
+        self.assertEqual(self.round_trips[0], self.round_trips[1])
+
+    def test_authenticated_list_query_count_is_constant(self):
+        super().test_authenticated_list_query_count_is_constant()
+        self.assertEqual(self.round_trips[0], self.round_trips[1])
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.pet.models import Pet
+from apps.pet.search import search_pets
+from common.testing import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PetSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user(username='search', password='pass')
+        cls.by_description = Pet.objects.create(name='Azor', species='dog', breed='Mixed', created_by=owner,
+                                                description='Looks a bit like a labrador')
+        cls.by_breed = Pet.objects.create(name='Burek', species='dog', breed='Labrador', created_by=owner)
+        cls.by_name = Pet.objects.create(name='Labrador Joe', species='dog', breed='Beagle', created_by=owner)
+        cls.other = Pet.objects.create(name='Mruczek', species='cat', breed='Persian', created_by=owner,
+                                       description='Calm and friendly')
+
+    def test_rank_orders_name_over_breed_over_description(self):
+        rows = list(search_pets(Pet.objects.all(), 'labrador'))
+        self.assertEqual([p.pk for p in rows], [self.by_name.pk, self.by_breed.pk, self.by_description.pk])
+        self.assertGreater(rows[0].search_rank, rows[-1].search_rank)
+
+    def test_typo_matches_by_trigram(self):
+        pks = set(search_pets(Pet.objects.all(), 'labrodor').values_list('pk', flat=True))
+        self.assertIn(self.by_breed.pk, pks)
+        self.assertNotIn(self.other.pk, pks)
+
+    def test_websearch_syntax_and_blank_text(self):
+        pks = set(search_pets(Pet.objects.all(), 'friendly -persian').values_list('pk', flat=True))
+        self.assertNotIn(self.other.pk, pks)
+        self.assertEqual(search_pets(Pet.objects.all(), '   ').count(), 4)
+
+    def test_api_q_and_legacy_search_param(self):
+        client = APIClient()
+        url = reverse('pet:pet-list')
+        for param in ('q', 'search'):
+            resp = client.get(url, {param: 'labrador'})
+            self.assertEqual(resp.status_code, 200, resp.data)
+            self.assertEqual([r['id'] for r in resp.data['results']],
+                             [self.by_name.pk, self.by_breed.pk, self.by_description.pk])
+        # 显式 ordering 覆盖相关度排序
+        resp = client.get(url, {'q': 'labrador', 'ordering': 'name'})
+        self.assertEqual([r['name'] for r in resp.data['results']], ['Azor', 'Burek', 'Labrador Joe'])
@@ -0,0 +1,78 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.pet import recommend
+from apps.pet.models import Pet
+from apps.pet.recommend import FeatureMatrix, Preferences
+from common.testing import LOCMEM_CACHES
+from common.traits import mask_of
+
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _row(pk, species='dog', size='small', sex='male', years=1, months=0, traits=0, owner=1):
+    return (pk, species, size, sex, years, months, traits, owner, NOW)
+
+
+class RecommendScoringTest(SimpleTestCase):
+    def setUp(self):
+        self.matrix = FeatureMatrix()
+        self.matrix.replace((), [
+            _row(1, species='cat'),
+            _row(2, species='Dog', traits=mask_of(['vaccinated', 'trained'])),
+            _row(3, traits=mask_of(['vaccinated']), years=9),
+            _row(4, owner=7, traits=mask_of(['vaccinated', 'trained'])),
+        ])
+
+    def _top(self, prefs, **kwargs):
+        return [pk for pk, _ in self.matrix.top(prefs, 10, now=NOW.timestamp(), **kwargs)]
+
+    def test_ranks_by_preferences(self):
+        prefs = Preferences(species='dog', age_max=24, traits=mask_of(['vaccinated', 'trained']))
+        self.assertEqual(self._top(prefs), [4, 2, 3, 1])
+        self.assertEqual(self._top(prefs, exclude_owner=7), [2, 3, 1])
+        # 没有宠物是这个物种：物种项对谁都不加分
+        self.assertEqual(self._top(Preferences(species='axolotl'))[0], 4)
+
+    def test_replace_patches_rows(self):
+        self.matrix.replace([2, 4], [_row(2, species='cat')])
+        self.assertEqual(sorted(self.matrix.ids.tolist()), [1, 2, 3])
+        self.assertEqual(self._top(Preferences(species='cat'))[:2], [2, 1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, RECOMMEND_CHECK_INTERVAL=0)
+class RecommendedEndpointTest(TestCase):
+    def setUp(self):
+        recommend.reset()
+        self.addCleanup(recommend.reset)
+        owner = get_user_model().objects.create_user(username='shelter', password='pass')
+        self.cat = Pet.objects.create(name='Cat', species='cat', created_by=owner, status='available')
+        self.dog = Pet.objects.create(name='Dog', species='dog', created_by=owner, status='available', vaccinated=True)
+        Pet.objects.create(name='Adopted', species='dog', created_by=owner, status='adopted')
+        self.user = get_user_model().objects.create_user(username='adopter', password='pass')
+        self.user.profile.preferred_species = 'dog'
+        self.user.profile.prefer_vaccinated = True
+        self.user.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('pet:pet-recommended')
+
+    def test_recommends_matching_available_pets(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual([r['name'] for r in resp.data['results']], ['Dog', 'Cat'])
+        self.assertGreater(resp.data['results'][0]['match_score'], resp.data['results'][1]['match_score'])
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+    def test_matrix_follows_pet_changes(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dog.status = Pet.Status.ADOPTED
+            self.dog.save()
+            Pet.objects.create(name='Puppy', species='dog', created_by=self.cat.created_by, status='available')
+        resp = self.client.get(self.url)
+        self.assertEqual([r['name'] for r in resp.data['results']], ['Puppy', 'Cat'])
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from apps.pet.filters import TraitMaskFilterBackend
+from apps.pet.models import Pet
+from common import traits
+from common.testing import LOCMEM_CACHES
+
+
+class TraitBitsTest(SimpleTestCase):
+    def test_masks(self):
+        mask = traits.mask_of(['vaccinated', 'trained'])
+        self.assertEqual(traits.names_of(mask), ['vaccinated', 'trained'])
+        pet = Pet(vaccinated=True, trained=True)
+        self.assertEqual(traits.mask_from(pet), mask)
+
+    def test_supersets(self):
+        required = traits.mask_of(traits.TRAITS[:5])
+        forbidden = traits.BITS['needs_attention']
+        values = traits.supersets(required, forbidden)
+        self.assertEqual(len(values), 2 ** (len(traits.TRAITS) - 6))
+        self.assertTrue(all(v & required == required and not v & forbidden for v in values))
+        # 约束太少时枚举太大，退回位运算谓词
+        self.assertIsNone(traits.supersets(traits.BITS['vaccinated']))
+
+    def test_bad_boolean_is_rejected(self):
+        backend = TraitMaskFilterBackend()
+        self.assertEqual(backend._masks({'vaccinated': 'Yes', 'trained': '0', 'dewormed': ''}),
+                         (traits.BITS['vaccinated'], traits.BITS['trained']))
+        with self.assertRaises(ValidationError) as ctx:
+            backend._masks({'vaccinated': 'ture', 'trained': 'maybe'})
+        self.assertEqual(set(ctx.exception.detail), {'vaccinated', 'trained'})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TraitFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username='traits', password='pass')
+
+        def pet(name, **flags):
+            return Pet.objects.create(name=name, species='dog', created_by=cls.owner, status='available', **flags)
+
+        cls.plain = pet('Plain')
+        cls.vaccinated = pet('Vacc', vaccinated=True)
+        cls.both = pet('Both', vaccinated=True, trained=True, dewormed=True)
+        cls.needy = pet('Needy', vaccinated=True, trained=True, needs_attention=True)
+
+    def _names(self, params, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        resp = client.get(reverse('pet:pet-list'), params)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return [r['name'] for r in resp.data['results']]
+
+    def test_generated_column_follows_flags(self):
+        self.assertEqual(Pet.objects.get(pk=self.both.pk).traits, traits.mask_of(['vaccinated', 'trained', 'dewormed']))
+        Pet.objects.filter(pk=self.both.pk).update(dewormed=False)
+        self.assertEqual(Pet.objects.get(pk=self.both.pk).traits, traits.mask_of(['vaccinated', 'trained']))
+
+    def test_trait_filters(self):
+        self.assertEqual(set(self._names({'vaccinated': 'true'})), {'Vacc', 'Both', 'Needy'})
+        self.assertEqual(set(self._names({'vaccinated': 'true', 'trained': 'True', 'needs_attention': 'false'})), {'Both'})
+        # 足够多的约束时走 traits IN (...)
+        params = {name: 'false' for name in traits.TRAITS[6:]}
+        self.assertEqual(set(self._names(params)), {'Plain', 'Vacc', 'Both'})
+
+    def test_match_orders_by_shared_traits(self):
+        self.assertEqual(self._names({'match_traits': 'trained,needs_attention'})[:2], ['Needy', 'Both'])
+        self.assertEqual(APIClient().get(reverse('pet:pet-list'), {'match_traits': 'fluffy'}).status_code, 400)
+        self.assertEqual(APIClient().get(reverse('pet:pet-list'), {'vaccinated': 'ture'}).status_code, 400)
+
+        user = get_user_model().objects.create_user(username='adopter', password='pass')
+        user.profile.prefer_dewormed = True
+        user.profile.prefer_vaccinated = True
+        user.profile.save()
+        self.assertEqual(self._names({'match': 'profile'}, user=user)[:2], ['Both', 'Needy'])
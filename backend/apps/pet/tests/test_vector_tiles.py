@@ -0,0 +1,62 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.pet import tiles
+from apps.pet.models import Address, Lost
+from common.testing import LOCMEM_CACHES
+
+
+class TileRangeTest(SimpleTestCase):
+    def test_valid_tile(self):
+        self.assertTrue(tiles.valid_tile(0, 0, 0))
+        self.assertTrue(tiles.valid_tile(3, 7, 7))
+        self.assertFalse(tiles.valid_tile(3, 8, 0))
+        self.assertFalse(tiles.valid_tile(-1, 0, 0))
+        self.assertFalse(tiles.valid_tile(23, 0, 0))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VectorTileViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tiles', password='pass')
+        address = Address.objects.create(latitude=Decimal('52.23'), longitude=Decimal('21.01'))
+        self.lost = Lost.objects.create(pet_name='tile cat', species='cat', address=address,
+                                        lost_time=timezone.now(), reporter=self.user)
+
+    def _get(self, layer='lost', z=0, x=0, y=0, **headers):
+        url = reverse('pet:vector_tile', kwargs={'layer': layer, 'z': z, 'x': x, 'y': y})
+        return self.client.get(url, **headers)
+
+    def test_tile_is_rendered_cached_and_invalidated(self):
+        with mock.patch.object(tiles, 'render_tile', wraps=tiles.render_tile) as render:
+            first = self._get()
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first['Content-Type'], 'application/vnd.mapbox-vector-tile')
+            self.assertGreater(len(first.content), 0)
+            self.assertIn(b'tile cat', first.content)
+
+            second = self._get(HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(render.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.lost.pet_name = 'renamed cat'
+                self.lost.save()
+            third = self._get(HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(third.status_code, 200)
+            self.assertNotEqual(third['ETag'], first['ETag'])
+            self.assertIn(b'renamed cat', third.content)
+            self.assertEqual(render.call_count, 2)
+
+    def test_empty_tile_and_bad_requests(self):
+        # z=1 的 (0, 1) 是西南象限，华沙不在其中
+        resp = self._get(z=1, x=0, y=1)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b'')
+        self.assertEqual(self._get(layer='nope').status_code, 404)
+        self.assertEqual(self._get(z=1, x=2, y=0).status_code, 404)
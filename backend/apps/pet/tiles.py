@@ -0,0 +1,83 @@
+"""
+Mapbox Vector Tiles for the map screens, encoded by PostGIS (ST_AsMVT).
+
+Each layer reads Address.geom through the model's ``address`` foreign key;
+the GiST index on geom is hit with a ``&&`` against the tile envelope.
+Rendered tiles are cached per (layer, z, x, y) under a key that embeds the
+version counters of the models the layer reads, so any write to those
+models (see apps/pet/signals.py) makes older tiles unreachable.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from common.cache import get_versions
+from .models import Address, Lost, Shelter
+
+MAX_ZOOM = 22
+EXTENT = 4096
+BUFFER = 64
+
+# layer -> 模型、输出到瓦片的属性列、额外条件
+TILE_LAYERS = {
+    "lost": {
+        "model": Lost,
+        "columns": ("id", "status", "species", "pet_name", "sex"),
+        "where": "",
+    },
+    "shelters": {
+        "model": Shelter,
+        "columns": ("id", "name", "is_verified"),
+        "where": "AND t.is_active",
+    },
+}
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _tile_sql(layer: str) -> str:
+    conf = TILE_LAYERS[layer]
+    qn = connection.ops.quote_name
+    columns = ", ".join(f"t.{qn(c)}" for c in conf["columns"])
+    return f"""
+        WITH bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS env),
+        features AS (
+            SELECT ST_AsMVTGeom(ST_Transform(a.geom, 3857), bounds.env, {EXTENT}, {BUFFER}, true) AS mvt_geom,
+                   {columns}
+            FROM {qn(conf["model"]._meta.db_table)} t
+            JOIN {qn(Address._meta.db_table)} a ON a.id = t.address_id
+            CROSS JOIN bounds
+            WHERE a.geom && ST_Transform(bounds.env, 4326) {conf["where"]}
+            LIMIT %s
+        )
+        SELECT ST_AsMVT(features.*, %s, {EXTENT}, 'mvt_geom') FROM features
+    """
+
+
+def render_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    with connection.cursor() as cursor:
+        cursor.execute(_tile_sql(layer), [z, x, y, settings.MAP_TILE_MAX_FEATURES, layer])
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def tile_cache_key(layer: str, z: int, x: int, y: int) -> str:
+    versions = get_versions(TILE_LAYERS[layer]["model"], Address)
+    return f"tile:{layer}:{'.'.join(map(str, versions))}:{z}/{x}/{y}"
+
+
+def tile_etag(key: str) -> str:
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+
+def get_tile(key: str, layer: str, z: int, x: int, y: int) -> bytes:
+    """Return the tile stored under ``key``, rendering and caching it on a miss."""
+    data = cache.get(key)
+    if data is None:
+        data = render_tile(layer, z, x, y)
+        cache.set(key, data, settings.MAP_TILE_CACHE_TIMEOUT)
+    return data
@@ -2,7 +2,7 @@
 from rest_framework.routers import DefaultRouter
 from .views import PetViewSet, AdoptionViewSet, LostViewSet, DonationViewSet, ShelterViewSet, TicketViewSet
 from django.urls import path, include
-from apps.pet.views import LostGeoViewSet, HolidayFamilyViewSet
+from apps.pet.views import LostGeoViewSet, HolidayFamilyViewSet, vector_tile
 
 router = DefaultRouter()
 router.register(r'', PetViewSet, basename='pet')
@@ -21,6 +21,11 @@ urlpatterns = [
 		LostViewSet.as_view({'get': 'list', 'post': 'create'}),
 		name='pet_lost'
 	),
+	path(
+		'lost/suggest/',
+		LostViewSet.as_view({'get': 'suggest'}),
+		name='pet_lost_suggest'
+	),
 	path(
 		'lost/<int:pk>/',
 		LostViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}),
@@ -37,6 +42,23 @@ urlpatterns = [
 		DonationViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}),
 		name='pet_donation_detail'
 	),
+	# Explicit lost_geo routes (otherwise matched by the pet detail route)
+	path(
+		'lost_geo/',
+		LostGeoViewSet.as_view({'get': 'list'}),
+		name='lost_geo'
+	),
+	path(
+		'lost_geo/<int:pk>/',
+		LostGeoViewSet.as_view({'get': 'retrieve'}),
+		name='lost_geo_detail'
+	),
+	# Vector tiles for the map screens
+	path(
+		'tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt',
+		vector_tile,
+		name='vector_tile'
+	),
 	# Explicit shelter routes
 	path(
 		'shelter/',
@@ -1,20 +1,24 @@
 # apps/pet/views.py
 from django.db import transaction
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, decorators, status
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAdminUser, AllowAny, SAFE_METHODS
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
-from .models import Pet, Adoption, Lost, Donation, PetFavorite, Shelter, Ticket, HolidayFamily
+from rest_framework.exceptions import PermissionDenied, APIException, ValidationError
+from .models import Pet, Adoption, Lost, Donation, PetFavorite, PetPhoto, Shelter, Ticket, HolidayFamily, Address, \
+    Country, Region, City, CATALOGUE_STATUSES
 from django.core.exceptions import FieldDoesNotExist
 from .serializers import PetListSerializer, PetCreateUpdateSerializer, AdoptionCreateSerializer, \
     AdoptionDetailSerializer, AdoptionReviewSerializer, LostSerializer, DonationCreateSerializer,\
     DonationDetailSerializer, DonationCreateSerializer, DonationDetailSerializer, \
     ShelterListSerializer, ShelterDetailSerializer, ShelterCreateUpdateSerializer, TicketSerializer
 from .permissions import IsOwnerOrAdmin, IsAdopterOrOwnerOrAdmin
-from .filters import PetFilter, LostFilter
+from .filters import PetFilter, LostFilter, GeoFilterBackend, TraitMaskFilterBackend
+from . import geo, index_advisor, recommend, tiles
+from .search import prefix_query, search_lost
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.parsers import MultiPartParser, FormParser
 from .serializers import LostGeoSerializer, HolidayFamilyApplicationSerializer
@@ -22,10 +26,24 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework import viewsets, permissions
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from apps.holiday_family.models import HolidayFamilyApplication
+from common.cache import get_versions, incr_stat, get_stats
+from common.pagination import KeysetPagination
+import hashlib
+import json
 import logging
 logger = logging.getLogger(__name__)
 
+# 公共宠物列表页缓存依赖的模型：任何一个写入都会让旧页面失效
+PET_LIST_CACHE_MODELS = (Pet, PetPhoto, PetFavorite, Shelter, Adoption, Address)
+# Lost 联想结果依赖的模型（search_places 随地址/地名改名一起更新）
+LOST_SUGGEST_CACHE_MODELS = (Lost, Address, Country, Region, City)
+
 
 class PetViewSet(viewsets.ModelViewSet):
     # Build a safe select_related list based on actual model relations so we don't crash
@@ -39,11 +57,22 @@ class PetViewSet(viewsets.ModelViewSet):
                 _valid_related.append(_f)
         except FieldDoesNotExist:
             pass
-    queryset = Pet.objects.select_related(*_valid_related).order_by("-pub_date")
+    # search_vector 只用于 WHERE/排序，不必随每行取回
+    queryset = Pet.objects.select_related(*_valid_related).defer("search_vector").order_by("-pub_date")
+    # 全文检索走 PetFilter 的 q/search 参数（apps/pet/search.py）
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TraitMaskFilterBackend, GeoFilterBackend]
     filterset_class = PetFilter
-    search_fields = ["name", "species", "breed", "description", "address"]
-    ordering_fields = ["add_date", "pub_date", "age_months", "name"]
+    ordering_fields = ["add_date", "pub_date", "age_months", "name", "favorites_count", "applications_count"]
     permission_classes = [IsAuthenticatedOrReadOnly]
+    # ?cursor= 走键集分页，不 COUNT、不 OFFSET
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-pub_date", "id")
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            qs = PetListSerializer.setup_eager_loading(qs)
+        return qs
 
     @action(detail=True, methods=['post'])
     def mark_lost(self, request, pk=None):
@@ -62,20 +91,62 @@ class PetViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return super().get_permissions()
 
+    def _public_list_cache_key(self, request) -> str:
+        """匿名列表的缓存 key：规范化后的查询串 + 各依赖模型的当前版本号"""
+        params = sorted(
+            (k, tuple(sorted(v for v in request.query_params.getlist(k) if v != "")))
+            for k in request.query_params.keys()
+        )
+        params = [(k, v) for k, v in params if v]
+        raw = f"{request.scheme}://{request.get_host()}|{params!r}"
+        versions = "-".join(str(v) for v in get_versions(*PET_LIST_CACHE_MODELS))
+        return f"petlist:{versions}:{hashlib.md5(raw.encode('utf-8')).hexdigest()}"
+
     # 公共列表：只展示 AVAILABLE/PENDING
     def list(self, request, *args, **kwargs):
+        # 抽样记录过滤参数组合，供 advise_pet_indexes 分析
+        index_advisor.capture(request.query_params)
         try:
-            qs = self.filter_queryset(
-                self.get_queryset().filter(status__in=[Pet.Status.AVAILABLE, Pet.Status.PENDING])
-            )
+            # is_favorited 因人而异，只缓存匿名请求
+            cache_key = None
+            if not request.user.is_authenticated:
+                cache_key = self._public_list_cache_key(request)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    incr_stat("pet_list_cache_hit")
+                    return Response(cached)
+                incr_stat("pet_list_cache_miss")
+
+            qs = self.filter_queryset(self.get_queryset().filter(status__in=CATALOGUE_STATUSES))
             page = self.paginate_queryset(qs)
             ser = PetListSerializer(page, many=True, context={"request": request})
-            return self.get_paginated_response(ser.data)
+            response = self.get_paginated_response(ser.data)
+            if cache_key:
+                cache.set(cache_key, response.data, getattr(settings, "PET_LIST_CACHE_TIMEOUT", 300))
+            return response
+        except APIException:
+            raise  # 参数错误等照常返回 4xx
         except Exception as exc:
             logger.exception('PetViewSet.list encountered error')
             # Return JSON error and avoid unhandled exception bubbling (helps with CORS during dev)
             return Response({"detail": "Internal Server Error", "error": str(exc)}, status=500)
 
+    @decorators.action(detail=False, methods=["get"], url_path="list-cache-stats", permission_classes=[IsAdminUser])
+    def list_cache_stats(self, request):
+        """公共列表缓存的命中/未命中计数（监控用）"""
+        stats = get_stats(["pet_list_cache_hit", "pet_list_cache_miss"])
+        hits, misses = stats["pet_list_cache_hit"], stats["pet_list_cache_miss"]
+        total = hits + misses
+        return Response({
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None,
+            "versions": dict(zip(
+                [m._meta.label_lower for m in PET_LIST_CACHE_MODELS],
+                get_versions(*PET_LIST_CACHE_MODELS),
+            )),
+        })
+
     # 非公开详情限制访问（DRAFT/ARCHIVED 仅作者/管理员可见）
     def retrieve(self, request, *args, **kwargs):
         obj = self.get_object()
@@ -128,25 +199,53 @@ class PetViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk=None):
         pet = self.get_object()
         fav, created = PetFavorite.objects.get_or_create(user=request.user, pet=pet)
-        return Response({"favorited": True, "created": created, "count": pet.favorites.count()})
+        pet.refresh_from_db(fields=["favorites_count"])
+        return Response({"favorited": True, "created": created, "count": pet.favorites_count})
 
     @decorators.action(detail=True, methods=["delete"], permission_classes=[permissions.IsAuthenticated])
     def unfavorite(self, request, pk=None):
         pet = self.get_object()
         PetFavorite.objects.filter(user=request.user, pet=pet).delete()
-        return Response({"favorited": False, "count": pet.favorites.count()})
+        pet.refresh_from_db(fields=["favorites_count"])
+        return Response({"favorited": False, "count": pet.favorites_count})
 
     @decorators.action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def favorites(self, request):
-        qs = Pet.objects.filter(favorites__user=request.user).order_by("-favorites__add_date")
+        qs = PetListSerializer.setup_eager_loading(
+            Pet.objects.filter(favorites__user=request.user)
+        ).order_by("-favorites__add_date")
         page = self.paginate_queryset(qs)
         ser = PetListSerializer(page, many=True, context={"request": request})
         return self.get_paginated_response(ser.data)
 
+    @decorators.action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def recommended(self, request):
+        """
+        GET /pet/recommended/?limit=20 —— 按当前用户 UserProfile 的偏好给 AVAILABLE 宠物打分，
+        返回得分最高的几只（带 match_score）。打分在进程内的 NumPy 特征矩阵上完成（apps/pet/recommend.py）。
+        """
+        try:
+            limit = int(request.query_params.get("limit") or 20)
+        except ValueError:
+            raise ValidationError({"limit": "limit must be an integer"})
+        limit = max(1, min(limit, settings.RECOMMEND_MAX_LIMIT))
+        picks = recommend.recommend(request.user, limit)
+        # 矩阵最多落后几秒：再按状态过滤一次
+        pets = PetListSerializer.setup_eager_loading(
+            Pet.objects.filter(pk__in=[pk for pk, _ in picks], status=Pet.Status.AVAILABLE)
+        ).in_bulk()
+        ranked = [(pets[pk], score) for pk, score in picks if pk in pets]
+        data = PetListSerializer([pet for pet, _ in ranked], many=True, context={"request": request}).data
+        for item, (_, score) in zip(data, ranked):
+            item["match_score"] = round(score, 3)
+        return Response({"count": len(data), "results": data})
+
     @decorators.action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def my_pets(self, request):
         """Get all pets created by current user"""
-        qs = Pet.objects.filter(created_by=request.user).order_by("-add_date")
+        qs = PetListSerializer.setup_eager_loading(
+            Pet.objects.filter(created_by=request.user)
+        ).order_by("-add_date")
         page = self.paginate_queryset(qs)
         ser = PetListSerializer(page, many=True, context={"request": request})
         return self.get_paginated_response(ser.data)
@@ -247,10 +346,12 @@ class LostViewSet(viewsets.ModelViewSet):
     serializer_class = LostSerializer
     # Allow anyone to read, authenticated users and owners to write
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, GeoFilterBackend]
     filterset_class = LostFilter
     ordering_fields = ['created_at', 'lost_time']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-created_at", "id")
 
     # Optional JWT authentication for write operations
     authentication_classes = [JWTAuthentication]
@@ -266,6 +367,32 @@ class LostViewSet(viewsets.ModelViewSet):
         logger.info(f"Lost list request params: {request.query_params.dict()}")
         return super().list(request, *args, **kwargs)
 
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """
+        GET /pet/lost/suggest/?q=lab&limit=10 — typeahead：按词前缀匹配名字/品种/毛色/描述/地名，最新的在前。
+        只查 search_vector 的 GIN 索引，不 join 地址表；结果按版本号缓存。
+        """
+        text = " ".join(request.query_params.get("q", "").split())
+        try:
+            limit = int(request.query_params.get("limit") or settings.LOST_SUGGEST_LIMIT)
+        except ValueError:
+            raise ValidationError({"limit": "limit must be an integer"})
+        limit = max(1, min(limit, settings.LOST_SUGGEST_LIMIT))
+        if len(text) < 2 or prefix_query(text) is None:
+            return Response({"query": text, "results": []})
+
+        versions = "-".join(str(v) for v in get_versions(*LOST_SUGGEST_CACHE_MODELS))
+        digest = hashlib.md5(f"{text.lower()}|{limit}".encode("utf-8")).hexdigest()
+        cache_key = f"suggest:lost:{versions}:{digest}"
+        results = cache.get(cache_key)
+        if results is None:
+            qs = search_lost(Lost.objects.all(), text).order_by("-created_at")
+            results = list(qs.values("id", "pet_name", "species", "breed", "color", "status",
+                                     places=F("search_places"))[:limit])
+            cache.set(cache_key, results, settings.LOST_SUGGEST_CACHE_TIMEOUT)
+        return Response({"query": text, "results": results})
+
     def perform_create(self, serializer):
         # If user is authenticated, set them as reporter, otherwise create anonymous entry
         if self.request.user and self.request.user.is_authenticated:
@@ -315,7 +442,7 @@ class DonationViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
     authentication_classes = [JWTAuthentication]
     parser_classes = [MultiPartParser, FormParser]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TraitMaskFilterBackend, GeoFilterBackend]
     ordering_fields = ['add_date', 'pub_date']
     ordering = ['-pub_date']
 
@@ -356,10 +483,101 @@ class DonationViewSet(viewsets.ModelViewSet):
 
 
 class LostGeoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Lost reports for the map, as GeoJSON.
+
+    ?bbox=min_lon,min_lat,max_lon,max_lat / ?near=lat,lon&radius=km 限定范围（以及 LostFilter 的过滤参数）；
+    ?zoom=z 小于 LOST_GEO_CLUSTER_MAX_ZOOM 时返回网格聚合（每格数量 + 中心点），否则逐点流式输出。
+    两种输出都最多 LOST_GEO_MAX_FEATURES 个 feature，超出时 truncated=true。
+    """
     queryset = Lost.objects.select_related("address", "pet", "reporter").all()
     serializer_class = LostGeoSerializer
-    # bbox_filter_field = "address__location" 
-    # InBBoxFilter removed - using standard filtering
+    filter_backends = [DjangoFilterBackend, GeoFilterBackend]
+    filterset_class = LostFilter
+    pagination_class = None
+    FEATURE_FIELDS = ("id", "status", "pet_name", "species", "breed", "color", "sex", "size", "reporter", "lost_time")
+
+    def _zoom(self, request):
+        zoom = request.query_params.get("zoom")
+        if zoom in (None, ""):
+            return None
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            zoom = -1
+        if not 0 <= zoom <= 22:
+            raise ValidationError({"zoom": "zoom must be an integer between 0 and 22"})
+        return zoom
+
+    def list(self, request, *args, **kwargs):
+        qs = self.filter_queryset(self.get_queryset()).filter(address__geom__isnull=False)
+        limit = settings.LOST_GEO_MAX_FEATURES
+        zoom = self._zoom(request)
+        if zoom is not None and zoom < settings.LOST_GEO_CLUSTER_MAX_ZOOM:
+            return self._clusters(geo.clusters(qs, zoom), zoom, limit)
+        return self._stream_points(qs, limit)
+
+    def _clusters(self, cells, zoom, limit):
+        cells = list(cells[:limit + 1])
+        features = [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [c["center"].x, c["center"].y]},
+            "properties": {
+                "cluster": c["count"] > 1,
+                "count": c["count"],
+                "id": c["first_id"] if c["count"] == 1 else None,
+            },
+        } for c in cells[:limit]]
+        return Response({
+            "type": "FeatureCollection",
+            "features": features,
+            "zoom": zoom,
+            "cell_size": geo.cluster_cell_size(zoom),
+            "truncated": len(cells) > limit,
+            "limit": limit,
+        })
+
+    def _stream_points(self, qs, limit):
+        rows = qs.values(*self.FEATURE_FIELDS, "address__geom")[:limit + 1].iterator(chunk_size=500)
+
+        def generate():
+            yield '{"type":"FeatureCollection","features":['
+            n = 0
+            truncated = False
+            for row in rows:
+                if n >= limit:
+                    truncated = True
+                    break
+                point = row.pop("address__geom")
+                feature = {
+                    "type": "Feature",
+                    "id": row["id"],
+                    "geometry": {"type": "Point", "coordinates": [point.x, point.y]},
+                    "properties": row,
+                }
+                yield ("," if n else "") + json.dumps(feature, cls=DjangoJSONEncoder)
+                n += 1
+            yield f'],"truncated":{json.dumps(truncated)},"limit":{limit}}}'
+
+        return StreamingHttpResponse(generate(), content_type="application/geo+json")
+
+
+@require_GET
+def vector_tile(request, layer, z, x, y):
+    """GET /pet/tiles/<layer>/<z>/<x>/<y>.mvt — Mapbox Vector Tile of lost reports or shelters."""
+    if layer not in tiles.TILE_LAYERS or not tiles.valid_tile(z, x, y):
+        raise Http404("Unknown layer or tile out of range")
+    key = tiles.tile_cache_key(layer, z, x, y)
+    etag = tiles.tile_etag(key)
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        data = tiles.get_tile(key, layer, z, x, y)
+        response = HttpResponse(data, content_type="application/vnd.mapbox-vector-tile")
+    response["ETag"] = etag
+    # CDN 可缓存；数据变化后 ETag 改变，过期后回源校验即可
+    response["Cache-Control"] = f"public, max-age={settings.MAP_TILE_MAX_AGE}"
+    return response
 
 
 class ShelterViewSet(viewsets.ModelViewSet):
@@ -367,7 +585,7 @@ class ShelterViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     authentication_classes = [JWTAuthentication]
     parser_classes = [MultiPartParser, FormParser]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, GeoFilterBackend]
     ordering_fields = ['name', 'created_at', 'capacity', 'current_animals']
     ordering = ['name']
     
@@ -428,6 +646,8 @@ class ShelterViewSet(viewsets.ModelViewSet):
             page = self.paginate_queryset(qs)
             serializer = self.get_serializer(page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
+        except APIException:
+            raise
         except Exception as exc:
             logger.exception('ShelterViewSet.list encountered error')
             return Response({'detail': 'Internal Server Error', 'error': str(exc)}, status=500)
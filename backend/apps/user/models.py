@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.conf import settings
 from django.core.validators import RegexValidator
 
+
 phone_validator = RegexValidator(
     regex=r'^\+?[0-9\- ]{6,20}$',
     message='Phone format incorrect（e.g.：+48 123-456-789 or 13800138000）'
@@ -83,29 +84,15 @@ class ViewStatistics(models.Model):
 
     @classmethod
     def increase(cls, request, obj):
-        uid = request.uid
-        obj_id = obj.id
+        """Count one view per visitor (uid) per object per day; the write is buffered, see view_buffer."""
+        from .view_buffer import record_view
+
         date = timezone.now().date()
-        ct = ContentType.objects.get_for_model(obj.__class__)
-        key = f'{uid}:{date}:{obj_id}'
-
-        if not cache.get(key):
-            cache.set(key, 1, 60 * 60 * 24)
-            try:
-                cls.objects.get(content_type=ct, object_id=obj_id, date=date)
-            except cls.DoesNotExist:
-                cls.objects.create(
-                    content_type=ct,
-                    object_id=obj_id,
-                    count=1,
-                    date=date
-                )
-            else:
-                cls.objects.filter(
-                    content_type=ct,
-                    object_id=obj_id,
-                    date=date
-                ).update(count=models.F('count') + 1)
+        key = f'{request.uid}:{date}:{obj.id}'
+        # add() 是原子的：同一访客当天重复访问不再计数
+        if cache.add(key, 1, 60 * 60 * 24):
+            ct = ContentType.objects.get_for_model(obj.__class__)
+            record_view(ct.id, obj.id, date)
 
     @classmethod
     def get_view_count(cls, obj):
@@ -10,6 +10,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.permissions import AllowAny
 from django.core.cache import cache
+from common.images import ThumbnailField
 from .models import Notification, Friendship, PrivateMessage
 
 User = get_user_model()
@@ -49,6 +50,7 @@ class VerifyEmailCodeSerializer(serializers.Serializer):
 class UserMeSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(source='profile.phone', allow_blank=True, required=False, default='')
     avatar = serializers.ImageField(source='profile.avatar', allow_null=True, required=False)
+    avatar_thumb = ThumbnailField(source='profile.avatar')
     is_holiday_family_certified = serializers.BooleanField(source='profile.is_holiday_family_certified', required=False, default=False)
     preferred_species = serializers.CharField(source='profile.preferred_species', allow_blank=True, required=False, default='')
     preferred_size = serializers.CharField(source='profile.preferred_size', allow_blank=True, required=False, default='')
@@ -77,7 +79,8 @@ class UserMeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ("id", "username", "email", "first_name", "last_name", "phone", "avatar", "is_holiday_family_certified",
+        fields = ("id", "username", "email", "first_name", "last_name", "phone", "avatar", "avatar_thumb",
+                  "is_holiday_family_certified",
                   "preferred_species", "preferred_size", "preferred_age_min", "preferred_age_max",
                   "preferred_gender", "has_experience", "living_situation", "has_yard", 
                   "other_pets", "additional_notes",
@@ -179,12 +182,14 @@ class SendEmailCodeSerializer(serializers.Serializer):
 
 class UserInfoSerializer(serializers.ModelSerializer):
     avatar = serializers.ImageField(source='profile.avatar', allow_null=True, required=False)
+    avatar_thumb = ThumbnailField(source='profile.avatar')
     phone = serializers.CharField(source='profile.phone', allow_blank=True, required=False)
     is_holiday_family_certified = serializers.BooleanField(source='profile.is_holiday_family_certified', required=False, default=False)
     
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'avatar', 'phone', 'first_name', 'last_name', 'is_holiday_family_certified')
+        fields = ('id', 'username', 'email', 'avatar', 'avatar_thumb', 'phone', 'first_name', 'last_name',
+                  'is_holiday_family_certified')
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -342,10 +347,11 @@ from rest_framework import serializers
 class UserListSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(source='profile.phone', allow_blank=True, required=False)
     avatar = serializers.ImageField(source='profile.avatar', allow_null=True, required=False)
+    avatar_thumb = ThumbnailField(source='profile.avatar')
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone', 'avatar')
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone', 'avatar', 'avatar_thumb')
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -378,12 +384,13 @@ class UserDetailSerializer(DynamicFieldsModelSerializer):
     # 把 phone 映射到 profile.phone
     phone = serializers.CharField(source='profile.phone', allow_blank=True, required=False)
     avatar = serializers.ImageField(source='profile.avatar', allow_null=True, required=False)
+    avatar_thumb = ThumbnailField(source='profile.avatar')
     is_holiday_family_certified = serializers.BooleanField(source='profile.is_holiday_family_certified', required=False, default=False)
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name',
-                  'phone', 'avatar', 'is_staff', 'date_joined', 'last_login', 'is_holiday_family_certified')
+                  'phone', 'avatar', 'avatar_thumb', 'is_staff', 'date_joined', 'last_login', 'is_holiday_family_certified')
         extra_kwargs = {
             'username': {'required': False},
             'email': {'required': False},
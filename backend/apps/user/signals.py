@@ -1,10 +1,13 @@
 # apps/user/signals.py
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
-from .models import UserProfile, Friendship, Notification
+from .models import UserProfile, Friendship, Notification, PrivateMessage
 from .avatar_utils import generate_default_avatar
+from common import images
+from common.cache import bump_version
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,12 @@ def create_profile(sender, instance, created, **kwargs):
             profile.avatar.save(f'{instance.username}_avatar.png', default_avatar, save=True)
 
 
+@receiver(post_save, sender=UserProfile)
+def build_avatar_derivatives(sender, instance, **kwargs):
+    # 头像缩略图在提交后生成（common/images.py）
+    images.schedule(instance)
+
+
 @receiver(post_save, sender=Friendship)
 def create_friend_request_notification(sender, instance, created, **kwargs):
     """当创建好友申请时，为接收方生成通知"""
@@ -37,3 +46,12 @@ def create_friend_request_notification(sender, instance, created, **kwargs):
             logger.info(f'Notification created successfully: {notification.id}')
     except Exception as e:
         logger.error(f'Error creating friend request notification: {str(e)}', exc_info=True)
+
+
+# 通知/私信列表 ?with_count=1 的计数缓存（common/pagination.py approximate_count）按版本号失效
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+@receiver(post_save, sender=PrivateMessage)
+@receiver(post_delete, sender=PrivateMessage)
+def bump_inbox_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender))
@@ -1,3 +1,95 @@
-from django.test import TestCase
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from common.pagination import approximate_count
+from common.testing import LOCMEM_CACHES
+from .models import Notification, PrivateMessage, ViewStatistics
+from .view_buffer import ViewCountBuffer
+
+
+class ViewBufferFailureTest(SimpleTestCase):
+    def test_failed_flushes_back_off_and_cap_the_buffer(self):
+        buffer = ViewCountBuffer(flush_interval=0, max_pending=2, max_buffered=3, max_backoff=60)
+        with mock.patch('apps.user.view_buffer.upsert_view_counts', side_effect=OperationalError) as upsert, \
+                self.assertLogs('apps.user.view_buffer', 'ERROR'):
+            buffer.add(1, 1, 'd')
+            buffer.add(1, 2, 'd')  # 到 max_pending，就地 flush 失败
+            self.assertEqual((upsert.call_count, buffer.pending()), (1, 2))
+            # 退避期间不再就地 flush；超出上限的新行被丢弃，已有行照常累加
+            for obj_id in range(2, 6):
+                buffer.add(1, obj_id, 'd', n=2)
+            self.assertEqual((upsert.call_count, buffer.pending(), buffer.dropped), (1, 3, 4))
+            # 显式 flush 仍会尝试，失败后间隔翻倍
+            buffer.flush()
+            self.assertEqual(buffer._failures, 2)
+            self.assertAlmostEqual(buffer._retry_at - time.monotonic(), 2, delta=0.5)
+
+        buffer._retry_at = 0
+        with mock.patch('apps.user.view_buffer.upsert_view_counts', return_value=3) as upsert:
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(sorted(upsert.call_args.args[0]), [(1, 1, 'd', 1), (1, 2, 'd', 3), (1, 3, 'd', 2)])
+        self.assertEqual((buffer._failures, buffer.pending()), (0, 0))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ViewStatisticsBufferTest(TestCase):
+    def setUp(self):
+        self.obj = get_user_model().objects.create_user(username='viewed', password='pass')
+        self.ct = ContentType.objects.get_for_model(self.obj)
+        self.today = timezone.now().date()
+
+    def _count(self):
+        row = ViewStatistics.objects.filter(content_type=self.ct, object_id=self.obj.id, date=self.today).first()
+        return row.count if row else 0
+
+    def test_flush_aggregates_and_upserts(self):
+        buffer = ViewCountBuffer(flush_interval=0, max_pending=1000)
+        for _ in range(3):
+            buffer.add(self.ct.id, self.obj.id, self.today)
+        self.assertEqual(self._count(), 0)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self._count(), 3)
+
+        buffer.add(self.ct.id, self.obj.id, self.today, n=2)
+        buffer.flush()
+        self.assertEqual(self._count(), 5)
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_reaching_max_pending_flushes_without_thread(self):
+        buffer = ViewCountBuffer(flush_interval=0, max_pending=2)
+        buffer.add(self.ct.id, self.obj.id, self.today)
+        buffer.add(self.ct.id, self.obj.id + 1, self.today)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(self._count(), 1)
+
+    @override_settings(VIEW_STATS_BUFFERED=False)
+    def test_increase_counts_each_visitor_once_per_day(self):
+        for uid in ('a', 'a', 'b'):
+            ViewStatistics.increase(SimpleNamespace(uid=uid), self.obj)
+        self.assertEqual(self._count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COUNT_ESTIMATE_THRESHOLD=10 ** 9)
+class InboxCountTest(TestCase):
+    def test_with_count_follows_writes(self):
+        alice = get_user_model().objects.create_user(username='alice', password='pass')
+        bob = get_user_model().objects.create_user(username='bob', password='pass')
+        inbox = Notification.objects.filter(user=alice)
+        messages = PrivateMessage.objects.filter(recipient=alice)
+        self.assertEqual((approximate_count(inbox), approximate_count(messages)), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            note = Notification.objects.create(user=alice, notification_type='system', title='hi')
+            PrivateMessage.objects.create(sender=bob, recipient=alice, content='hello')
+        self.assertEqual((approximate_count(inbox), approximate_count(messages)), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            note.delete()
+        self.assertEqual(approximate_count(inbox), 0)
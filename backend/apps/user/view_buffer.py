@@ -0,0 +1,182 @@
+"""
+Write-behind buffer for ViewStatistics.
+
+Article views are aggregated in process memory as
+(content_type_id, object_id, date) -> increment and written in bulk with one
+``INSERT ... ON CONFLICT ON CONSTRAINT user_views_content_type_idx DO UPDATE``
+statement, instead of a SELECT plus INSERT/UPDATE on every request.
+
+A daemon thread flushes every VIEW_STATS_FLUSH_INTERVAL seconds, and sooner
+once VIEW_STATS_MAX_PENDING distinct rows are waiting. The buffer is also
+flushed at interpreter exit (graceful gunicorn worker shutdown/restart).
+
+Loss bound: if a worker is killed without a graceful exit (SIGKILL, OOM,
+container crash) the views it has not flushed yet are lost, i.e. at most
+VIEW_STATS_FLUSH_INTERVAL seconds of views, and never more than
+VIEW_STATS_MAX_PENDING distinct (article, day) rows, per worker. A failed
+flush puts the increments back into the buffer and retries after a backoff
+that doubles up to VIEW_STATS_MAX_BACKOFF seconds. While the database stays
+down the buffer holds at most VIEW_STATS_MAX_BUFFERED rows; views for rows
+beyond that are dropped and counted in ``dropped``.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH_SIZE = 1000
+
+# 在写入 ViewStatistics 的同一事务内发送，rows 为 (content_type_id, object_id, date, count) 列表；
+# 用来维护各模型上汇总的浏览量（如 Article.total_views）
+views_flushed = Signal()
+
+
+def upsert_view_counts(rows) -> int:
+    """
+    Add ``count`` to each (content_type_id, object_id, date) row, creating the
+    missing ones. ``rows`` is an iterable of 4-tuples; returns rows written.
+    """
+    from .models import ViewStatistics
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    qn = connection.ops.quote_name
+    table = qn(ViewStatistics._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            params = [v for row in batch for v in row]
+            cursor.execute(
+                f'INSERT INTO {table} ({qn("content_type_id")}, {qn("object_id")}, {qn("date")}, {qn("count")}) '
+                f'VALUES {values} '
+                f'ON CONFLICT ON CONSTRAINT {qn("user_views_content_type_idx")} '
+                f'DO UPDATE SET {qn("count")} = {table}.{qn("count")} + EXCLUDED.{qn("count")}',
+                params,
+            )
+        views_flushed.send(sender=ViewStatistics, rows=rows)
+    return len(rows)
+
+
+class ViewCountBuffer:
+    def __init__(self, flush_interval: float, max_pending: int, max_buffered: Optional[int] = None,
+                 max_backoff: float = 300):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered or max_pending * 10
+        self.max_backoff = max_backoff
+        self.dropped = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, content_type_id: int, object_id: int, date, n: int = 1) -> None:
+        with self._lock:
+            self._add_locked((content_type_id, object_id, date), n)
+            size = len(self._pending)
+        self._ensure_thread()
+        if size >= self.max_pending and not self._backing_off():
+            if self._thread is not None:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _add_locked(self, key, n: int) -> None:
+        """Caller holds ``_lock``. A new row past ``max_buffered`` is dropped, not added."""
+        if key in self._pending or len(self._pending) < self.max_buffered:
+            self._pending[key] += n
+        else:
+            self.dropped += n
+
+    def _backing_off(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    def flush(self) -> int:
+        """Write every pending increment to the database; returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                drained, self._pending = self._pending, Counter()
+            if not drained:
+                return 0
+            rows = [(ct_id, obj_id, date, n) for (ct_id, obj_id, date), n in drained.items()]
+            try:
+                written = upsert_view_counts(rows)
+            except Exception:
+                self._failures += 1
+                # 数据库不可用时不要每个 tick、每个请求都去撞：指数退避
+                delay = min(self.max_backoff, max(self.flush_interval, 1) * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + delay
+                with self._lock:
+                    for key, n in drained.items():
+                        self._add_locked(key, n)
+                    dropped = self.dropped
+                logger.exception('Flushing %d view statistics rows failed, retrying in %.0fs '
+                                 '(%d views dropped so far)', len(rows), delay, dropped)
+                return 0
+            self._failures, self._retry_at = 0, 0.0
+            return written
+
+    # ---- background thread ----
+    def _ensure_thread(self) -> None:
+        if self.flush_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='view-stats-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(max(self.flush_interval, self._retry_at - time.monotonic()))
+            self._wakeup.clear()
+            if self._backing_off():
+                continue
+            try:
+                self.flush()
+            finally:
+                # 后台线程有自己的数据库连接，用完就关，避免长期占用
+                connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> ViewCountBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ViewCountBuffer(
+                    flush_interval=getattr(settings, 'VIEW_STATS_FLUSH_INTERVAL', 10),
+                    max_pending=getattr(settings, 'VIEW_STATS_MAX_PENDING', 1000),
+                    max_buffered=getattr(settings, 'VIEW_STATS_MAX_BUFFERED', None),
+                    max_backoff=getattr(settings, 'VIEW_STATS_MAX_BACKOFF', 300),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record_view(content_type_id: int, object_id: int, date) -> None:
+    if getattr(settings, 'VIEW_STATS_BUFFERED', True):
+        get_buffer().add(content_type_id, object_id, date)
+    else:
+        upsert_view_counts([(content_type_id, object_id, date, 1)])
@@ -380,7 +380,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]  # 需要认证
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
-    pagination_class = pagination.PageNumberPagination
+    pagination_class = pagination.KeysetPagination
+    cursor_ordering = ('-created_at', 'id')
     
     def initial(self, request, *args, **kwargs):
         import logging
@@ -785,6 +786,8 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [JWTAuthentication]
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = pagination.KeysetPagination
+    cursor_ordering = ('-created_at', 'id')
     
     def get_queryset(self):
         user = self.request.user
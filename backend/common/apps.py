@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CommonConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'common'
+    verbose_name = 'Common'
+
+    def ready(self):
+        # 导入以注册系统检查
+        from . import checks  # noqa
@@ -0,0 +1,130 @@
+"""
+Cache helpers shared by the apps: per-model version counters for
+invalidation and simple hit/miss counters for monitoring.
+
+Cached entries embed the current version of every model they depend on in
+their key; bumping a model's version after a write makes all older entries
+unreachable, so no explicit key deletion is needed.
+
+Stats counters are kept in process, so counting a request never writes to
+the shared cache. When the shared tier is Redis, each process pushes its
+counts with INCRBY at most every CACHE_STATS_FLUSH_INTERVAL seconds and
+``get_stats`` reports the totals across workers. On other backends it
+reports this process's counts only.
+
+Version bumps are atomic on Redis (INCR) and, with the file cache, under
+TwoTierCache's file lock; the file cache is per host, though, so writes on
+one host don't invalidate another host's pages (see CACHES in settings).
+"""
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Iterable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = 'ver:'
+STATS_KEY_PREFIX = 'stats:'
+
+
+def model_version_key(model) -> str:
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+def _seed() -> int:
+    # 版本 key 被淘汰后从时间戳重新起步，避免回到旧版本号命中过期条目
+    return int(time.time() * 1000)
+
+
+def get_versions(*models) -> tuple:
+    """Return the current version of each model, initialising missing counters."""
+    keys = [model_version_key(m) for m in models]
+    try:
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                cache.add(key, _seed(), timeout=None)
+                found[key] = cache.get(key)
+    except Exception:
+        logger.debug('get_versions failed', exc_info=True)
+        return tuple(_seed() for _ in keys)  # 缓存不可用：每次都视为新版本
+    return tuple(found[k] for k in keys)
+
+
+def bump_version(model) -> None:
+    key = model_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+    except Exception:
+        logger.warning('bump_version failed for %s', key, exc_info=True)
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = defaultdict(int)       # 本进程累计
+_unflushed: Dict[str, int] = defaultdict(int)   # 还没推到 Redis 的增量
+_last_flush = time.monotonic()
+
+
+def _redis_tier():
+    backend = getattr(cache, "shared", cache)  # TwoTierCache 看共享层
+    return backend if isinstance(backend, RedisCache) else None
+
+
+def incr_stat(name: str) -> None:
+    global _last_flush
+    now = time.monotonic()
+    with _stats_lock:
+        _stats[name] += 1
+        _unflushed[name] += 1
+        due = now - _last_flush >= settings.CACHE_STATS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    if due:
+        flush_stats()
+
+
+def flush_stats() -> None:
+    """Push this process's unflushed counts to Redis; other backends only keep them locally."""
+    with _stats_lock:
+        pending = dict(_unflushed)
+        _unflushed.clear()
+    backend = _redis_tier()
+    if backend is None:
+        return
+    for name, delta in pending.items():
+        key = f'{STATS_KEY_PREFIX}{name}'
+        try:
+            try:
+                backend.incr(key, delta)
+            except ValueError:
+                if not backend.add(key, delta, timeout=None):
+                    backend.incr(key, delta)
+        except Exception:
+            logger.debug('flush_stats failed for %s', key, exc_info=True)
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+        _unflushed.clear()
+
+
+def get_stats(names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    backend = _redis_tier()
+    if backend is None:
+        with _stats_lock:
+            return {n: _stats.get(n, 0) for n in names}
+    flush_stats()
+    try:
+        found = backend.get_many([f'{STATS_KEY_PREFIX}{n}' for n in names])
+    except Exception:
+        found = {}
+    return {n: found.get(f'{STATS_KEY_PREFIX}{n}', 0) for n in names}
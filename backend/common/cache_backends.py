@@ -0,0 +1,289 @@
+"""
+Two-tier cache backend: a bounded, sharded in-process LRU in front of a
+shared cache (Redis-compatible server, or the file cache on one host).
+
+Example settings::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "common.cache_backends.TwoTierCache",
+            "TIMEOUT": 300,
+            "OPTIONS": {
+                "SHARED_ALIAS": "shared",      # any other entry in CACHES
+                "LOCAL_MAX_ENTRIES": 10000,
+                "LOCAL_SHARDS": 16,
+                "LOCAL_TIMEOUT": 5,
+                "LOCAL_PREFIXES": ("petlist:", "gc:"),
+                "LOCAL_BYPASS_PREFIXES": ("ver:", "stats:"),
+            },
+        },
+        "shared": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://127.0.0.1:6379/1",
+        },
+    }
+
+Each gunicorn worker has its own local tier, so a write made by one worker
+is only visible to another once the other's local copy expires. The local
+TTL is therefore capped by LOCAL_TIMEOUT (a few seconds). When
+LOCAL_PREFIXES is given only matching keys use the local tier, so one-time
+values (email codes, captchas) are never served from a stale per-worker
+copy; keys that must be read fresh on every call (version counters, stats
+counters) are listed in LOCAL_BYPASS_PREFIXES. incr/decr and delete always
+act on the shared tier. Django's file cache implements incr as get + set,
+so with a FileBasedCache shared tier they run under an exclusive flock on
+a file in its directory: version bumps from concurrent writers on the same
+host are never merged into one.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils.module_loading import import_string
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有 flock，退回 get + set
+    fcntl = None
+
+_MISSING = object()
+
+
+class _LocalShard:
+    """One LRU segment of the in-process tier, guarded by its own lock."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self.data = OrderedDict()  # key -> (expires_at, pickled)
+        self.lock = threading.Lock()
+
+    def get(self, key, now):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, pickled = item
+            if expires_at <= now:
+                del self.data[key]
+                return _MISSING
+            self.data.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, pickled, expires_at):
+        with self.lock:
+            self.data[key] = (expires_at, pickled)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED_ALIAS", "shared")
+        # SHARED_BACKEND 允许直接给出共享层配置（基准测试等不走 settings.CACHES 的场景）
+        self._shared_params = options.get("SHARED_BACKEND")
+        self._shared_cache = None
+        self._local_timeout = float(options.get("LOCAL_TIMEOUT", 5))
+        self._only = tuple(options.get("LOCAL_PREFIXES") or ())
+        self._bypass = tuple(options.get("LOCAL_BYPASS_PREFIXES", ("ver:", "stats:")))
+        n_shards = max(1, int(options.get("LOCAL_SHARDS", 16)))
+        per_shard = int(options.get("LOCAL_MAX_ENTRIES", 10000)) // n_shards
+        self._shards = [_LocalShard(per_shard) for _ in range(n_shards)]
+        self._stats_lock = threading.Lock()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "sets": 0}
+
+    # ---- helpers ----
+    @property
+    def shared(self) -> BaseCache:
+        if self._shared_cache is None:
+            if self._shared_params:
+                p = dict(self._shared_params)
+                backend = import_string(p.pop("BACKEND"))
+                self._shared_cache = backend(p.pop("LOCATION", ""), p)
+            else:
+                self._shared_cache = caches[self._shared_alias]
+        return self._shared_cache
+
+    def _shard(self, local_key) -> _LocalShard:
+        return self._shards[hash(local_key) % len(self._shards)]
+
+    def _local_enabled(self, key) -> bool:
+        if self._local_timeout <= 0:
+            return False
+        key = str(key)
+        if self._only and not key.startswith(self._only):
+            return False
+        return not (self._bypass and key.startswith(self._bypass))
+
+    def _resolve_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_expiry(self, timeout):
+        if timeout is not None and timeout <= 0:
+            return None
+        ttl = self._local_timeout if timeout is None else min(timeout, self._local_timeout)
+        return time.monotonic() + ttl
+
+    def _local_store(self, key, value, timeout, version):
+        if not self._local_enabled(key):
+            return
+        local_key = self.make_and_validate_key(key, version=version)
+        expires_at = self._local_expiry(timeout)
+        if expires_at is None:
+            self._shard(local_key).delete(local_key)
+            return
+        self._shard(local_key).set(local_key, pickle.dumps(value, self.pickle_protocol), expires_at)
+
+    def _local_drop(self, key, version):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._shard(local_key).delete(local_key)
+
+    @contextmanager
+    def _counter_lock(self):
+        shared = self.shared
+        if fcntl is None or not isinstance(shared, FileBasedCache):
+            yield
+            return
+        os.makedirs(shared._dir, exist_ok=True)
+        with open(os.path.join(shared._dir, ".incr.lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    # ---- cache API ----
+    def get(self, key, default=None, version=None):
+        if self._local_enabled(key):
+            local_key = self.make_and_validate_key(key, version=version)
+            value = self._shard(local_key).get(local_key, time.monotonic())
+            if value is not _MISSING:
+                self._count("local_hits")
+                return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("shared_hits")
+        # 共享层不告诉我们剩余 TTL，本地只按 LOCAL_TIMEOUT 缓存
+        self._local_store(key, value, None, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        pending = []
+        now = time.monotonic()
+        for key in keys:
+            if self._local_enabled(key):
+                local_key = self.make_and_validate_key(key, version=version)
+                value = self._shard(local_key).get(local_key, now)
+                if value is not _MISSING:
+                    result[key] = value
+                    continue
+            pending.append(key)
+        self._count("local_hits", len(result))
+        if pending:
+            found = self.shared.get_many(pending, version=version)
+            self._count("shared_hits", len(found))
+            self._count("misses", len(pending) - len(found))
+            for key, value in found.items():
+                self._local_store(key, value, None, version)
+            result.update(found)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._resolve_timeout(timeout)
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._local_store(key, value, timeout, version)
+        self._count("sets")
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._resolve_timeout(timeout)
+        failed = self.shared.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_store(key, value, timeout, version)
+        self._count("sets", len(data))
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._resolve_timeout(timeout)
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._local_store(key, value, timeout, version)
+        else:
+            self._local_drop(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=self._resolve_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_drop(key, version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_drop(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_enabled(key):
+            local_key = self.make_and_validate_key(key, version=version)
+            if self._shard(local_key).get(local_key, time.monotonic()) is not _MISSING:
+                return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # 计数器只以共享层为准
+        self._local_drop(key, version)
+        with self._counter_lock():
+            return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._local_drop(key, version)
+        with self._counter_lock():
+            return self.shared.decr(key, delta, version=version)
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        if self._shared_cache is not None:
+            self._shared_cache.close(**kwargs)
+
+    # ---- monitoring ----
+    def stats(self) -> dict:
+        """Per-process hit/miss counters of both tiers."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["local_entries"] = sum(len(s.data) for s in self._shards)
+        stats["local_hit_rate"] = round(stats["local_hits"] / lookups, 4) if lookups else None
+        stats["hit_rate"] = round((stats["local_hits"] + stats["shared_hits"]) / lookups, 4) if lookups else None
+        return stats
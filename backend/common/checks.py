@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.checks import Tags, Warning, register
+from django.utils.module_loading import import_string
+
+
+@register(Tags.caches)
+def check_shared_cache_tier(app_configs, **kwargs):
+    """
+    The file cache only spans one host: with several web containers each one
+    keeps its own version counters and pages, so a write served by one
+    container doesn't invalidate what the others cache.
+    """
+    shared = settings.CACHES.get(settings.CACHES["default"].get("OPTIONS", {}).get("SHARED_ALIAS", "shared"))
+    if not shared:
+        return []
+    try:
+        backend = import_string(shared["BACKEND"])
+    except ImportError:
+        return []
+    if not issubclass(backend, FileBasedCache):
+        return []
+    return [Warning(
+        "The shared cache tier is a per-host file cache (REDIS_URL is not set).",
+        hint="Set REDIS_URL when more than one web container or host serves the site, otherwise "
+             "cache invalidation does not reach the other containers. On a single host, add "
+             "'common.W001' to SILENCED_SYSTEM_CHECKS.",
+        id="common.W001",
+    )]
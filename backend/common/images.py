@@ -0,0 +1,291 @@
+"""
+Resized WebP/AVIF derivatives of uploaded images.
+
+Every original listed in IMAGE_DERIVATIVE_SOURCES ("app_label.Model.field")
+gets one file per IMAGE_DERIVATIVE_WIDTHS x format, stored next to it as
+``<original>.<width>w.<format>`` (e.g. ``pets/rex.jpg.400w.webp``), so the
+names can be computed without a lookup. Originals narrower than a width are
+not upscaled. AVIF is written only when Pillow can encode it (Pillow 11+ or
+the optional ``pillow-avif-plugin``); WebP is always available.
+
+Derivatives are built when a model is saved with a new image (apps'
+post_save receivers call ``schedule``): after commit the work goes to a
+per-process pool of IMAGE_DERIVATIVE_WORKERS threads, so the response
+doesn't wait for the encodes, and the model's cache version is bumped once
+they're written. Existing media (and anything a killed worker never got to)
+is handled by ``manage.py build_image_derivatives``. Serializers call
+``variants``; until the files exist it falls back to the original URL.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from common.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+# format -> (Pillow 格式名, MIME, 编码参数)
+FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 6}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+}
+
+
+@lru_cache(maxsize=None)
+def _encodable(pil_format: str) -> bool:
+    if pil_format == "AVIF":
+        try:
+            import pillow_avif  # noqa: F401  可选插件，注册 AVIF 编码器
+        except ImportError:
+            pass
+    Image.init()
+    return pil_format in Image.SAVE
+
+
+def formats() -> List[str]:
+    """Configured formats this Pillow build can write, best first."""
+    return [f for f in settings.IMAGE_DERIVATIVE_FORMATS if f in FORMATS and _encodable(FORMATS[f][0])]
+
+
+def widths() -> List[int]:
+    return sorted(settings.IMAGE_DERIVATIVE_WIDTHS)
+
+
+def derivative_name(name: str, width: int, fmt: str) -> str:
+    return f"{name}.{width}w.{fmt}"
+
+
+def derivative_names(name: str) -> List[str]:
+    return [derivative_name(name, w, f) for w in widths() for f in formats()]
+
+
+def _marker(name: str) -> str:
+    # 最后写入的文件（最小宽度、最后一种格式）：它存在说明整套都已生成
+    return derivative_name(name, widths()[0], formats()[-1])
+
+
+def _manifest_key(name: str) -> str:
+    raw = f"{name}|{widths()}|{formats()}"
+    return f"img:{hashlib.md5(raw.encode('utf-8')).hexdigest()}"
+
+
+def mark(name: str, ready: bool) -> None:
+    timeout = None if ready else settings.IMAGE_DERIVATIVE_MISS_TIMEOUT
+    cache.set(_manifest_key(name), int(ready), timeout)
+
+
+def has_derivatives(name: str, storage=None) -> bool:
+    """Whether the full set exists; remembered in the cache so pages don't stat files."""
+    return preload([name], storage)[name]
+
+
+def preload(names, storage=None) -> Dict[str, bool]:
+    """
+    ``has_derivatives`` for many names with one ``get_many``; names the cache
+    doesn't know are checked in storage and written back with ``set_many``.
+    """
+    names = list(dict.fromkeys(n for n in names if n))
+    keys = {name: _manifest_key(name) for name in names}
+    found = cache.get_many(list(keys.values())) if keys else {}
+    ready, new = {}, {True: {}, False: {}}
+    for name, key in keys.items():
+        if key in found:
+            ready[name] = bool(found[key])
+        else:
+            ready[name] = (storage or default_storage).exists(_marker(name))
+            new[ready[name]][key] = int(ready[name])
+    if new[True]:
+        cache.set_many(new[True], None)
+    if new[False]:
+        cache.set_many(new[False], settings.IMAGE_DERIVATIVE_MISS_TIMEOUT)
+    return ready
+
+
+def _ready(file, context=None) -> bool:
+    # 序列化器 context 里的 derivatives_ready：整页预取的结果，也避免同一张图查两次
+    known = context.setdefault("derivatives_ready", {}) if context is not None else {}
+    if file.name not in known:
+        known[file.name] = has_derivatives(file.name, file.storage)
+    return known[file.name]
+
+
+def _open(name: str, storage) -> Image.Image:
+    largest = widths()[-1]
+    with storage.open(name, "rb") as fh:
+        image = Image.open(fh)
+        # JPEG 直接按缩小的比例解码，手机原图不必全尺寸展开
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def generate(name: str, storage=None, force: bool = False) -> int:
+    """Write the missing (all with ``force``) derivatives of ``name``; returns files written."""
+    storage = storage or default_storage
+    fmts = formats()
+    todo = {(w, f) for w in widths() for f in fmts
+            if force or not storage.exists(derivative_name(name, w, f))}
+    if not todo:
+        return 0
+    image = _open(name, storage)
+    written = 0
+    # 从大到小逐级缩放，每一级都从上一级缩小，省掉重复的大图重采样
+    for width in reversed(widths()):
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for fmt in fmts:
+            if (width, fmt) not in todo:
+                continue
+            pil_format, _, options = FORMATS[fmt]
+            buf = io.BytesIO()
+            image.save(buf, format=pil_format, **options)
+            target = derivative_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buf.getvalue()))
+            written += 1
+    return written
+
+
+def ensure(name: str, storage=None) -> bool:
+    """Build the derivatives of ``name`` now; logs and returns False on a broken image."""
+    try:
+        generate(name, storage)
+    except Exception:
+        logger.warning("could not build image derivatives for %s", name, exc_info=True)
+        mark(name, False)
+        return False
+    mark(name, True)
+    return True
+
+
+def share_derivatives(name: str, new_name: str, storage=None) -> None:
+    """Give ``new_name`` the derivatives of ``name`` through common.storage.share (no re-encoding)."""
+    from common.storage import share
+
+    storage = storage or default_storage
+    for width in widths():
+        for fmt in formats():
+            source = derivative_name(name, width, fmt)
+            if storage.exists(source):
+                target = derivative_name(new_name, width, fmt)
+                if storage.exists(target):
+                    storage.delete(target)
+                shared = share(source, target, storage)
+                if shared != target:
+                    return  # 只能共享原文件名：新名字没有派生图，等上传钩子/回填重建
+    mark(new_name, has_derivatives(name, storage))
+
+
+def build_safely(name: str, force: bool = False):
+    """Worker entry point for the backfill pool: (name, files written, error or None)."""
+    try:
+        return name, generate(name, force=force), None
+    except Exception as exc:
+        return name, 0, f"{type(exc).__name__}: {exc}"
+
+
+def source_fields(model) -> List[str]:
+    label = model._meta.label
+    return [source.rsplit(".", 1)[1] for source in settings.IMAGE_DERIVATIVE_SOURCES
+            if source.rsplit(".", 1)[0] == label]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> Optional[ThreadPoolExecutor]:
+    global _pool
+    if settings.IMAGE_DERIVATIVE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                                           thread_name_prefix="image-derivatives")
+    return _pool
+
+
+def _build(model, names) -> None:
+    if any([ensure(name, storage) for name, storage in names]):
+        # 派生图就绪前缓存的列表页里还是原图地址，让它们失效
+        bump_version(model)
+
+
+def _submit(model, names) -> None:
+    pool = _executor()
+    if pool is None:
+        _build(model, names)
+    else:
+        pool.submit(_build, model, names)
+
+
+def schedule(instance) -> None:
+    """After commit, build derivatives for the instance's images that don't have them yet (in the background)."""
+    if not settings.IMAGE_DERIVATIVES_ON_UPLOAD:
+        return
+    names = []
+    for field in source_fields(type(instance)):
+        file = getattr(instance, field, None)
+        if file and file.name and not has_derivatives(file.name, file.storage):
+            names.append((file.name, file.storage))
+    if names:
+        model = type(instance)
+        transaction.on_commit(lambda: _submit(model, names))
+
+
+def variants(file, request=None, context=None) -> Optional[Dict]:
+    """
+    ``{"thumb": url, "srcset": {mime: "url 200w, ..."}}`` for an image field,
+    or None when it's empty. Without derivatives ``thumb`` is the original
+    URL and ``srcset`` is empty. ``context`` is a serializer context whose
+    ``derivatives_ready`` (see ``preload``) is used and filled in.
+    """
+    if not file or not getattr(file, "name", None):
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request else url
+
+    storage = file.storage
+    if not _ready(file, context):
+        return {"thumb": absolute(file.url), "srcset": {}}
+    thumb_width = min((w for w in widths() if w >= settings.IMAGE_THUMB_WIDTH), default=widths()[-1])
+    srcset = {}
+    for fmt in formats():
+        srcset[FORMATS[fmt][1]] = ", ".join(
+            f"{absolute(storage.url(derivative_name(file.name, w, fmt)))} {w}w" for w in widths()
+        )
+    # 缩略图用兼容性最好的格式（列表最后一个，默认 WebP）
+    thumb = absolute(storage.url(derivative_name(file.name, thumb_width, formats()[-1])))
+    return {"thumb": thumb, "srcset": srcset}
+
+
+class ThumbnailField(serializers.ReadOnlyField):
+    """Read-only URL of an image field's thumbnail (the original until derivatives exist)."""
+
+    def to_representation(self, value):
+        found = variants(value, self.context.get("request"), self.context)
+        return found["thumb"] if found else None
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Read-only ``{mime: srcset}`` of an image field, for ``<picture><source>``."""
+
+    def to_representation(self, value):
+        found = variants(value, self.context.get("request"), self.context)
+        return found["srcset"] if found else {}
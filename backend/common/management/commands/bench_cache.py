@@ -0,0 +1,84 @@
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management.base import BaseCommand
+
+from common.cache_backends import TwoTierCache
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the two-tier cache against a plain FileBasedCache and its shared tier alone "
+            "with a skewed read-mostly workload (like the pet list / geocoder).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=20000, help='Operations per backend')
+        parser.add_argument('--keys', type=int, default=2000, help='Distinct keys in the workload')
+        parser.add_argument('--write-ratio', type=float, default=0.05, help='Fraction of operations that are sets')
+        parser.add_argument('--value-size', type=int, default=2048, help='Approximate value size in bytes')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _workload(self, options):
+        rnd = random.Random(options['seed'])
+        n_keys = options['keys']
+        ops = []
+        for _ in range(options['ops']):
+            # 幂律分布：少数热点 key 承担大部分读取
+            idx = min(int(rnd.paretovariate(1.2)) - 1, n_keys - 1)
+            ops.append(('set' if rnd.random() < options['write_ratio'] else 'get', f'petlist:bench:{idx}'))
+        return ops
+
+    def _run(self, cache, ops, value):
+        latencies = []
+        hits = 0
+        for op, key in ops:
+            t0 = time.perf_counter()
+            if op == 'set':
+                cache.set(key, value, 300)
+            else:
+                if cache.get(key) is None:
+                    cache.set(key, value, 300)
+                else:
+                    hits += 1
+            latencies.append(time.perf_counter() - t0)
+        reads = sum(1 for op, _ in ops if op == 'get')
+        total = sum(latencies)
+        latencies.sort()
+        return {
+            'ops_per_sec': len(ops) / total if total else 0,
+            'p50_us': statistics.median(latencies) * 1e6,
+            'p99_us': latencies[int(len(latencies) * 0.99) - 1] * 1e6,
+            'hit_rate': hits / reads if reads else 0,
+        }
+
+    def handle(self, *args, **options):
+        ops = self._workload(options)
+        value = {'results': ['x' * 64] * max(1, options['value_size'] // 64)}
+        tmpdir = tempfile.mkdtemp(prefix='bench_cache_')
+        shared = caches['shared']
+        backends = [
+            ('filebased', FileBasedCache(tmpdir, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': 10000}})),
+            ('shared-only', shared),
+            ('two-tier', TwoTierCache('', {
+                'TIMEOUT': 300,
+                'OPTIONS': {'SHARED_ALIAS': 'shared', 'LOCAL_MAX_ENTRIES': 10000, 'LOCAL_TIMEOUT': 5},
+            })),
+        ]
+        try:
+            for name, cache in backends:
+                cache.delete_many(list({key for _, key in ops}))
+                result = self._run(cache, ops, value)
+                line = (f"{name:<12} {result['ops_per_sec']:>10.0f} ops/s  "
+                        f"p50 {result['p50_us']:>8.1f}us  p99 {result['p99_us']:>8.1f}us  "
+                        f"hit rate {result['hit_rate']:.1%}")
+                if isinstance(cache, TwoTierCache):
+                    stats = cache.stats()
+                    line += f"  (local hit rate {stats['local_hit_rate']:.1%})"
+                self.stdout.write(line)
+                cache.delete_many(list({key for _, key in ops}))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,174 @@
+"""
+Serving MEDIA_ROOT files from Django, cache-friendly.
+
+* ``MEDIA_URL/_v/<fingerprint>/<name>`` (what the media storages' ``url()``
+  returns, common/storage.py): when the fingerprint still matches the file
+  the response is ``public, max-age=MEDIA_IMMUTABLE_MAX_AGE, immutable``.
+  A stale fingerprint still gets the current file, with ``no-cache``.
+* ``MEDIA_URL/<name>``: ``no-cache``, so browsers revalidate every time and
+  an unchanged file costs a 304 (avatars still update at once).
+* Names outside MEDIA_PUBLIC_PREFIXES (ID documents and other personal
+  uploads) get ``private`` instead, so only the browser keeps a copy.
+* ``If-None-Match`` / ``If-Modified-Since`` -> 304, and a single
+  ``Range: bytes=`` (honouring ``If-Range``) -> 206 / 416.
+* The body is the open file. Under gunicorn it goes out through
+  ``wsgi.file_wrapper`` with ``sendfile(2)``, ranges included, and never
+  passes through Python. With MEDIA_SENDFILE_HEADER the front server sends
+  it instead.
+"""
+import mimetypes
+import os
+import stat
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from common.storage import ContentAddressedStorage, fingerprint
+
+# 精简镜像里可能没有 /etc/mime.types
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+class _FileRange:
+    """
+    ``length`` bytes of ``fh`` from ``start`` for FileResponse. ``fileno()``
+    and the file position let gunicorn sendfile(2) exactly the range (it sends
+    Content-Length bytes from the current offset); ``read()`` stops at the end
+    of the range for servers that iterate instead.
+    """
+
+    def __init__(self, fh, start: int, length: int):
+        fh.seek(start)
+        self.fh, self.remaining = fh, length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.fh.fileno()
+
+    def seek(self, *args):
+        # socket.sendfile 会在发送后调整文件位置
+        return self.fh.seek(*args)
+
+    def seekable(self) -> bool:
+        return False  # FileResponse 不要自己去算长度
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    ``(start, end)`` (inclusive) for a single ``bytes=`` range, or None to
+    ignore the header and send the whole file (multiple ranges, bad syntax).
+    Raises ValueError when the range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    first, sep, last = spec.partition("-")
+    if not sep or "," in spec:
+        return None
+    try:
+        if first.strip():
+            start = int(first)
+            end = int(last) if last.strip() else max(start, size - 1)
+            if start < 0 or end < start:
+                return None
+        else:
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            start, end = max(0, size - suffix), size - 1
+            if suffix == 0:
+                start = size  # 不可满足
+    except ValueError:
+        return None
+    if start >= size:
+        raise ValueError(f"range {spec!r} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag: str, mtime: int) -> bool:
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    return parse_http_date_safe(value) == mtime
+
+
+@require_safe
+def serve(request, path: str, version: Optional[str] = None):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        # 按规范化后的路径判断，./.blobs、pets/../.blobs 也要挡住
+        if os.path.relpath(full_path, settings.MEDIA_ROOT).split(os.sep)[0] == ContentAddressedStorage.blob_dir:
+            raise Http404(path)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404(path)
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404(path)
+
+    mtime, current = int(st.st_mtime), fingerprint(st)
+    etag = f'"{current}"'
+    public = path.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES))
+    if version == current:
+        cache_control = f"{'public' if public else 'private'}, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        # 私人文件连重新验证的副本也不能留在共享缓存里
+        cache_control = "no-cache" if public else "private, no-cache"
+    headers = {"ETag": etag, "Last-Modified": http_date(mtime), "Cache-Control": cache_control,
+               "Accept-Ranges": "bytes"}
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is not None:  # 304 / 412
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    if settings.MEDIA_SENDFILE_HEADER:
+        # 前端服务器自己发送文件（Range 也由它处理）
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE_HEADER.lower() == "x-accel-redirect":
+            response[settings.MEDIA_SENDFILE_HEADER] = settings.MEDIA_SENDFILE_PREFIX + quote(path)
+        else:
+            response[settings.MEDIA_SENDFILE_HEADER] = full_path
+    else:
+        try:
+            byte_range = (parse_range(request.headers.get("Range"), st.st_size)
+                          if _if_range_matches(request, etag, mtime) else None)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return response
+        if request.method == "HEAD":
+            response = HttpResponse(content_type=content_type)
+            response["Content-Length"] = st.st_size
+        elif byte_range is None:
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(_FileRange(open(full_path, "rb"), start, end - start + 1),
+                                    status=206, content_type=content_type)
+            response["Content-Length"] = end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    for key, value in headers.items():
+        response[key] = value
+    return response
@@ -0,0 +1,17 @@
+class CounterFieldsMixin:
+    """
+    For models with denormalised counter columns (``COUNTER_FIELDS``) that
+    are only ever changed with ``F()`` updates: a full ``save()`` of an
+    existing row writes every other column, so a stale in-memory copy never
+    puts old counts back.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        # 计数列只通过 F() 更新；整行保存时不要把内存里的旧值写回去
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.generated and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
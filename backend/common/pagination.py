@@ -1,6 +1,201 @@
+"""
+Pagination classes.
+
+``PageNumberPagination`` runs ``COUNT(*)`` plus ``OFFSET`` for every page.
+``KeysetPagination`` keeps that as the default but switches to keyset
+(cursor) mode when the request carries ``?cursor=`` (empty for the first
+page): rows are walked in the view's ``cursor_ordering`` (e.g.
+``("-pub_date", "id")``) with ``WHERE (pub_date, id) after <last row>``, so
+every page costs the same and no count is run. ``&with_count=1`` adds a
+total from ``approximate_count`` for clients that still show one.
+"""
+import base64
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from common.cache import get_versions
+
+logger = logging.getLogger(__name__)
 
 
 class PageNumberPagination(pagination.PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+def _table_estimate(model, using) -> int:
+    """pg_class.reltuples of the model's table; -1 when never analyzed or not PostgreSQL."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return -1
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                       [connection.ops.quote_name(model._meta.db_table)])
+        row = cursor.fetchone()
+    return int(row[0]) if row else -1
+
+
+def approximate_count(queryset) -> int:
+    """
+    Total rows of ``queryset`` without counting on every request.
+
+    An unfiltered queryset on a big table uses the planner's estimate
+    (``pg_class.reltuples``); everything else is an exact ``COUNT(*)`` cached
+    for COUNT_CACHE_TIMEOUT seconds under the model's version counter, so a
+    write through save()/delete() makes the next request recount. That needs
+    a ``bump_version`` receiver for the model (apps/pet/signals.py,
+    apps/user/signals.py); queryset.update() doesn't fire one.
+    """
+    model = queryset.model
+    if not queryset.query.where:
+        try:
+            estimate = _table_estimate(model, queryset.db)
+        except Exception:
+            logger.debug('reltuples lookup failed for %s', model._meta.label, exc_info=True)
+            estimate = -1
+        if estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+            return estimate
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(repr((sql, params)).encode('utf-8')).hexdigest()
+    version = get_versions(model)[0]
+    key = f"count:{model._meta.label_lower}:{version}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page numbers by default; keyset pages with ``?cursor=``.
+
+    The view names its keyset in ``cursor_ordering``; the last entry must be
+    unique (the primary key) and no field may be NULL. Cursor mode always
+    walks that ordering, so it can't be combined with ``?ordering=`` or with
+    a queryset a filter has already ordered some other way (search rank,
+    distance); those get a 400 rather than silently losing their order.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering:
+            raise ValidationError({self.cursor_query_param: 'This list does not support cursor pagination.'})
+        if request.query_params.get('ordering'):
+            raise ValidationError({'ordering': 'ordering cannot be combined with cursor pagination.'})
+        current = [str(expr) for expr in queryset.query.order_by]
+        if current != list(ordering[:len(current)]):
+            # 过滤器已按相关度/距离等排序，换成键集顺序会悄悄打乱结果
+            raise ValidationError({self.cursor_query_param: 'This result order does not support cursor pagination.'})
+
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.total = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true', 'True'):
+            self.total = approximate_count(queryset)
+
+        position, backwards = self.decode_cursor(request)
+        if backwards:
+            order = [name if desc else f"-{name}" for name, desc in self.fields]
+        else:
+            order = [f"-{name}" if desc else name for name, desc in self.fields]
+        qs = queryset.order_by(*order)
+        if position is not None:
+            qs = qs.filter(self.after(position, backwards))
+
+        rows = list(qs[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        self.page_rows = rows
+        return rows
+
+    def after(self, position, backwards=False) -> Q:
+        """Rows strictly after ``position`` in the (possibly reversed) keyset ordering."""
+        def beyond(name, desc):
+            return f"{name}__{'lt' if desc != backwards else 'gt'}"
+
+        (first, first_desc), first_value = self.fields[0], position[0]
+        # 首列用闭区间做范围条件，索引可以直接按首列定位
+        bound = Q(**{beyond(first, first_desc) + 'e': first_value})
+        rest = Q()
+        for i, (name, desc) in enumerate(self.fields):
+            equal = {self.fields[j][0]: position[j] for j in range(i)}
+            rest |= Q(**equal, **{beyond(name, desc): position[i]})
+        return bound & rest
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None, False
+        try:
+            padded = raw + '=' * (-len(raw) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            values, backwards = data['v'], bool(data.get('r'))
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            opts = self.model._meta
+            position = [opts.get_field(name).to_python(value) for (name, _), value in zip(self.fields, values)]
+        except (ValueError, TypeError, KeyError, DjangoValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        return position, backwards
+
+    def encode_cursor(self, row, backwards=False) -> str:
+        values = []
+        for name, _ in self.fields:
+            value = getattr(row, name)
+            # 保留微秒，JSON 编码器会截断到毫秒
+            values.append(value.isoformat() if isinstance(value, (datetime, date)) else value)
+        data = {'v': values}
+        if backwards:
+            data['r'] = 1
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        token = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if getattr(self, 'cursor_mode', False):
+            return self.encode_cursor(self.page_rows[-1]) if self.has_next and self.page_rows else None
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if getattr(self, 'cursor_mode', False):
+            if not self.has_previous or not self.page_rows:
+                return None
+            return self.encode_cursor(self.page_rows[0], backwards=True)
+        return super().get_previous_link()
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'cursor_mode', False):
+            return super().get_paginated_response(data)
+        body = OrderedDict([('next', self.get_next_link()), ('previous', self.get_previous_link())])
+        if self.total is not None:
+            body['count'] = self.total
+        body['results'] = data
+        return Response(body)
@@ -0,0 +1,324 @@
+"""
+Sharing stored media between rows without reading or re-encoding it.
+
+``share(name, target)`` returns the storage name a new row should point at
+for the blob already stored as ``name``. MEDIA_SHARE_MODE picks how:
+
+* ``reference`` (default): the new row stores the same name; no file I/O.
+  Safe because a media file is only removed (``manage.py media_gc
+  --delete-orphans``) when no FileField anywhere references it.
+* ``link``: a hardlink under ``target`` (FileSystemStorage only), so the two
+  names are independent paths to one inode. Falls back to ``reference``
+  across filesystems or on other storage backends.
+* ``copy``: the bytes are streamed to ``target`` in chunks through the
+  storage API (for object stores without server-side linking).
+
+``link`` and ``copy`` touch the disk, so callers run them after commit
+(``share_on_commit``, or ``share_many`` for a thread pool over many files)
+and store ``name`` in the meantime.
+
+``ContentAddressedStorage`` (the default storage) deduplicates on write:
+each distinct content is kept once under ``.blobs/<sha256>`` and every
+saved name is a hardlink to it, so URLs and names work as before while
+identical uploads cost one copy. The blob's link count is its reference
+count; ``manage.py media_gc`` removes blobs nobody links to any more,
+folds pre-existing duplicate files into the blob store and reports the
+savings per media prefix.
+
+Both storages hand out versioned URLs, ``MEDIA_URL/_v/<fingerprint>/<name>``,
+where the fingerprint comes from the file's size and mtime. A changed file
+gets a new URL, so ``common.media.serve`` can mark these responses immutable.
+"""
+import hashlib
+import logging
+import os
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Tuple
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files import File
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+from django.utils.encoding import filepath_to_uri
+
+logger = logging.getLogger(__name__)
+
+MODES = ("reference", "link", "copy")
+VERSION_PREFIX = "_v"
+
+
+def _link(name: str, target: str, storage) -> str:
+    if not isinstance(storage, FileSystemStorage):
+        return name
+    target = storage.get_available_name(target)
+    path = storage.path(target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.link(storage.path(name), path)
+    except OSError as exc:
+        # 跨文件系统（EXDEV）或文件系统不支持硬链接：退回共享同一个文件
+        logger.info("hardlink %s -> %s failed (%s), sharing the original", name, target, exc)
+        return name
+    return target
+
+
+def _copy(name: str, target: str, storage) -> str:
+    with storage.open(name, "rb") as source:
+        return storage.save(target, source)
+
+
+def share(name: str, target: str, storage=None, mode: str = None) -> str:
+    """Name a new row should store for the existing blob ``name`` (see module docstring)."""
+    storage = storage or default_storage
+    mode = mode or settings.MEDIA_SHARE_MODE
+    if mode not in MODES:
+        raise ValueError(f"unknown MEDIA_SHARE_MODE {mode!r}")
+    if mode == "reference" or not name:
+        return name
+    if mode == "link":
+        return _link(name, target, storage)
+    return _copy(name, target, storage)
+
+
+def share_on_commit(model, pk, field: str, name: str, target: str, storage=None, then=None) -> None:
+    """
+    After commit, give ``model(pk).field`` (currently storing ``name``) its own
+    blob under ``target``, then call ``then(name, new_name)``. A no-op in
+    ``reference`` mode.
+    """
+    if settings.MEDIA_SHARE_MODE == "reference" or not name:
+        return
+
+    def run():
+        try:
+            new = share(name, target, storage)
+            if new == name:
+                return
+            # 只改仍指向原文件的行，期间被替换过的图片不受影响
+            model._default_manager.filter(pk=pk, **{field: name}).update(**{field: new})
+            if then:
+                then(name, new)
+        except Exception:
+            logger.warning("could not share %s as %s for %s %s",
+                           name, target, model._meta.label, pk, exc_info=True)
+
+    transaction.on_commit(run)
+
+
+def share_many(tasks, workers: int = 4, then=None) -> int:
+    """
+    ``share`` for many ``(model, pk, field, name, target)`` tasks: the file work
+    (and ``then(name, new_name)``) runs in a thread pool, the rows are then
+    repointed from this thread. Returns the number of rows repointed; call it
+    outside any transaction. A no-op in ``reference`` mode.
+    """
+    tasks = [task for task in tasks if task[3]]
+    if settings.MEDIA_SHARE_MODE == "reference" or not tasks:
+        return 0
+
+    def work(task):
+        model, pk, field, name, target = task
+        try:
+            new = share(name, target)
+            if then and new != name:
+                then(name, new)
+            return new
+        except Exception:
+            logger.warning("could not share %s as %s for %s %s",
+                           name, target, model._meta.label, pk, exc_info=True)
+            return name
+        finally:
+            # then() 可能经缓存访问数据库；每个线程用完关闭自己的连接
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="share") as pool:
+        results = list(pool.map(work, tasks))
+    moved = 0
+    for (model, pk, field, name, _), new in zip(tasks, results):
+        if new != name:
+            moved += model._default_manager.filter(pk=pk, **{field: name}).update(**{field: new})
+    return moved
+
+
+def fingerprint(st: os.stat_result) -> str:
+    """Short version tag for a file's current contents (from its stat, no reads)."""
+    return hashlib.blake2b(f"{st.st_size}:{st.st_mtime_ns}".encode(), digest_size=6).hexdigest()
+
+
+class VersionedMediaStorage(FileSystemStorage):
+    """FileSystemStorage whose URLs carry the file's fingerprint (MEDIA_VERSIONED_URLS)."""
+
+    def url(self, name):
+        if not name or not settings.MEDIA_VERSIONED_URLS:
+            return super().url(name)
+        try:
+            st = os.stat(self.path(name))
+        except (OSError, SuspiciousFileOperation):
+            return super().url(name)  # 文件不存在：仍给出原地址，由 serve 返回 404
+        return urljoin(self.base_url, f"{VERSION_PREFIX}/{fingerprint(st)}/{filepath_to_uri(name).lstrip('/')}")
+
+
+class ContentAddressedStorage(VersionedMediaStorage):
+    """
+    FileSystemStorage that stores identical bytes once (see module docstring).
+    Falls back to a plain write where hardlinks aren't supported.
+    """
+    blob_dir = ".blobs"
+    chunk_size = 1024 * 1024
+
+    def blob_name(self, digest: str) -> str:
+        return f"{self.blob_dir}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def _makedirs(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _spool(self, content) -> Tuple[str, str]:
+        """Write ``content`` to a temporary file inside the store; returns (sha256, path)."""
+        tmp = self.path(f"{self.blob_dir}/tmp/{uuid.uuid4().hex}")
+        self._makedirs(tmp)
+        digest = hashlib.sha256()
+        with open(tmp, "wb") as out:
+            for chunk in content.chunks(self.chunk_size):
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                digest.update(chunk)
+                out.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(tmp, self.file_permissions_mode)
+        return digest.hexdigest(), tmp
+
+    def _link_name(self, source: str, name: str) -> str:
+        """Hardlink ``source`` as ``name`` (or the next available name); returns the name used."""
+        full_path = self.path(name)
+        self._makedirs(full_path)
+        while True:
+            try:
+                os.link(source, full_path)
+                return name
+            except FileExistsError:
+                name = self.get_available_name(name)
+                full_path = self.path(name)
+
+    def _save(self, name, content):
+        digest, tmp = self._spool(content)
+        blob = self.path(self.blob_name(digest))
+        try:
+            self._makedirs(blob)
+            try:
+                os.link(tmp, blob)
+                source = tmp
+            except FileExistsError:
+                source = blob  # 同样的内容已经存过
+            try:
+                name = self._link_name(source, name)
+            except FileNotFoundError:
+                # media_gc 恰好删掉了这个 blob：用刚写的临时文件重新发布
+                name = self._link_name(tmp, name)
+                try:
+                    os.link(tmp, blob)
+                except FileExistsError:
+                    pass
+        except OSError as exc:
+            if isinstance(exc, FileNotFoundError):
+                raise
+            # 文件系统不支持硬链接：按普通文件写入
+            logger.info("hardlinks unavailable in %s (%s), storing %s without dedup", self.location, exc, name)
+            with open(tmp, "rb") as fh:
+                return super()._save(name, File(fh))
+        finally:
+            os.unlink(tmp)
+        self._ensure_location_group_id(self.path(name))
+        return str(name).replace("\\", "/")
+
+    def refcount(self, name: str) -> int:
+        """How many stored names share ``name``'s bytes (the blob's own link isn't counted)."""
+        path = self.path(name)
+        blob = self.path(self.blob_name(file_digest(path, self.chunk_size)))
+        in_store = os.path.exists(blob) and os.path.samefile(blob, path)
+        return os.stat(path).st_nlink - int(in_store)
+
+    def walk(self, include_blobs: bool = False) -> Iterator[Tuple[str, os.stat_result]]:
+        """Every stored name (forward slashes) with its stat, skipping the blob store unless asked."""
+        root = str(self.location)
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root)
+            if rel_dir == ".":
+                rel_dir = ""
+                if not include_blobs and self.blob_dir in dirnames:
+                    dirnames.remove(self.blob_dir)
+            for filename in filenames:
+                name = f"{rel_dir}/{filename}" if rel_dir else filename
+                yield name.replace("\\", "/"), os.lstat(os.path.join(dirpath, filename))
+
+    def collect_garbage(self, dry_run: bool = False) -> Tuple[int, int]:
+        """Delete blobs that no stored name links to any more; returns (blobs, bytes) freed."""
+        count = size = 0
+        blob_root = self.path(self.blob_dir)
+        for dirpath, dirnames, filenames in os.walk(blob_root):
+            if os.path.relpath(dirpath, blob_root).split(os.sep)[0] == "tmp":
+                continue  # 正在写入的临时文件
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                st = os.lstat(path)
+                if st.st_nlink == 1:
+                    count += 1
+                    size += st.st_size
+                    if not dry_run:
+                        os.unlink(path)
+        return count, size
+
+    def adopt(self, name: str) -> bool:
+        """
+        Move an existing plain file into the blob store; if the same bytes are
+        already there the file is replaced by a hardlink to them. Returns True
+        when the file now shares storage with another name.
+        """
+        path = self.path(name)
+        digest = file_digest(path, self.chunk_size)
+        blob = self.path(self.blob_name(digest))
+        self._makedirs(blob)
+        try:
+            os.link(path, blob)
+            return False
+        except FileExistsError:
+            pass
+        if os.path.samefile(path, blob):
+            return False
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.link(blob, tmp)
+        os.replace(tmp, path)  # 原子替换：读者看到的要么是旧文件要么是链接
+        return True
+
+    def usage(self, prefix_depth: int = 1) -> Dict[str, Dict[str, int]]:
+        """
+        Per top-level prefix: files, logical bytes (sum of file sizes) and
+        physical bytes (each inode counted once within the prefix), plus a
+        "total" row where each inode is counted once overall.
+        """
+        seen = set()
+        report = defaultdict(lambda: {"files": 0, "logical": 0, "physical": 0, "inodes": set()})
+        total = {"files": 0, "logical": 0, "physical": 0}
+        for name, st in sorted(self.walk()):
+            prefix = "/".join(name.split("/")[:prefix_depth]) + "/" if "/" in name else "(root)"
+            inode = (st.st_dev, st.st_ino)
+            for row, inodes in ((report[prefix], report[prefix]["inodes"]), (total, seen)):
+                row["files"] += 1
+                row["logical"] += st.st_size
+                if inode not in inodes:
+                    inodes.add(inode)
+                    row["physical"] += st.st_size
+        report = {prefix: {k: v for k, v in row.items() if k != "inodes"} for prefix, row in report.items()}
+        report["total"] = total
+        return report
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
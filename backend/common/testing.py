@@ -0,0 +1,4 @@
+"""Shared test settings."""
+
+# 测试用进程内缓存，替换 settings 里的两级缓存（@override_settings(CACHES=LOCMEM_CACHES)）
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -0,0 +1,66 @@
+"""
+Packed pet-trait bitmask shared by Pet, Donation and UserProfile.
+
+Each boolean trait owns one bit of an integer ``traits`` column (a stored
+generated column, so it stays in sync with the boolean columns whatever
+path writes them). Bit positions are part of the stored data: append new
+traits at the end, never reorder.
+
+"Has all of A and none of B" is ``traits & (A|B) = A``. With few traits
+left free the matching values are enumerated (``supersets``) so the
+predicate becomes ``traits IN (...)`` and can use a B-tree on ``traits``;
+"how many of my preferred traits" is ``bit_count(traits & preferred)``.
+"""
+from typing import Iterable, List, Optional
+
+from django.db.models import F, Func, IntegerField, Value
+from django.db.models.functions import Cast
+
+TRAITS = (
+    "dewormed", "vaccinated", "microchipped", "sterilized", "child_friendly", "trained",
+    "loves_play", "loves_walks", "good_with_dogs", "good_with_cats", "affectionate", "needs_attention",
+)
+BITS = {name: 1 << i for i, name in enumerate(TRAITS)}
+ALL_TRAITS = (1 << len(TRAITS)) - 1
+# IN 列表最多枚举这么多个取值，再多就用位运算谓词
+MAX_ENUMERATED = 256
+
+
+def mask_of(names: Iterable[str]) -> int:
+    return sum(BITS[name] for name in set(names))
+
+
+def names_of(mask: int) -> List[str]:
+    return [name for name in TRAITS if mask & BITS[name]]
+
+
+def mask_from(obj, prefix: str = "") -> int:
+    """Bitmask of an object's boolean ``<prefix><trait>`` attributes (missing ones count as False)."""
+    return sum(bit for name, bit in BITS.items() if getattr(obj, f"{prefix}{name}", False))
+
+
+def mask_expression(prefix: str = ""):
+    """SQL expression packing the boolean ``<prefix><trait>`` columns into one integer."""
+    terms = [Cast(F(f"{prefix}{name}"), IntegerField()) * Value(bit) for name, bit in BITS.items()]
+    expression = terms[0]
+    for term in terms[1:]:
+        expression = expression + term
+    return expression
+
+
+def supersets(required: int, forbidden: int = 0) -> Optional[List[int]]:
+    """Every mask with all ``required`` and no ``forbidden`` bits, or None when there are too many."""
+    free = [bit for bit in BITS.values() if not bit & (required | forbidden)]
+    if 1 << len(free) > MAX_ENUMERATED:
+        return None
+    values = [required]
+    for bit in free:
+        values += [v | bit for v in values]
+    return sorted(values)
+
+
+class TraitOverlap(Func):
+    """Number of traits two masks share: bit_count(a & b) (PostgreSQL 14+)."""
+    template = "bit_count(CAST((%(expressions)s) AS bit(32)))"
+    arg_joiner = " & "
+    output_field = IntegerField()
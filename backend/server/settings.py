@@ -34,12 +34,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.gis',
+    'django.contrib.postgres',
     'rest_framework',
     'apps.blog',
     'apps.user',
     'apps.comment',
     'apps.pet',
     'apps.holiday_family',
+    'common',
     'rest_framework_simplejwt',
     'django_filters',
     'corsheaders',
@@ -109,7 +112,7 @@ WSGI_APPLICATION = 'server.wsgi.application'
 # MIGRATED TO POSTGRESQL (强制使用 PostgreSQL)
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "django.contrib.gis.db.backends.postgis",
         "NAME": os.environ.get("POSTGRES_DB", "straypet"),
         "USER": os.environ.get("POSTGRES_USER", "sp_user"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "sp_pass"),
@@ -118,13 +121,45 @@ DATABASES = {
     }
 }
 
-CACHES = {
-    "default": {
+# GeoDjango 默认按系统路径查找 GDAL/GEOS；非标准安装时可用环境变量指定
+if os.getenv("GDAL_LIBRARY_PATH"):
+    GDAL_LIBRARY_PATH = os.getenv("GDAL_LIBRARY_PATH")
+if os.getenv("GEOS_LIBRARY_PATH"):
+    GEOS_LIBRARY_PATH = os.getenv("GEOS_LIBRARY_PATH")
+
+# 两级缓存：进程内 LRU（短 TTL）+ 共享层。有 REDIS_URL 用 Redis，否则同原来一样用文件缓存
+# （同一台机器上的 worker 共享）；热路径上的版本号、列表页写入不会落到 Postgres。
+# 文件缓存只在一台主机内共享：起多个 web 容器/主机时必须设 REDIS_URL，否则各容器的版本号
+# 和缓存页互不相干，一个容器里的写入不会让其他容器的缓存失效（系统检查 common.W001 会提醒）
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "TIMEOUT": 300,
+    }
+else:
+    SHARED_CACHE = {
         "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": BASE_DIR / "django_cache",   # 确保这个目录存在/可写
-        "TIMEOUT": 300,                          # 可选：默认 300s
-        "OPTIONS": {"MAX_ENTRIES": 10000},       # 可选
+        "LOCATION": BASE_DIR / "django_cache",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
     }
+
+CACHES = {
+    "default": {
+        "BACKEND": "common.cache_backends.TwoTierCache",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "SHARED_ALIAS": "shared",
+            "LOCAL_MAX_ENTRIES": int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", 10000)),
+            "LOCAL_TIMEOUT": int(os.getenv("CACHE_LOCAL_TIMEOUT", 5)),
+            # 只有读多写少、可容忍几秒陈旧的 key 走本地层（列表页、地理编码）
+            "LOCAL_PREFIXES": ("petlist:", "gc:", "tile:", "suggest:", "img:"),
+            "LOCAL_BYPASS_PREFIXES": ("ver:", "stats:"),
+        },
+    },
+    "shared": SHARED_CACHE,
 }
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -164,6 +199,32 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are deduplicated by content (common/storage.py ContentAddressedStorage): identical
+# bytes are stored once under MEDIA_ROOT/.blobs and hardlinked to each name. `manage.py media_gc`
+# reports savings and drops unreferenced blobs. MEDIA_DEDUP=0 switches back to plain files.
+STORAGES = {
+    "default": {
+        "BACKEND": ("common.storage.ContentAddressedStorage" if os.getenv("MEDIA_DEDUP", "1") == "1"
+                    else "common.storage.VersionedMediaStorage"),
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Media serving (common/media.py). URLs carry a size/mtime fingerprint (MEDIA_URL/_v/<fp>/<name>),
+# so they are served `immutable` for MEDIA_IMMUTABLE_MAX_AGE; unversioned URLs revalidate with
+# ETag / Last-Modified. Single byte ranges are supported. MEDIA_SERVE also serves /media/ with
+# DEBUG off: files go out through the WSGI server's sendfile (gunicorn), or with
+# MEDIA_SENDFILE_HEADER=X-Accel-Redirect (nginx, internal location MEDIA_SENDFILE_PREFIX) or
+# X-Sendfile (Apache/lighttpd, absolute path) the front server sends them.
+MEDIA_SERVE = os.getenv("MEDIA_SERVE", "1") == "1"
+MEDIA_VERSIONED_URLS = os.getenv("MEDIA_VERSIONED_URLS", "1") == "1"
+MEDIA_IMMUTABLE_MAX_AGE = int(os.getenv("MEDIA_IMMUTABLE_MAX_AGE", 31536000))
+# Only files under these prefixes may be stored by shared caches/CDNs (`public`); everything
+# else (ID documents, donation and holiday-family photos, ...) is sent `private`.
+MEDIA_PUBLIC_PREFIXES = ("pets/", "avatars/", "blog_images/", "lost/", "shelters/")
+MEDIA_SENDFILE_HEADER = os.getenv("MEDIA_SENDFILE_HEADER", "")
+MEDIA_SENDFILE_PREFIX = os.getenv("MEDIA_SENDFILE_PREFIX", "/protected-media/")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -193,3 +254,132 @@ SIMPLE_JWT = {
 
 # Mapbox token (optional) for server-side geocoding
 MAPBOX_TOKEN = os.getenv("MAPBOX_TOKEN", None)
+
+# Geocoder (apps/pet/geocoding.py): provider endpoints, per-request timeout, per-provider
+# request rate (requests/second; Nominatim's usage policy allows 1/s), and how long a
+# "not found" result is trusted before the address is retried.
+GEOCODER_MAPBOX_URL = os.getenv("GEOCODER_MAPBOX_URL", "https://api.mapbox.com/geocoding/v5/mapbox.places")
+GEOCODER_NOMINATIM_URL = os.getenv("GEOCODER_NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", 6))
+GEOCODER_RATE_LIMITS = {
+    "mapbox": float(os.getenv("GEOCODER_MAPBOX_RATE", 10)),
+    "nominatim": float(os.getenv("GEOCODER_NOMINATIM_RATE", 1)),
+}
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", 7 * 24 * 3600))
+# Max concurrent in-flight requests per provider within one process.
+GEOCODER_CONCURRENCY = {
+    "mapbox": int(os.getenv("GEOCODER_MAPBOX_CONCURRENCY", 4)),
+    "nominatim": int(os.getenv("GEOCODER_NOMINATIM_CONCURRENCY", 1)),
+}
+
+# Country/Region/City name index kept in each process (apps/pet/gazetteer.py): seconds
+# between checks of its version stamp in the shared cache.
+GAZETTEER_CHECK_INTERVAL = float(os.getenv("GAZETTEER_CHECK_INTERVAL", 5))
+
+# Pet recommendations (apps/pet/recommend.py): each process keeps a NumPy feature matrix of
+# AVAILABLE pets. Seconds between version checks, the pub_date overlap re-read on incremental
+# syncs (covers transactions that commit late), the age after which the matrix is rebuilt
+# from scratch, and the largest ?limit= of /pet/recommended/.
+RECOMMEND_CHECK_INTERVAL = float(os.getenv("RECOMMEND_CHECK_INTERVAL", 5))
+RECOMMEND_SYNC_OVERLAP = int(os.getenv("RECOMMEND_SYNC_OVERLAP", 60))
+RECOMMEND_FULL_REBUILD = int(os.getenv("RECOMMEND_FULL_REBUILD", 600))
+RECOMMEND_MAX_LIMIT = int(os.getenv("RECOMMEND_MAX_LIMIT", 50))
+
+# Geocoding job queue (apps/pet/geocode_jobs.py, `manage.py geocode_worker`). Addresses
+# saved without coordinates are queued instead of geocoded inside the request. Failed
+# attempts are retried with exponential backoff (BASE * 2**attempt, capped at MAX seconds);
+# RUNNING jobs whose worker went silent for LOCK_TIMEOUT seconds are picked up again.
+# GEOCODE_ASYNC=false runs the job inline in the request (old behaviour).
+GEOCODE_ASYNC = os.getenv("GEOCODE_ASYNC", "true").lower() in ("1", "true", "yes")
+GEOCODE_JOB_MAX_ATTEMPTS = int(os.getenv("GEOCODE_JOB_MAX_ATTEMPTS", 6))
+GEOCODE_JOB_BACKOFF_BASE = int(os.getenv("GEOCODE_JOB_BACKOFF_BASE", 30))
+GEOCODE_JOB_BACKOFF_MAX = int(os.getenv("GEOCODE_JOB_BACKOFF_MAX", 6 * 3600))
+GEOCODE_JOB_LOCK_TIMEOUT = int(os.getenv("GEOCODE_JOB_LOCK_TIMEOUT", 300))
+
+# Image derivatives (common/images.py): resized WebP/AVIF copies stored next to each original
+# of these fields, built after upload and by `manage.py build_image_derivatives`. The
+# *_thumb serializer fields use the smallest width >= IMAGE_THUMB_WIDTH (2x a 200px card).
+IMAGE_DERIVATIVE_SOURCES = (
+    "pet.Pet.cover", "pet.PetPhoto.image", "pet.DonationPhoto.image", "pet.Lost.photo",
+    "pet.Shelter.logo", "pet.Shelter.cover_image", "user.UserProfile.avatar",
+)
+IMAGE_DERIVATIVE_WIDTHS = (200, 400, 800)
+IMAGE_DERIVATIVE_FORMATS = ("avif", "webp")
+IMAGE_THUMB_WIDTH = int(os.getenv("IMAGE_THUMB_WIDTH", 400))
+IMAGE_DERIVATIVES_ON_UPLOAD = os.getenv("IMAGE_DERIVATIVES_ON_UPLOAD", "1") == "1"
+# 上传后在本进程的后台线程里编码（0 = 在提交回调里同步编码）
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", 2))
+# 还没有派生图时，隔这么久（秒）再去存储里确认一次
+IMAGE_DERIVATIVE_MISS_TIMEOUT = int(os.getenv("IMAGE_DERIVATIVE_MISS_TIMEOUT", 60))
+
+# How rows share an already stored file (common/storage.py, e.g. Donation.approve handing its
+# photos to the new Pet): "reference" stores the same name, "link" hardlinks it under a new
+# name and "copy" streams a copy; link/copy run after commit.
+MEDIA_SHARE_MODE = os.getenv("MEDIA_SHARE_MODE", "reference")
+
+# Bulk donation approval from the admin (apps/pet/approvals.py). When async, the action queues
+# an ApprovalBatch for `manage.py approval_worker`; otherwise it runs inside the request. Only
+# turn it on where a worker runs (docker-compose's approval_worker service sets it for web).
+DONATION_APPROVAL_ASYNC = os.getenv("DONATION_APPROVAL_ASYNC", "false").lower() in ("1", "true", "yes")
+DONATION_APPROVAL_CHUNK = int(os.getenv("DONATION_APPROVAL_CHUNK", 100))              # donations per transaction
+DONATION_APPROVAL_PHOTO_WORKERS = int(os.getenv("DONATION_APPROVAL_PHOTO_WORKERS", 4))  # threads for link/copy
+DONATION_APPROVAL_LOCK_TIMEOUT = int(os.getenv("DONATION_APPROVAL_LOCK_TIMEOUT", 600))  # reclaim after (s)
+
+# Totals for cursor-paginated lists (?cursor=&with_count=1, common/pagination.py): unfiltered
+# tables with at least COUNT_ESTIMATE_THRESHOLD rows report pg_class.reltuples, other counts are
+# cached (versioned per model) for COUNT_CACHE_TIMEOUT seconds.
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", 10000))
+COUNT_CACHE_TIMEOUT = int(os.getenv("COUNT_CACHE_TIMEOUT", 60))
+
+# Anonymous pet catalogue (PetViewSet.list) response cache lifetime, in seconds.
+# Entries are versioned per model, so writes invalidate them immediately.
+PET_LIST_CACHE_TIMEOUT = int(os.getenv("PET_LIST_CACHE_TIMEOUT", 300))
+# Hit/miss counters (common/cache.py) are counted in process; with Redis as the shared tier
+# each worker pushes them at most this often (seconds), otherwise they stay per process.
+CACHE_STATS_FLUSH_INTERVAL = int(os.getenv("CACHE_STATS_FLUSH_INTERVAL", 30))
+
+# Fraction of catalogue list requests whose (anonymised) filter combination is logged to
+# "apps.pet.filter_usage" for `manage.py advise_pet_indexes`. 0 disables capturing.
+PET_FILTER_SAMPLE_RATE = float(os.getenv("PET_FILTER_SAMPLE_RATE", 0))
+PET_FILTER_LOG_FILE = os.getenv("PET_FILTER_LOG_FILE", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "filter_usage": (
+            {"class": "logging.handlers.WatchedFileHandler", "filename": PET_FILTER_LOG_FILE}
+            if PET_FILTER_LOG_FILE else {"class": "logging.StreamHandler"}
+        ),
+    },
+    "loggers": {
+        "apps.pet.filter_usage": {"handlers": ["filter_usage"], "level": "INFO", "propagate": False},
+    },
+}
+
+# Article view counting (apps/user/view_buffer.py): views are buffered per worker and
+# bulk-upserted into ViewStatistics. A worker killed without a graceful exit loses at
+# most VIEW_STATS_FLUSH_INTERVAL seconds (<= VIEW_STATS_MAX_PENDING rows) of views.
+VIEW_STATS_BUFFERED = os.getenv("VIEW_STATS_BUFFERED", "1") == "1"
+VIEW_STATS_FLUSH_INTERVAL = int(os.getenv("VIEW_STATS_FLUSH_INTERVAL", 10))
+VIEW_STATS_MAX_PENDING = int(os.getenv("VIEW_STATS_MAX_PENDING", 1000))
+# While the database is down a worker keeps at most VIEW_STATS_MAX_BUFFERED rows (views for
+# new rows past that are dropped) and retries with a backoff doubling up to VIEW_STATS_MAX_BACKOFF s.
+VIEW_STATS_MAX_BUFFERED = int(os.getenv("VIEW_STATS_MAX_BUFFERED", 10000))
+VIEW_STATS_MAX_BACKOFF = int(os.getenv("VIEW_STATS_MAX_BACKOFF", 300))
+
+# Lost-pet map (LostGeoViewSet): hard cap on features per response, and the zoom level
+# below which points are aggregated into grid clusters.
+LOST_GEO_MAX_FEATURES = int(os.getenv("LOST_GEO_MAX_FEATURES", 2000))
+LOST_GEO_CLUSTER_MAX_ZOOM = int(os.getenv("LOST_GEO_CLUSTER_MAX_ZOOM", 12))
+
+# Lost-report typeahead (/pet/lost/suggest/?q=): max suggestions per response and the
+# cache lifetime of a (versioned) answer.
+LOST_SUGGEST_LIMIT = int(os.getenv("LOST_SUGGEST_LIMIT", 10))
+LOST_SUGGEST_CACHE_TIMEOUT = int(os.getenv("LOST_SUGGEST_CACHE_TIMEOUT", 60))
+
+# Vector tiles (/pet/tiles/<layer>/<z>/<x>/<y>.mvt): server-side cache lifetime (entries are
+# versioned, so writes invalidate them), CDN/browser max-age, and a per-tile feature cap.
+MAP_TILE_CACHE_TIMEOUT = int(os.getenv("MAP_TILE_CACHE_TIMEOUT", 3600))
+MAP_TILE_MAX_AGE = int(os.getenv("MAP_TILE_MAX_AGE", 60))
+MAP_TILE_MAX_FEATURES = int(os.getenv("MAP_TILE_MAX_FEATURES", 5000))
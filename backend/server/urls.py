@@ -15,32 +15,17 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from apps.pet.views import LostGeoViewSet 
 from rest_framework.routers import DefaultRouter
-from django.http import FileResponse
-import os
+from common import media
+from common.storage import VERSION_PREFIX
 
 router = DefaultRouter()
 router.register(r"pet/lost_geo", LostGeoViewSet, basename="lost-geo")
 
-def serve_media_with_cache_control(request, path):
-    """Serve media files with no-cache headers to prevent image caching"""
-    full_path = os.path.join(settings.MEDIA_ROOT, path)
-    if not os.path.isfile(full_path):
-        from django.http import Http404
-        raise Http404(f"File not found: {path}")
-    
-    response = FileResponse(open(full_path, 'rb'))
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    response['ETag'] = None  # 移除ETag以强制重新验证
-    response['Last-Modified'] = None
-    return response
-
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('api.urls')),
@@ -53,8 +38,10 @@ urlpatterns = [
     *static(settings.STATIC_URL, document_root=settings.STATIC_ROOT),
 ]
 
-if settings.DEBUG:
-    # 为媒体文件添加缓存控制头，防止浏览器缓存导致头像更新不显示
+if settings.MEDIA_SERVE:
+    # 带指纹的地址可以长期缓存；不带指纹的每次用 ETag 重新验证，头像更新能立即看到
+    media_prefix = settings.MEDIA_URL.strip('/')
     urlpatterns += [
-        path('media/<path:path>', serve_media_with_cache_control),
+        re_path(rf'^{media_prefix}/{VERSION_PREFIX}/(?P<version>[0-9a-f]+)/(?P<path>.+)$', media.serve),
+        path(f'{media_prefix}/<path:path>', media.serve),
     ]